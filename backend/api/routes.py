@@ -1,16 +1,17 @@
 import io
+import math
 import os
 import re
-import uuid
+import tempfile
 import zipfile
-from flask import Blueprint, request, jsonify, send_file, Response
-from models import project, topic, reference, connection
-from services import paper_search
+from flask import Blueprint, request, jsonify, send_file, Response, current_app
+from models import project, topic, reference, connection, batch, changes, search, pdf_blob, citations
+from services import paper_search, search_cache, jobs, pdf_store, pdf_branding, pdf_text, library_import, bibliography, duplicates, minhash, graph, citation_import, layout, spatial, snapshot_cache
 
 api = Blueprint('api', __name__)
 
 # PDF storage directory (alongside the SQLite database)
-PDF_STORAGE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'pdfs')
+PDF_STORAGE_DIR = pdf_store.PDF_STORAGE_DIR
 os.makedirs(PDF_STORAGE_DIR, exist_ok=True)
 
 
@@ -34,60 +35,140 @@ def _abs_pdf_path(relative_path):
     return os.path.abspath(os.path.join(PDF_STORAGE_DIR, relative_path))
 
 
-def _branded_pdf_path(reference_id, source_abs_path, title):
-    """Return the path to a copy of the PDF whose /Info /Title metadata equals
-    `title`. Chromium's built-in PDF viewer uses /Title (when present) as the
-    name it displays in its toolbar — without this, the viewer falls back to
-    the cache-temp filename ("[hash].tmp"). The branded copy is cached on
-    disk and rebuilt only when the source PDF or the title changes.
+def _remove_legacy_pdf(relative_path):
+    """Delete a pre-blob-store, per-reference PDF file (ref_<id>_<uuid>.pdf).
+
+    Content-addressed blobs are never removed here: dropping the reference
+    decrements their ref_count and garbage collection reclaims them.
     """
-    try:
-        from pypdf import PdfReader, PdfWriter
-    except Exception:
-        return source_abs_path  # pypdf not available — serve original
+    if not relative_path or pdf_store.is_blob_path(relative_path):
+        return
+    # Duplicated references share the file
+    if reference.is_pdf_in_use(relative_path):
+        return
+    old_abs = _abs_pdf_path(relative_path)
+    if old_abs and os.path.exists(old_abs):
+        try:
+            os.remove(old_abs)
+        except OSError:
+            pass
+
+
+def _conditional_response(etag, build):
+    """Serve the response from `build()` tagged with `etag`, or a bare 304
+    when the client already holds that version (If-None-Match). `no-cache`
+    makes the browser revalidate on every fetch instead of guessing
+    freshness."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-    if not title:
-        return source_abs_path
 
-    cache_dir = os.path.join(PDF_STORAGE_DIR, '_branded')
-    os.makedirs(cache_dir, exist_ok=True)
+# Streamed bodies are flushed in chunks of roughly this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
 
-    # Cache key: ref id + source mtime + title hash → invalidates on any change
-    try:
-        src_mtime = int(os.path.getmtime(source_abs_path))
-    except OSError:
-        return source_abs_path
-    import hashlib
-    key = hashlib.sha1(f'{reference_id}|{src_mtime}|{title}'.encode('utf-8')).hexdigest()[:16]
-    cached = os.path.join(cache_dir, f'{reference_id}_{key}.pdf')
+STREAM_MIMETYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
 
-    if os.path.exists(cached):
-        return cached
 
-    # Drop stale branded copies for this reference
-    try:
-        for f in os.listdir(cache_dir):
-            if f.startswith(f'{reference_id}_') and f != os.path.basename(cached):
-                try:
-                    os.remove(os.path.join(cache_dir, f))
-                except OSError:
-                    pass
-    except OSError:
-        pass
+def _stream_mode():
+    """Return the ?stream= mode ('json' or 'ndjson'), None when not streaming.
+    Raises ValueError for unknown modes."""
+    mode = request.args.get('stream', '')
+    if not mode:
+        return None
+    if mode not in STREAM_MIMETYPES:
+        raise ValueError(f'Unknown stream mode: {mode}')
+    return mode
 
-    try:
-        reader = PdfReader(source_abs_path)
-        writer = PdfWriter(clone_from=reader)
-        # Preserve any existing metadata, override /Title
-        existing = dict(reader.metadata or {})
-        existing['/Title'] = title
-        writer.add_metadata(existing)
-        with open(cached, 'wb') as out:
-            writer.write(out)
-        return cached
-    except Exception:
-        # Any pypdf failure (encrypted PDF, malformed, etc.) — serve original
-        return source_abs_path
+
+def _chunked(pieces, size=STREAM_CHUNK_SIZE):
+    """Coalesce many small string pieces into chunks of about `size` chars."""
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_array_pieces(items, dumps):
+    """Encode an iterable as a JSON array, one element at a time."""
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + dumps(item)
+    yield ']'
+
+
+def _ndjson_pieces(items, dumps):
+    """Encode an iterable as newline-delimited JSON."""
+    for item in items:
+        yield dumps(item) + '\n'
+
+
+def _streamed_array(items, mode):
+    """Stream an iterable of JSON-serializable items as a JSON array or NDJSON.
+
+    Headers go out before the body, so errors mid-stream truncate the body
+    instead of turning into a 500.
+    """
+    dumps = current_app.json.dumps
+    pieces = _ndjson_pieces(items, dumps) if mode == 'ndjson' else _json_array_pieces(items, dumps)
+    return Response(_chunked(pieces), mimetype=STREAM_MIMETYPES[mode])
+
+# Requests above these sizes are handed to the job queue and answered with
+# 202 and the job (poll /jobs/<id>) instead of holding a request thread
+JOB_THRESHOLD_REFERENCES = 2000
+JOB_THRESHOLD_PDF_BYTES = 256 * 1024 * 1024
+JOB_THRESHOLD_OPERATIONS = 500
+JOB_THRESHOLD_DOIS = 100
+
+
+def _queued(kind, params):
+    """202 response carrying a newly queued job"""
+    job = jobs.manager.submit(kind, params)
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+# Cache lifetime for version-pinned PDF URLs (?v=<etag>); their bytes never change
+PDF_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _pdf_etag(ref, abs_path):
+    """Strong validator for the PDF served for `ref`.
+
+    Blob-store files are named by their SHA-256, so the tag is the content
+    hash plus a hash of the title branded into /Info. Legacy files fall
+    back to size and mtime.
+    """
+    import hashlib
+    pdf_path = ref['pdf_path']
+    if pdf_store.is_blob_path(pdf_path):
+        content = os.path.splitext(os.path.basename(pdf_path))[0]
+    else:
+        stat = os.stat(abs_path)
+        content = f'{stat.st_size:x}-{int(stat.st_mtime):x}'
+    title = hashlib.sha1((ref.get('title') or '').encode('utf-8')).hexdigest()[:12]
+    return f'{content}-{title}'
+
+
+def _pdf_cache_headers(response, etag):
+    """Version-pinned URLs are immutable; plain URLs revalidate via ETag."""
+    if request.args.get('v') == etag:
+        response.headers['Cache-Control'] = f'public, max-age={PDF_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # Project routes
 @api.route('/projects', methods=['GET'])
@@ -126,12 +207,56 @@ def delete_project_route(project_id):
 # Topic routes
 @api.route('/projects/<int:project_id>/topics', methods=['GET'])
 def get_topics(project_id):
-    fields = request.args.get('fields', '')
-    if fields == 'summary':
-        topics = topic.get_topics_by_project_summary(project_id)
-    else:
-        topics = topic.get_topics_by_project(project_id)
-    return jsonify(topics)
+    """All topics of a project with their references.
+
+    ?fields= selects reference columns; ?stream=json|ndjson streams the
+    topics straight off the database cursor instead of building the whole
+    payload in memory. ?bbox=x0,y0,x1,y1 (canvas pixels) returns only the
+    topics intersecting that viewport, as {"topics": [...], "connections":
+    [...]} with the connections between them, so large canvases can load
+    tile by tile.
+    """
+    try:
+        fields = reference.parse_fields(request.args.get('fields', ''))
+        stream = _stream_mode()
+        bbox = request.args.get('bbox')
+        if bbox is not None:
+            if stream:
+                raise ValueError('bbox cannot be combined with stream')
+            bbox = spatial.parse_bbox(bbox)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    variant = ','.join(fields) if fields else 'all'
+    if not bbox and not stream:
+        # Served from encoded bodies; models invalidate them on every write
+        cached = snapshot_cache.cache.get(project_id, variant)
+        if cached is None:
+            generation = snapshot_cache.cache.generation(project_id)
+            cached = (changes.get_project_revision(project_id),
+                      jsonify(topic.get_topics_by_project(project_id, fields)).get_data())
+            snapshot_cache.cache.set(project_id, variant, generation, *cached)
+        revision, body = cached
+        return _conditional_response(f'topics-{project_id}-r{revision}-{variant}',
+                                     lambda: Response(body, mimetype=current_app.json.mimetype))
+    revision = changes.get_project_revision(project_id)
+    if bbox:
+        def build():
+            topic_ids = spatial.get_index(project_id, revision).query(*bbox)
+            return jsonify({
+                'topics': topic.get_topics_by_project(project_id, fields, topic_ids) if topic_ids else [],
+                'connections': connection.get_connections_between_topics(topic_ids) if topic_ids else [],
+            })
+        return _conditional_response(
+            f'topics-{project_id}-r{revision}-{variant}-bbox{",".join(f"{v:g}" for v in bbox)}', build)
+    return _conditional_response(
+        f'topics-{project_id}-r{revision}-{variant}-{stream}',
+        lambda: _streamed_array(topic.iter_topics_by_project(project_id, fields), stream))
+
+@api.route('/projects/<int:project_id>/changes', methods=['GET'])
+def get_project_changes(project_id):
+    """Delta sync: rows changed since revision `since` (0 = everything journaled)."""
+    since = request.args.get('since', 0, type=int)
+    return jsonify(changes.get_changes_since(project_id, since))
 
 @api.route('/projects/<int:project_id>/topics', methods=['POST'])
 def create_topic(project_id):
@@ -160,26 +285,53 @@ def delete_topic_route(topic_id):
     topic.delete_topic(topic_id)
     return jsonify({'success': True})
 
+def _is_number(value):
+    """Finite int or float, but not a bool (which JSON true/false become)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _layout_type_error(item):
+    """Why a topic layout item has a field of the wrong type, or None"""
+    if 'id' in item and not _is_integer(item['id']):
+        return 'Topic id must be an integer'
+    for key in ('position_x', 'position_y'):
+        if item.get(key) is not None and not _is_number(item[key]):
+            return f'{key} must be a number'
+    for key in ('grid_width', 'grid_height'):
+        if item.get(key) is not None and not _is_integer(item[key]):
+            return f'{key} must be an integer'
+    return None
+
 @api.route('/topics/<int:topic_id>/position', methods=['PUT'])
 def update_topic_position(topic_id):
-    data = request.json
+    data = request.json or {}
     position_x = data.get('position_x')
     position_y = data.get('position_y')
 
     if position_x is None or position_y is None:
         return jsonify({'error': 'Position coordinates are required'}), 400
+    error = _layout_type_error(data)
+    if error:
+        return jsonify({'error': error}), 400
 
     topic.update_topic_position(topic_id, position_x, position_y)
     return jsonify({'success': True})
 
 @api.route('/topics/<int:topic_id>/dimensions', methods=['PUT'])
 def update_topic_dimensions(topic_id):
-    data = request.json
+    data = request.json or {}
     grid_width = data.get('grid_width')
     grid_height = data.get('grid_height')
 
     if grid_width is None or grid_height is None:
         return jsonify({'error': 'Dimensions are required'}), 400
+    error = _layout_type_error(data)
+    if error:
+        return jsonify({'error': error}), 400
 
     # Enforce minimum size
     if grid_width < 5 or grid_height < 3:
@@ -188,12 +340,90 @@ def update_topic_dimensions(topic_id):
     topic.update_topic_dimensions(topic_id, grid_width, grid_height)
     return jsonify({'success': True})
 
+@api.route('/topics/layout', methods=['PUT'])
+def update_topic_layouts():
+    """Bulk position/dimension update for multi-topic drags.
+
+    Body: {"topics": [{id, position_x, position_y, grid_width?, grid_height?}, ...]}
+    Valid items are written in one transaction; the response carries one
+    result per input item, in order. An item with a field of the wrong type
+    (e.g. a string size or a boolean id) rejects the whole request with a
+    400 naming its index, before anything is written.
+    """
+    data = request.json or {}
+    items = data.get('topics')
+    if not isinstance(items, list):
+        return jsonify({'error': 'topics must be a list'}), 400
+    for index, item in enumerate(items):
+        error = _layout_type_error(item) if isinstance(item, dict) else 'Item must be an object'
+        if error:
+            return jsonify({'error': error, 'index': index}), 400
+
+    results = []
+    updates = []
+    for item in items:
+        topic_id = item.get('id')
+        result = {'id': topic_id, 'success': False}
+        results.append(result)
+        if topic_id is None:
+            result['error'] = 'Topic id is required'
+            continue
+        if item.get('position_x') is None or item.get('position_y') is None:
+            result['error'] = 'Position coordinates are required'
+            continue
+        grid_width = item.get('grid_width')
+        grid_height = item.get('grid_height')
+        if (grid_width is None) != (grid_height is None):
+            result['error'] = 'Dimensions are required'
+            continue
+        if grid_width is not None and (grid_width < 5 or grid_height < 3):
+            result['error'] = 'Minimum size is 5x3'
+            continue
+        updates.append(item)
+
+    updated = topic.update_topic_layouts(updates)
+    for result in results:
+        if 'error' in result:
+            continue
+        if result['id'] in updated:
+            result['success'] = True
+        else:
+            result['error'] = 'Topic not found'
+    return jsonify({'results': results})
+
+@api.route('/projects/<int:project_id>/layout', methods=['POST'])
+def layout_project(project_id):
+    """Arrange a project's topics automatically.
+
+    Related topics (joined by reference connections) are placed near each
+    other on the grid without overlaps; with ?resize=false topics keep
+    their size unless it is below the minimum. All positions are saved in
+    one transaction and returned as {"topics": [{id, position_x,
+    position_y, grid_width, grid_height}, ...]}.
+    """
+    if not project.get_project_by_id(project_id):
+        return jsonify({'error': 'Project not found'}), 404
+    resize = request.args.get('resize') not in ('0', 'false')
+    return jsonify({'topics': layout.layout_project(project_id, resize)})
+
 # Reference routes
 @api.route('/topics/<int:topic_id>/references', methods=['GET'])
 def get_references(topic_id):
-    references = reference.get_references_by_topic(topic_id)
+    try:
+        fields = reference.parse_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    references = reference.get_references_by_topic(topic_id, fields)
     return jsonify(references)
 
+@api.route('/references/<int:reference_id>/detail', methods=['GET'])
+def get_reference_detail(reference_id):
+    """Full reference row, including the heavy abstract/notes/bibtex columns."""
+    ref = reference.get_reference_by_id(reference_id)
+    if ref:
+        return jsonify(ref)
+    return jsonify({'error': 'Reference not found'}), 404
+
 @api.route('/topics/<int:topic_id>/references', methods=['POST'])
 def create_reference(topic_id):
     data = request.json
@@ -208,7 +438,8 @@ def create_reference(topic_id):
         data.get('publication_year', None),
         data.get('bibtex', '')
     )
-    return jsonify({'id': reference_id}), 201
+    # Report, without blocking, references this one may duplicate
+    return jsonify({'id': reference_id, 'duplicates': duplicates.check_reference(reference_id)}), 201
 
 @api.route('/references/<int:reference_id>', methods=['PUT'])
 def update_reference_route(reference_id):
@@ -253,6 +484,29 @@ def duplicate_reference_route(reference_id):
     return jsonify({'success': True, 'id': new_reference_id})
 
 
+@api.route('/batch', methods=['POST'])
+def apply_batch():
+    """Apply an ordered list of topic/reference/connection operations atomically.
+
+    Body: {"operations": [{"op": "reference.create", "topic_id": 3, "title": ...}, ...]}
+    Id fields may be "$<n>" to refer to the id created by operation n.
+    Either every operation is applied or none is. Batches of more than
+    JOB_THRESHOLD_OPERATIONS run as an import.batch job (202).
+    """
+    data = request.json or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list):
+        return jsonify({'error': 'operations must be a list'}), 400
+    if len(operations) > JOB_THRESHOLD_OPERATIONS:
+        return _queued('import.batch', {'operations': operations})
+
+    try:
+        ids = batch.apply_operations(operations)
+    except batch.BatchError as e:
+        return jsonify({'error': e.message, 'index': e.index}), 400
+    return jsonify({'success': True, 'ids': ids})
+
+
 # ---------------- PDF attachment routes ----------------
 
 @api.route('/references/<int:reference_id>/pdf', methods=['POST'])
@@ -271,23 +525,16 @@ def upload_reference_pdf(reference_id):
     if not file.filename.lower().endswith('.pdf'):
         return jsonify({'error': 'Only .pdf files are allowed'}), 400
 
-    # Remove the previous PDF if present
-    old_path = ref.get('pdf_path')
-    if old_path:
-        old_abs = _abs_pdf_path(old_path)
-        if old_abs and os.path.exists(old_abs):
-            try:
-                os.remove(old_abs)
-            except OSError:
-                pass
-
-    # Store under a unique filename, keyed by reference id
-    unique_name = f'ref_{reference_id}_{uuid.uuid4().hex}.pdf'
-    abs_target = os.path.join(PDF_STORAGE_DIR, unique_name)
-    file.save(abs_target)
+    # Store in the content-addressed blob store (identical files are shared)
+    blob_path = pdf_store.store_stream(file.stream)
+    reference.set_reference_pdf(reference_id, blob_path)
+    pdf_text.indexer.enqueue(blob_path)
 
-    reference.set_reference_pdf(reference_id, unique_name)
-    return jsonify({'success': True, 'pdf_path': unique_name})
+    # Remove the previous PDF if it predates the blob store
+    old_path = ref.get('pdf_path')
+    if old_path != blob_path:
+        _remove_legacy_pdf(old_path)
+    return jsonify({'success': True, 'pdf_path': blob_path})
 
 
 @api.route('/references/<int:reference_id>/pdf-view', methods=['GET'])
@@ -323,7 +570,9 @@ def get_reference_pdf_view(reference_id):
     # download button, save dialog, etc.). Without this it falls back to a
     # random "[hash].tmp" name from its disk cache.
     nice_name = _safe_segment(title, f'reference_{reference_id}')
-    pdf_url = f'/api/references/{reference_id}/pdf/{quote(nice_name)}.pdf'
+    # ?v= pins the URL to this exact content, so the viewer may cache it
+    etag = _pdf_etag(ref, abs_path)
+    pdf_url = f'/api/references/{reference_id}/pdf/{quote(nice_name)}.pdf?v={quote(etag)}'
 
     # Notes:
     #  - The PDF lives inside an <iframe>, not <embed>. With <embed>, Chromium
@@ -372,6 +621,10 @@ def get_reference_pdf(reference_id, display_name=None):
     URL end in a meaningful filename, so embedded PDF viewers (Chromium,
     Electron) show the reference title in the panel title instead of a
     random storage name.
+
+    Supports byte ranges (so large PDFs open progressively) and conditional
+    requests (If-None-Match / If-Modified-Since) against a strong ETag
+    keyed on the content hash.
     """
     from urllib.parse import quote
 
@@ -382,19 +635,34 @@ def get_reference_pdf(reference_id, display_name=None):
     if not abs_path or not os.path.exists(abs_path):
         return jsonify({'error': 'PDF file missing on disk'}), 404
 
+    # Answer revalidations before doing any branding work
+    etag = _pdf_etag(ref, abs_path)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return _pdf_cache_headers(response, etag)
+
     # Display filename = sanitized reference title
     nice_name = f'{_safe_segment(ref.get("title"), f"reference_{reference_id}")}.pdf'
 
     # Brand the PDF with /Title metadata so Chromium's viewer toolbar shows
     # the reference title instead of the cache-temp "[hash].tmp" filename.
-    serve_path = _branded_pdf_path(reference_id, abs_path, ref.get('title'))
+    serve_path = pdf_branding.branded_path(abs_path, ref.get('title'), etag)
 
+    # conditional=True lets Werkzeug answer Range (206) and If-Modified-Since.
+    # Last-Modified comes from the stored PDF: a branded copy is rewritten
+    # whenever it is evicted and rebuilt, though its bytes stay the same.
     response = send_file(
         serve_path,
         mimetype='application/pdf',
         as_attachment=False,
         download_name=nice_name,
+        conditional=True,
+        etag=etag,
+        last_modified=os.path.getmtime(abs_path),
     )
+    response.accept_ranges = 'bytes'
+    _pdf_cache_headers(response, etag)
 
     # Force an explicit inline Content-Disposition with BOTH the ASCII and the
     # UTF-8 (RFC 5987) filename forms. Chromium's PDF viewer uses this header
@@ -415,15 +683,8 @@ def delete_reference_pdf(reference_id):
     ref = reference.get_reference_by_id(reference_id)
     if not ref:
         return jsonify({'error': 'Reference not found'}), 404
-    old_path = ref.get('pdf_path')
-    if old_path:
-        old_abs = _abs_pdf_path(old_path)
-        if old_abs and os.path.exists(old_abs):
-            try:
-                os.remove(old_abs)
-            except OSError:
-                pass
     reference.set_reference_pdf(reference_id, None)
+    _remove_legacy_pdf(ref.get('pdf_path'))
     return jsonify({'success': True})
 
 
@@ -463,16 +724,53 @@ def create_reference_with_pdf(topic_id):
     if file and file.filename:
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'error': 'Only .pdf files are allowed', 'id': reference_id}), 400
-        unique_name = f'ref_{reference_id}_{uuid.uuid4().hex}.pdf'
-        abs_target = os.path.join(PDF_STORAGE_DIR, unique_name)
-        file.save(abs_target)
-        reference.set_reference_pdf(reference_id, unique_name)
+        blob_path = pdf_store.store_stream(file.stream)
+        reference.set_reference_pdf(reference_id, blob_path)
+        pdf_text.indexer.enqueue(blob_path)
 
-    return jsonify({'id': reference_id}), 201
+    return jsonify({'id': reference_id, 'duplicates': duplicates.check_reference(reference_id)}), 201
 
 
 # ---------------- End PDF routes ----------------
 
+# Library search routes
+SEARCH_MAX_LIMIT = 100
+# Below this, title matches are mostly unrelated papers sharing words
+DUPLICATE_MIN_THRESHOLD = 0.5
+
+@api.route('/projects/<int:project_id>/search', methods=['GET'])
+def search_project_references(project_id):
+    """Full-text search over a project's references (?q=, ?limit=, ?offset=)."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), SEARCH_MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    results = search.search_references(project_id, query, limit, offset)
+    return jsonify({**results, 'limit': limit, 'offset': offset})
+
+@api.route('/projects/<int:project_id>/pdf-search', methods=['GET'])
+def search_project_pdfs(project_id):
+    """Full-text search over the pages of a project's PDFs (?q=, ?limit=, ?offset=)."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), SEARCH_MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    results = search.search_pdf_text(project_id, query, limit, offset)
+    return jsonify({**results, 'limit': limit, 'offset': offset})
+
+@api.route('/projects/<int:project_id>/duplicates', methods=['GET'])
+def find_project_duplicates(project_id):
+    """Groups of references sharing a DOI or a near-identical title
+    (?threshold= title similarity, 0.5-1, default 0.8)."""
+    threshold = request.args.get('threshold', minhash.DEFAULT_THRESHOLD, type=float)
+    threshold = min(max(threshold, DUPLICATE_MIN_THRESHOLD), 1.0)
+    groups = duplicates.find_duplicates(project_id, threshold)
+    return jsonify({'groups': groups, 'count': len(groups), 'threshold': threshold})
+
 # Paper search routes
 @api.route('/search/papers', methods=['POST'])
 def search_papers():
@@ -494,11 +792,73 @@ def get_paper_by_doi(doi):
         return jsonify(paper)
     return jsonify({'error': 'Paper not found'}), 404
 
+# Upper bound on DOIs accepted by one bulk resolution request
+DOI_BATCH_MAX = 1000
+
+@api.route('/paper/doi/batch', methods=['POST'])
+def resolve_dois_batch():
+    """Resolve many DOIs at once, streamed as NDJSON in completion order.
+
+    Body: {"dois": ["10.1000/xyz", ...]}. Each line carries 'doi', 'status'
+    (found / not_found / invalid / error) and 'paper'. More than
+    JOB_THRESHOLD_DOIS DOIs run as an import.dois job (202).
+    """
+    data = request.json or {}
+    dois = data.get('dois')
+    if not isinstance(dois, list) or not dois:
+        return jsonify({'error': 'dois must be a non-empty list'}), 400
+    if len(dois) > DOI_BATCH_MAX:
+        return jsonify({'error': f'At most {DOI_BATCH_MAX} DOIs per request'}), 400
+    if len(dois) > JOB_THRESHOLD_DOIS:
+        return _queued('import.dois', {'dois': dois})
+
+    return Response(_ndjson_pieces(paper_search.resolve_dois(dois), current_app.json.dumps),
+                    mimetype=STREAM_MIMETYPES['ndjson'])
+
+@api.route('/admin/pdf-storage', methods=['GET'])
+def get_pdf_storage_stats():
+    stats = pdf_blob.get_storage_stats()
+    stats['branded_cache'] = pdf_branding.cache_stats()
+    return jsonify(stats)
+
+@api.route('/admin/pdf-storage/gc', methods=['POST'])
+def collect_pdf_garbage():
+    """Remove PDF blobs that have been unreferenced past the grace period."""
+    return jsonify(pdf_store.collect_garbage())
+
+@api.route('/admin/pdf-text', methods=['GET'])
+def get_pdf_text_stats():
+    return jsonify(pdf_text.indexer.stats())
+
+@api.route('/admin/pdf-text/retry', methods=['POST'])
+def retry_pdf_text():
+    """Queue PDFs whose text extraction failed (and any still pending) again."""
+    return jsonify({'queued': pdf_text.indexer.retry_failed()})
+
+@api.route('/admin/search-cache', methods=['GET'])
+def get_search_cache_stats():
+    return jsonify(search_cache.cache.stats())
+
+@api.route('/admin/search-cache', methods=['DELETE'])
+def clear_search_cache():
+    removed = search_cache.cache.clear()
+    return jsonify({'success': True, 'removed': removed})
+
+@api.route('/admin/snapshot-cache', methods=['GET'])
+def get_snapshot_cache_stats():
+    return jsonify(snapshot_cache.cache.stats())
+
+@api.route('/admin/snapshot-cache', methods=['DELETE'])
+def clear_snapshot_cache():
+    removed = snapshot_cache.cache.clear()
+    return jsonify({'success': True, 'removed': removed})
+
 # Reference connection routes
 @api.route('/projects/<int:project_id>/connections', methods=['GET'])
 def get_connections(project_id):
-    connections = connection.get_connections_by_project(project_id)
-    return jsonify(connections)
+    revision = changes.get_project_revision(project_id)
+    return _conditional_response(f'connections-{project_id}-r{revision}',
+                                 lambda: jsonify(connection.get_connections_by_project(project_id)))
 
 @api.route('/connections', methods=['POST'])
 def create_connection_route():
@@ -521,153 +881,533 @@ def delete_connection_route(connection_id):
     connection.delete_connection(connection_id)
     return jsonify({'success': True})
 
+# Connection graph routes
+GRAPH_MAX_DEPTH = 10
+GRAPH_MAX_LIMIT = 10000
+
+def _graph_args(*names):
+    """Validate ?direction= / ?mode= against the graph module's choices;
+    returns their values or raises ValueError"""
+    choices = {'direction': (graph.DIRECTIONS, 'both'), 'mode': (graph.DEGREE_MODES, 'total')}
+    values = []
+    for name in names:
+        allowed, default = choices[name]
+        value = request.args.get(name, default)
+        if value not in allowed:
+            raise ValueError(f'{name} must be one of: {", ".join(allowed)}')
+        values.append(value)
+    return values
+
+@api.route('/projects/<int:project_id>/graph/neighborhood/<int:reference_id>', methods=['GET'])
+def get_graph_neighborhood(project_id, reference_id):
+    """References within ?depth= hops (default 1) of a reference, following
+    ?direction= out/in/both edges, at most ?limit= of them."""
+    try:
+        direction, = _graph_args('direction')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    depth = min(max(request.args.get('depth', 1, type=int), 1), GRAPH_MAX_DEPTH)
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), GRAPH_MAX_LIMIT)
+    try:
+        nodes, truncated = graph.get_graph(project_id).neighborhood(reference_id, depth, direction, limit)
+    except KeyError:
+        return jsonify({'error': 'Reference not found in project'}), 404
+    return jsonify({
+        'reference_id': reference_id,
+        'depth': depth,
+        'direction': direction,
+        'nodes': [{'id': node_id, 'distance': distance} for node_id, distance in nodes],
+        'truncated': truncated,
+    })
+
+@api.route('/projects/<int:project_id>/graph/path', methods=['GET'])
+def get_graph_path(project_id):
+    """Shortest path between ?source= and ?target= references (null when
+    they are not connected)."""
+    try:
+        direction, = _graph_args('direction')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    source = request.args.get('source', type=int)
+    target = request.args.get('target', type=int)
+    if source is None or target is None:
+        return jsonify({'error': 'source and target are required'}), 400
+    try:
+        path = graph.get_graph(project_id).shortest_path(source, target, direction)
+    except KeyError:
+        return jsonify({'error': 'Reference not found in project'}), 404
+    return jsonify({
+        'source': source,
+        'target': target,
+        'direction': direction,
+        'path': path,
+        'length': len(path) - 1 if path else None,
+    })
+
+@api.route('/projects/<int:project_id>/graph/components', methods=['GET'])
+def get_graph_components(project_id):
+    """Connected components (ignoring edge direction), largest first, of at
+    least ?min_size= references (default 2), at most ?limit= of them."""
+    min_size = max(request.args.get('min_size', 2, type=int), 1)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), GRAPH_MAX_LIMIT)
+    components = [c for c in graph.get_graph(project_id).components() if len(c) >= min_size]
+    return jsonify({
+        'count': len(components),
+        'components': [{'size': len(c), 'reference_ids': c} for c in components[:limit]],
+    })
+
+@api.route('/projects/<int:project_id>/graph/degrees', methods=['GET'])
+def get_graph_degrees(project_id):
+    """References ranked by ?mode= total/in/out connection count, top ?limit=."""
+    try:
+        mode, = _graph_args('mode')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), GRAPH_MAX_LIMIT)
+    project_graph = graph.get_graph(project_id)
+    ranked = []
+    for reference_id in project_graph.ranking(mode)[:limit]:
+        in_degree, out_degree = project_graph.degree(reference_id)
+        ranked.append({'id': reference_id, 'in_degree': in_degree, 'out_degree': out_degree})
+    return jsonify({'mode': mode, 'references': ranked})
+
 # Export bibliography
 @api.route('/projects/<int:project_id>/export/bibliography', methods=['GET'])
 def export_bibliography(project_id):
-    """Export all BibTeX entries for a project"""
+    """Export the project's deduplicated BibTeX entries as JSON
+    ({bibliography, count, revision}); cached per project revision. Large
+    projects get an export.bibliography job (202) instead."""
     try:
-        # Get all topics for this project
-        topics = topic.get_topics_by_project(project_id)
-
-        # Collect all unique references by DOI or title
-        unique_refs = {}
-        for t in topics:
-            if 'references' in t:
-                for ref in t['references']:
-                    # Use DOI as unique key if available, otherwise use title
-                    key = ref.get('doi', '').strip().lower() if ref.get('doi', '').strip() else ref.get('title', '').strip().lower()
-                    if key and ref.get('bibtex'):
-                        unique_refs[key] = ref.get('bibtex')
-
-        # Join all BibTeX entries
-        bibliography = '\n\n'.join(unique_refs.values())
-
-        return jsonify({
-            'bibliography': bibliography,
-            'count': len(unique_refs)
-        })
+        if reference.count_by_project(project_id) > JOB_THRESHOLD_REFERENCES:
+            return _queued('export.bibliography', {'project_id': project_id})
+        return jsonify(bibliography.build(project_id))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@api.route('/projects/<int:project_id>/export/bibliography.bib', methods=['GET'])
+def download_bibliography(project_id):
+    """Stream the project's bibliography as a .bib download; large projects
+    get an export.bibtex job (202) whose result is the file"""
+    proj = project.get_project_by_id(project_id)
+    if not proj:
+        return jsonify({'error': 'Project not found'}), 404
+    if reference.count_by_project(project_id) > JOB_THRESHOLD_REFERENCES:
+        return _queued('export.bibtex', {'project_id': project_id})
+    revision = changes.get_project_revision(project_id)
+    filename = f'{_safe_segment(proj.get("title"), f"project_{project_id}")}_bibliography.bib'
+
+    def build():
+        response = Response(_chunked(bibliography.iter_text(project_id)),
+                            mimetype='text/x-bibtex')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    return _conditional_response(f'bibliography-{project_id}-r{revision}', build)
+
+
+@jobs.manager.handler('export.bibliography')
+def _bibliography_job(job, project_id):
+    job.update(message='Collecting BibTeX entries')
+    return bibliography.build(project_id)
+
+
+@jobs.manager.handler('export.bibtex')
+def _bibtex_job(job, project_id):
+    proj = project.get_project_by_id(project_id)
+    if not proj:
+        raise ValueError('Project not found')
+    job.update(message='Writing BibTeX entries')
+    path = job.result_path('.bib')
+    with open(path, 'w', encoding='utf-8') as out:
+        for piece in bibliography.iter_text(project_id):
+            out.write(piece)
+            job.check_cancelled()
+    filename = f'{_safe_segment(proj.get("title"), f"project_{project_id}")}_bibliography.bib'
+    return jobs.JobFile(path, 'text/x-bibtex', filename)
+
+
 # Export all attached PDFs as a ZIP, organized into folders by Topic
-@api.route('/projects/<int:project_id>/export/pdfs', methods=['GET'])
-def export_pdfs_zip(project_id):
-    """Bundle every attached PDF in this project into a ZIP.
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipStreamSink(io.RawIOBase):
+    """Unseekable, write-only sink for zipfile. Whatever zipfile writes is
+    buffered until drain() hands it to the response generator; being
+    unseekable makes zipfile emit data descriptors instead of seeking back
+    to patch local headers."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _pdf_zip_entries(project_id):
+    """List (absolute path, archive name) for every PDF attached in a project.
 
     Layout inside the zip:
         <Topic name>/<Reference title>.pdf
     Names are sanitized for filesystem safety; duplicate titles inside the same
     topic are disambiguated with a numeric suffix.
     """
+    entries = []
+    for t in topic.iter_topics_by_project(project_id, ('id', 'title', 'pdf_path')):
+        topic_folder = _safe_segment(t.get('name'), 'Untitled topic')
+        used_names = {}
+        for ref in t.get('references', []):
+            pdf_rel = ref.get('pdf_path')
+            if not pdf_rel:
+                continue
+            abs_path = _abs_pdf_path(pdf_rel)
+            if not abs_path or not os.path.exists(abs_path):
+                continue
+
+            base = _safe_segment(ref.get('title'), f'reference_{ref.get("id")}')
+            # Truncate over-long names to keep the path manageable
+            if len(base) > 150:
+                base = base[:150].rstrip()
+
+            # Disambiguate duplicates within the same topic folder
+            count = used_names.get(base, 0)
+            if count == 0:
+                filename = f'{base}.pdf'
+            else:
+                filename = f'{base} ({count}).pdf'
+            used_names[base] = count + 1
+
+            entries.append((abs_path, f'{topic_folder}/{filename}'))
+    return entries
+
+
+def _iter_pdf_zip(entries, chunk_size=ZIP_COPY_CHUNK_SIZE):
+    """Yield a ZIP archive of `entries` as it is written, chunk by chunk.
+
+    PDFs are already compressed, so members are STORED rather than
+    deflated: no CPU spent for a ~1% gain, and memory stays bounded by
+    `chunk_size` whatever the archive size.
+    """
+    sink = _ZipStreamSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for abs_path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(abs_path, arcname)
+            info.compress_type = zipfile.ZIP_STORED
+            with open(abs_path, 'rb') as src, zf.open(info, 'w') as dest:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _spool_to_disk(chunks, chunk_size=ZIP_COPY_CHUNK_SIZE):
+    """Write `chunks` to an anonymous temp file; return (size, chunk iterator).
+
+    The temp file is deleted once the iterator is exhausted or closed.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        for chunk in chunks:
+            spool.write(chunk)
+        size = spool.tell()
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+
+    def read_back():
+        with spool:
+            while True:
+                chunk = spool.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    return size, read_back()
+
+
+@api.route('/projects/<int:project_id>/export/pdfs', methods=['GET'])
+def export_pdfs_zip(project_id):
+    """Bundle every attached PDF in this project into a ZIP.
+
+    The archive is streamed while it is being written, so the download
+    starts at once. With ?spool=1 it is first written to a temp file on
+    disk, which lets the response carry a Content-Length. Projects with
+    more than JOB_THRESHOLD_PDF_BYTES of PDFs get an export.pdfs job (202).
+    """
     try:
         proj = project.get_project_by_id(project_id)
         if not proj:
             return jsonify({'error': 'Project not found'}), 404
 
-        topics_data = topic.get_topics_by_project(project_id)
-
-        buffer = io.BytesIO()
-        included = 0
-        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for t in topics_data:
-                topic_folder = _safe_segment(t.get('name'), 'Untitled topic')
-                used_names = {}
-                for ref in t.get('references', []):
-                    pdf_rel = ref.get('pdf_path')
-                    if not pdf_rel:
-                        continue
-                    abs_path = _abs_pdf_path(pdf_rel)
-                    if not abs_path or not os.path.exists(abs_path):
-                        continue
-
-                    base = _safe_segment(ref.get('title'), f'reference_{ref.get("id")}')
-                    # Truncate over-long names to keep the path manageable
-                    if len(base) > 150:
-                        base = base[:150].rstrip()
-
-                    # Disambiguate duplicates within the same topic folder
-                    count = used_names.get(base, 0)
-                    if count == 0:
-                        filename = f'{base}.pdf'
-                    else:
-                        filename = f'{base} ({count}).pdf'
-                    used_names[base] = count + 1
-
-                    arcname = f'{topic_folder}/{filename}'
-                    zf.write(abs_path, arcname)
-                    included += 1
-
-        if included == 0:
+        entries = _pdf_zip_entries(project_id)
+        if not entries:
             return jsonify({'error': 'No PDFs attached in this project'}), 404
+        if sum(os.path.getsize(abs_path) for abs_path, _ in entries) > JOB_THRESHOLD_PDF_BYTES:
+            return _queued('export.pdfs', {'project_id': project_id})
 
-        buffer.seek(0)
         zip_filename = f'{_safe_segment(proj["title"], "project")}_pdfs.zip'
-        return Response(
-            buffer.getvalue(),
-            mimetype='application/zip',
-            headers={
-                'Content-Disposition': f'attachment; filename="{zip_filename}"',
-                'X-PDF-Count': str(included),
-            },
-        )
+        headers = {
+            'Content-Disposition': f'attachment; filename="{zip_filename}"',
+            'X-PDF-Count': str(len(entries)),
+        }
+        body = _iter_pdf_zip(entries)
+        if request.args.get('spool') in ('1', 'true'):
+            size, body = _spool_to_disk(body)
+            headers['Content-Length'] = str(size)
+        return Response(body, mimetype='application/zip', headers=headers)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@jobs.manager.handler('export.pdfs')
+def _pdfs_job(job, project_id):
+    proj = project.get_project_by_id(project_id)
+    if not proj:
+        raise ValueError('Project not found')
+    entries = _pdf_zip_entries(project_id)
+    if not entries:
+        raise ValueError('No PDFs attached in this project')
+
+    total = sum(os.path.getsize(abs_path) for abs_path, _ in entries) or 1
+    written = 0
+    path = job.result_path('.zip')
+    with open(path, 'wb') as out:
+        for chunk in _iter_pdf_zip(entries):
+            out.write(chunk)
+            written += len(chunk)
+            job.update(progress=min(written / total, 0.99),
+                       message=f'{len(entries)} PDF{"" if len(entries) == 1 else "s"}')
+    return jobs.JobFile(path, 'application/zip', f'{_safe_segment(proj["title"], "project")}_pdfs.zip')
+
+
 # Export report (references + notes + connections)
+REPORT_REFERENCE_FIELDS = ('id', 'title', 'authors', 'doi', 'publication_year',
+                           'citation_count', 'abstract', 'notes')
+
+
+def _report_topics(project_id):
+    """Yield report topic entries (name, color and reference subset)."""
+    for t in topic.iter_topics_by_project(project_id, REPORT_REFERENCE_FIELDS):
+        yield {
+            'name': t['name'],
+            'color': t['color'],
+            'references': t['references'],
+        }
+
+
+def _report_pieces(proj, mode, dumps):
+    """Encode the report incrementally: one JSON object, or NDJSON records
+    tagged with a 'type' of project/topic/connection."""
+    topics_iter = _report_topics(proj['id'])
+    connections_iter = connection.iter_report_connections(proj['id'])
+    if mode == 'ndjson':
+        yield dumps({'type': 'project', 'project_title': proj['title']}) + '\n'
+        for t in topics_iter:
+            yield dumps({'type': 'topic', **t}) + '\n'
+        for c in connections_iter:
+            yield dumps({'type': 'connection', **c}) + '\n'
+        return
+    yield '{"project_title": ' + dumps(proj['title']) + ', "topics": '
+    yield from _json_array_pieces(topics_iter, dumps)
+    yield ', "connections": '
+    yield from _json_array_pieces(connections_iter, dumps)
+    yield '}'
+
+
+def _build_report(proj):
+    """Assemble the whole report in memory"""
+    return {
+        'project_title': proj['title'],
+        'topics': list(_report_topics(proj['id'])),
+        'connections': list(connection.iter_report_connections(proj['id'])),
+    }
+
+
 @api.route('/projects/<int:project_id>/export/report', methods=['GET'])
 def export_report(project_id):
-    """Export a structured report: references grouped by topic, with notes and connections"""
+    """Export a structured report: references grouped by topic, with notes and connections.
+
+    ?stream=json|ndjson streams the report as it is read from the database.
+    Projects with more than JOB_THRESHOLD_REFERENCES references get an
+    export.report job (202) instead.
+    """
+    try:
+        stream = _stream_mode()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         proj = project.get_project_by_id(project_id)
         if not proj:
             return jsonify({'error': 'Project not found'}), 404
+        if reference.count_by_project(project_id) > JOB_THRESHOLD_REFERENCES:
+            return _queued('export.report', {'project_id': project_id})
 
-        topics_data = topic.get_topics_by_project(project_id)
-        connections_data = connection.get_connections_by_project(project_id)
-
-        # Build a lookup: ref id -> ref data (including topic name)
-        ref_lookup = {}
-        report_topics = []
-        for t in topics_data:
-            topic_refs = []
-            for ref in t.get('references', []):
-                ref_lookup[ref['id']] = {**ref, 'topic_name': t['name']}
-                topic_refs.append({
-                    'id': ref['id'],
-                    'title': ref.get('title', ''),
-                    'authors': ref.get('authors', ''),
-                    'doi': ref.get('doi', ''),
-                    'publication_year': ref.get('publication_year'),
-                    'citation_count': ref.get('citation_count', 0),
-                    'abstract': ref.get('abstract', ''),
-                    'notes': ref.get('notes', ''),
-                })
-            report_topics.append({
-                'name': t['name'],
-                'color': t.get('color', '#007bff'),
-                'references': topic_refs,
-            })
+        if stream:
+            pieces = _report_pieces(proj, stream, current_app.json.dumps)
+            return Response(_chunked(pieces), mimetype=STREAM_MIMETYPES[stream])
 
-        # Build connections with readable titles
-        report_connections = []
-        for conn in connections_data:
-            src = ref_lookup.get(conn['source_reference_id'])
-            tgt = ref_lookup.get(conn['target_reference_id'])
-            if src and tgt:
-                report_connections.append({
-                    'source_title': src['title'],
-                    'source_topic': src['topic_name'],
-                    'target_title': tgt['title'],
-                    'target_topic': tgt['topic_name'],
-                    'description': conn.get('description', ''),
-                })
-
-        return jsonify({
-            'project_title': proj['title'],
-            'topics': report_topics,
-            'connections': report_connections,
-        })
+        return jsonify(_build_report(proj))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@jobs.manager.handler('export.report')
+def _report_job(job, project_id):
+    proj = project.get_project_by_id(project_id)
+    if not proj:
+        raise ValueError('Project not found')
+    job.update(message='Building report')
+    return _build_report(proj)
+
+
+@jobs.manager.handler('import.batch')
+def _batch_job(job, operations):
+    job.update(message=f'Applying {len(operations)} operations')
+    try:
+        ids = batch.apply_operations(operations)
+    except batch.BatchError as e:
+        raise ValueError(f'Operation {e.index}: {e.message}')
+    return {'success': True, 'ids': ids}
+
+
+@jobs.manager.handler('import.dois')
+def _resolve_dois_job(job, dois):
+    results = []
+    for result in paper_search.resolve_dois(dois):
+        results.append(result)
+        job.update(progress=len(results) / len(dois), message=f'{len(results)}/{len(dois)} DOIs')
+    return results
+
+
+@jobs.manager.handler('import.references')
+def _import_references_job(job, topic_id, upload, format, resolve=False):
+    # Only files spooled by the import route, never arbitrary paths
+    path = os.path.join(jobs.JOBS_DIR, os.path.basename(upload))
+    if not path.endswith('.upload') or not os.path.exists(path):
+        raise ValueError('Upload not found')
+    try:
+        return library_import.import_file(
+            topic_id, path, format, resolve=resolve,
+            progress=lambda fraction, message: job.update(progress=fraction, message=message),
+        )
+    finally:
+        os.remove(path)
+
+
+@api.route('/topics/<int:topic_id>/import', methods=['POST'])
+def import_references_file(topic_id):
+    """Bulk-import a .bib or RIS file into a topic as a background job.
+
+    The file comes as multipart field 'file' or as the raw request body and
+    is streamed to disk. ?format=bibtex|ris overrides detection by extension
+    and content; ?resolve=1 fills missing metadata from OpenAlex by DOI.
+    Returns the job (202); its result lists the new ids and per-entry errors.
+    """
+    if not topic.get_topic_by_id(topic_id):
+        return jsonify({'error': 'Topic not found'}), 404
+    file = request.files.get('file')
+    path = library_import.spool_upload(file.stream if file else request.stream, jobs.JOBS_DIR)
+    fmt = request.args.get('format') or library_import.detect_format(file.filename if file else '', path)
+    if fmt not in library_import.FORMATS:
+        os.remove(path)
+        return jsonify({'error': 'Unrecognized file format', 'formats': list(library_import.FORMATS)}), 400
+
+    job = jobs.manager.submit('import.references', {
+        'topic_id': topic_id,
+        'upload': os.path.basename(path),
+        'format': fmt,
+        'resolve': request.args.get('resolve') in ('1', 'true'),
+    })
+    return jsonify(job.to_dict()), 202
+
+
+
+@jobs.manager.handler('import.citations')
+def _import_citations_job(job, project_id):
+    return citation_import.import_citations(
+        project_id, progress=lambda fraction, message: job.update(progress=fraction, message=message))
+
+
+@api.route('/projects/<int:project_id>/citations/import', methods=['POST'])
+def import_project_citations(project_id):
+    """Create "cites" connections between a project's references from
+    OpenAlex citation data, as a background job (202). Only references not
+    looked up before are fetched."""
+    if not project.get_project_by_id(project_id):
+        return jsonify({'error': 'Project not found'}), 404
+    job = jobs.manager.submit('import.citations', {'project_id': project_id})
+    return jsonify(job.to_dict()), 202
+
+
+@api.route('/projects/<int:project_id>/citations', methods=['GET'])
+def get_project_citation_stats(project_id):
+    """How many of the project's references have citation data."""
+    return jsonify(citations.get_citation_stats(project_id))
+
+# Background job routes
+@api.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a background job.
+
+    Body: {"type": <job type>, "params": {...}}. Types: export.bibliography,
+    export.bibtex, export.pdfs, export.report and import.citations
+    (params: project_id),
+    import.batch (params: operations, as for /batch) and import.dois
+    (params: dois).
+    """
+    data = request.json or {}
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    try:
+        job = jobs.manager.submit(data.get('type'), params)
+    except KeyError:
+        return jsonify({'error': 'Unknown job type', 'types': jobs.manager.kinds}), 400
+    return jsonify(job.to_dict()), 202
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@api.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.manager.cancel(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@api.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != 'succeeded':
+        status = 409 if not job.finished else 410 if job.status == 'cancelled' else 500
+        return jsonify(job.to_dict()), status
+    if isinstance(job.result, jobs.JobFile):
+        return send_file(job.result.path, mimetype=job.result.mimetype,
+                         as_attachment=True, download_name=job.result.filename)
+    if isinstance(job.result, jobs.SpilledResult):
+        return send_file(job.result.path, mimetype='application/json')
+    return jsonify(job.result)
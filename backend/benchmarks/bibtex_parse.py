@@ -0,0 +1,77 @@
+"""Benchmark the BibTeX parser on a synthetic library.
+
+Usage (from backend/):  python -m benchmarks.bibtex_parse [entries]
+
+Generates a .bib text with realistic entries (LaTeX accents, nested
+braces, @string macros, concatenation) and reports the time to parse and
+to normalize every entry.
+"""
+import random
+import sys
+import time
+
+from services import bibtex
+
+ENTRY_TEMPLATE = '''@{kind}{{{key},
+  author = {{M{{\\"u}}ller, Hans and {{\\v{{C}}}}apek, Karel and Smith, Jr., John and {first} {last}}},
+  title = {{On the {{{acronym}}} of {word} systems: a {{\\'e}}tude {n}}},
+  {venue_field} = {venue},
+  year = {year},
+  month = {month},
+  volume = {{{volume}}},
+  pages = {{{page}--{page_end}}},
+  doi = {{10.{prefix}/{key}}},
+  abstract = {{We study {word} {{systems}} with {{nested {{braces}} and \\& escapes}} in detail.}},
+  keywords = "{word}, {acronym}, benchmarks",
+}}
+'''
+
+WORDS = ['distributed', 'quantum', 'neural', 'stochastic', 'adaptive', 'robust', 'sparse']
+LAST_NAMES = ['Garc{\\\'\\i}a', 'Nguyen', 'Kowalski', '{\\O}stergaard', 'Chen', 'Brown']
+
+
+def generate(count, seed=0):
+    rng = random.Random(seed)
+    parts = ['@string{jmlr = "Journal of Machine Learning Research"}\n',
+             '@comment{Generated by benchmarks/bibtex_parse.py}\n']
+    for i in range(count):
+        page = rng.randint(1, 900)
+        parts.append(ENTRY_TEMPLATE.format(
+            kind=rng.choice(['article', 'inproceedings', 'book']),
+            key=f'key{i}',
+            first=rng.choice(['Ana', 'Li', 'Jan']),
+            last=rng.choice(LAST_NAMES),
+            acronym=rng.choice(['DNA', 'GPU', 'SAT']),
+            word=rng.choice(WORDS),
+            n=i,
+            venue_field=rng.choice(['journal', 'booktitle']),
+            venue=rng.choice(['jmlr', 'jmlr # " (special issue)"', '{Proc. {ACM} Symposium}']),
+            year=rng.randint(1970, 2025),
+            month=rng.choice(['jan', 'jun', 'dec']),
+            volume=rng.randint(1, 60),
+            page=page,
+            page_end=page + rng.randint(1, 30),
+            prefix=rng.randint(1000, 9999),
+        ))
+    return ''.join(parts)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    text = generate(count)
+    print(f'{count} entries, {len(text) / 1e6:.1f} MB')
+
+    start = time.perf_counter()
+    entries = bibtex.parse(text)
+    parsed = time.perf_counter()
+    normalized = [bibtex.normalize_entry(entry) for entry in entries]
+    done = time.perf_counter()
+
+    assert len(entries) == count, len(entries)
+    print(f'parse:     {parsed - start:6.2f} s  ({count / (parsed - start):,.0f} entries/s)')
+    print(f'normalize: {done - parsed:6.2f} s  ({count / (done - parsed):,.0f} entries/s)')
+    print(f'sample:    {normalized[0]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,29 @@
 import sqlite3
 import os
+import threading
+from contextlib import contextmanager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'references.db')
 
-def init_database():
-    """Initialize the database with required tables"""
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+# Connection tuning. WAL lets readers run alongside a writer; NORMAL sync is
+# durable across application crashes in WAL mode and avoids an fsync per commit.
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 32 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+POOL_MAX_IDLE = 8
+
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def _add_missing_columns(cursor, table, columns):
+    """Add columns that predate the migration system but may be absent from
+    databases created by older builds."""
+    existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    for name, declaration in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {declaration}')
 
+
+def _migration_base_schema(cursor):
+    """Create the core tables and bring legacy databases up to date"""
     # Projects table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS projects (
@@ -47,51 +61,13 @@ def init_database():
             citation_count INTEGER DEFAULT 0,
             publication_year INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            bibtex TEXT,
+            sort_order INTEGER DEFAULT 0,
+            pdf_path TEXT,
             FOREIGN KEY (topic_id) REFERENCES topics (id) ON DELETE CASCADE
         )
     ''')
 
-    # Add citation_count column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE paper_references ADD COLUMN citation_count INTEGER DEFAULT 0')
-    except sqlite3.OperationalError:
-        pass
-
-    # Add publication_year column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE paper_references ADD COLUMN publication_year INTEGER')
-    except sqlite3.OperationalError:
-        pass
-
-    # Add bibtex column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE paper_references ADD COLUMN bibtex TEXT')
-    except sqlite3.OperationalError:
-        pass
-
-    # Add grid_width and grid_height columns to topics if they don't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE topics ADD COLUMN grid_width INTEGER DEFAULT 5')
-    except sqlite3.OperationalError:
-        pass
-
-    try:
-        cursor.execute('ALTER TABLE topics ADD COLUMN grid_height INTEGER DEFAULT 3')
-    except sqlite3.OperationalError:
-        pass
-
-    # Add sort_order column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE paper_references ADD COLUMN sort_order INTEGER DEFAULT 0')
-    except sqlite3.OperationalError:
-        pass
-
-    # Add pdf_path column if it doesn't exist (for existing databases)
-    try:
-        cursor.execute('ALTER TABLE paper_references ADD COLUMN pdf_path TEXT')
-    except sqlite3.OperationalError:
-        pass
-
     # Reference connections table (for arrows between references)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS reference_connections (
@@ -105,12 +81,597 @@ def init_database():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # Columns added after the first release (for existing databases)
+    _add_missing_columns(cursor, 'topics', [
+        ('grid_width', 'INTEGER DEFAULT 5'),
+        ('grid_height', 'INTEGER DEFAULT 3'),
+    ])
+    _add_missing_columns(cursor, 'paper_references', [
+        ('citation_count', 'INTEGER DEFAULT 0'),
+        ('publication_year', 'INTEGER'),
+        ('bibtex', 'TEXT'),
+        ('sort_order', 'INTEGER DEFAULT 0'),
+        ('pdf_path', 'TEXT'),
+    ])
+
+
+def _migration_secondary_indexes(cursor):
+    """Index the foreign keys used by project loads and cascading deletes"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_topics_project ON topics (project_id, id)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_references_topic_order
+        ON paper_references (topic_id, sort_order, id)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_references_doi ON paper_references (doi)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_connections_source
+        ON reference_connections (source_reference_id, target_reference_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_connections_target
+        ON reference_connections (target_reference_id)
+    ''')
+    cursor.execute('ANALYZE')
+
+
+def _migration_change_journal(cursor):
+    """Record a per-project change journal, maintained by triggers.
+
+    project_changes keeps one row per (project, entity) with the revision of
+    its latest change; INSERT OR REPLACE assigns a fresh AUTOINCREMENT
+    revision, so revisions only ever grow and the journal stays bounded by
+    the number of rows ever touched. Rows removed by ON DELETE CASCADE whose
+    parent is already gone are not journaled: deleting a topic implies its
+    references, and deleting a reference implies its connections.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS project_changes (
+            revision INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            UNIQUE (project_id, entity, entity_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_project_changes_revision
+        ON project_changes (project_id, revision)
+    ''')
+
+    log = 'INSERT OR REPLACE INTO project_changes (project_id, entity, entity_id, action)'
+    reference_project = 'SELECT project_id FROM topics WHERE id = {}'
+    connection_project = '''
+        SELECT t.project_id FROM paper_references pr JOIN topics t ON t.id = pr.topic_id
+        WHERE pr.id = {}
+    '''
+    triggers = {
+        'trg_topics_insert': f'''AFTER INSERT ON topics BEGIN
+            {log} VALUES (NEW.project_id, 'topic', NEW.id, 'upsert');
+        END''',
+        'trg_topics_update': f'''AFTER UPDATE ON topics BEGIN
+            {log} VALUES (NEW.project_id, 'topic', NEW.id, 'upsert');
+        END''',
+        'trg_topics_delete': f'''AFTER DELETE ON topics BEGIN
+            {log} SELECT id, 'topic', OLD.id, 'delete' FROM projects WHERE id = OLD.project_id;
+        END''',
+        'trg_references_insert': f'''AFTER INSERT ON paper_references BEGIN
+            {log} SELECT ({reference_project.format('NEW.topic_id')}), 'reference', NEW.id, 'upsert'
+            WHERE EXISTS ({reference_project.format('NEW.topic_id')});
+        END''',
+        'trg_references_update': f'''AFTER UPDATE ON paper_references BEGIN
+            {log} SELECT ({reference_project.format('OLD.topic_id')}), 'reference', OLD.id, 'delete'
+            WHERE ({reference_project.format('OLD.topic_id')}) IS NOT ({reference_project.format('NEW.topic_id')});
+            {log} SELECT ({reference_project.format('NEW.topic_id')}), 'reference', NEW.id, 'upsert'
+            WHERE EXISTS ({reference_project.format('NEW.topic_id')});
+        END''',
+        'trg_references_move': f'''AFTER UPDATE OF topic_id ON paper_references
+            WHEN OLD.topic_id IS NOT NEW.topic_id BEGIN
+            {log} SELECT ({connection_project.format('rc.source_reference_id')}), 'connection', rc.id, 'upsert'
+            FROM reference_connections rc
+            WHERE rc.source_reference_id = NEW.id OR rc.target_reference_id = NEW.id;
+        END''',
+        'trg_references_delete': f'''AFTER DELETE ON paper_references BEGIN
+            {log} SELECT project_id, 'reference', OLD.id, 'delete' FROM topics WHERE id = OLD.topic_id;
+        END''',
+        'trg_connections_insert': f'''AFTER INSERT ON reference_connections BEGIN
+            {log} SELECT ({connection_project.format('NEW.source_reference_id')}), 'connection', NEW.id, 'upsert'
+            WHERE EXISTS ({connection_project.format('NEW.source_reference_id')});
+        END''',
+        'trg_connections_update': f'''AFTER UPDATE ON reference_connections BEGIN
+            {log} SELECT ({connection_project.format('NEW.source_reference_id')}), 'connection', NEW.id, 'upsert'
+            WHERE EXISTS ({connection_project.format('NEW.source_reference_id')});
+        END''',
+        'trg_connections_delete': f'''AFTER DELETE ON reference_connections BEGIN
+            {log} SELECT ({connection_project.format('OLD.source_reference_id')}), 'connection', OLD.id, 'delete'
+            WHERE EXISTS ({connection_project.format('OLD.source_reference_id')});
+        END''',
+        'trg_projects_delete': '''AFTER DELETE ON projects BEGIN
+            DELETE FROM project_changes WHERE project_id = OLD.id;
+        END''',
+    }
+    for name, body in triggers.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def _migration_reference_search(cursor):
+    """Full-text index over references, kept in sync by triggers.
+
+    reference_search is an external-content FTS5 table: it stores only the
+    index and reads column values back from paper_references by rowid.
+    """
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS reference_search USING fts5(
+            title, authors, abstract, notes, bibtex,
+            content='paper_references', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='3'
+        )
+    ''')
+    columns = 'title, authors, abstract, notes, bibtex'
+    insert_new = f'''INSERT INTO reference_search (rowid, {columns})
+        VALUES (NEW.id, NEW.title, NEW.authors, NEW.abstract, NEW.notes, NEW.bibtex);'''
+    delete_old = f'''INSERT INTO reference_search (reference_search, rowid, {columns})
+        VALUES ('delete', OLD.id, OLD.title, OLD.authors, OLD.abstract, OLD.notes, OLD.bibtex);'''
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS trg_reference_search_insert AFTER INSERT ON paper_references BEGIN {insert_new} END')
+    cursor.execute(f'CREATE TRIGGER IF NOT EXISTS trg_reference_search_delete AFTER DELETE ON paper_references BEGIN {delete_old} END')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_reference_search_update
+        AFTER UPDATE OF {columns} ON paper_references BEGIN {delete_old} {insert_new} END''')
+    cursor.execute("INSERT INTO reference_search (reference_search) VALUES ('rebuild')")
+
+
+def _migration_pdf_blobs(cursor):
+    """Reference-counted registry of content-addressed PDF blobs.
+
+    Triggers on paper_references.pdf_path keep ref_count exact across
+    inserts, duplicates, replacements and (cascading) deletes. Blobs that
+    drop to zero references are stamped with orphaned_at and removed later
+    by garbage collection, so deleting is just a counter decrement.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_blobs (
+            path TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            orphaned_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pdf_blobs_orphaned
+        ON pdf_blobs (orphaned_at) WHERE ref_count <= 0
+    ''')
+
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    acquire = '''UPDATE pdf_blobs SET ref_count = ref_count + 1, orphaned_at = NULL
+        WHERE path = NEW.pdf_path;'''
+    release = f'''UPDATE pdf_blobs SET ref_count = ref_count - 1,
+        orphaned_at = CASE WHEN ref_count <= 1 THEN {now} ELSE orphaned_at END
+        WHERE path = OLD.pdf_path;'''
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_pdf_blobs_insert
+        AFTER INSERT ON paper_references WHEN NEW.pdf_path IS NOT NULL BEGIN {acquire} END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_pdf_blobs_update
+        AFTER UPDATE OF pdf_path ON paper_references WHEN OLD.pdf_path IS NOT NEW.pdf_path
+        BEGIN {release} {acquire} END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_pdf_blobs_delete
+        AFTER DELETE ON paper_references WHEN OLD.pdf_path IS NOT NULL BEGIN {release} END''')
+
+
+def _migration_pdf_text(cursor):
+    """Page-level full-text index of attached PDFs.
+
+    pdf_text_documents tracks extraction per stored file (pending, indexed
+    or failed), so the pipeline can resume after a restart; pdf_text_pages
+    holds the text of each page and pdf_text_search is its external-content
+    FTS5 index. Text is keyed by pdf_path, so references sharing a blob
+    share its index; dropping a blob drops its text.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_text_documents (
+            pdf_path TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            page_count INTEGER,
+            error TEXT,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pdf_text_pages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pdf_path TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            UNIQUE (pdf_path, page_number)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_references_pdf_path
+        ON paper_references (pdf_path) WHERE pdf_path IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS pdf_text_search USING fts5(
+            text, content='pdf_text_pages', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='3'
+        )
+    ''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_pdf_text_search_insert
+        AFTER INSERT ON pdf_text_pages BEGIN
+            INSERT INTO pdf_text_search (rowid, text) VALUES (NEW.id, NEW.text);
+        END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_pdf_text_search_delete
+        AFTER DELETE ON pdf_text_pages BEGIN
+            INSERT INTO pdf_text_search (pdf_text_search, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+        END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_pdf_text_blob_delete
+        AFTER DELETE ON pdf_blobs BEGIN
+            DELETE FROM pdf_text_pages WHERE pdf_path = OLD.path;
+            DELETE FROM pdf_text_documents WHERE pdf_path = OLD.path;
+        END''')
+
+
+def _migration_bibtex_fields(cursor):
+    """Normalized BibTeX metadata stored alongside the raw entry.
+
+    The model parses paper_references.bibtex on every write; this backfills
+    rows written before that.
+    """
+    from services import bibtex
+
+    _add_missing_columns(cursor, 'paper_references', [
+        ('citekey', 'TEXT'),
+        ('entry_type', 'TEXT'),
+        ('bib_authors', 'TEXT'),
+        ('venue', 'TEXT'),
+    ])
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_references_citekey
+        ON paper_references (citekey) WHERE citekey IS NOT NULL
+    ''')
+    rows = cursor.execute(
+        "SELECT id, bibtex FROM paper_references WHERE bibtex IS NOT NULL AND bibtex != ''"
+    ).fetchall()
+    updates = []
+    for reference_id, text in rows:
+        parsed = bibtex.parse_reference(text)
+        if parsed:
+            updates.append((parsed['citekey'], parsed['entry_type'], parsed['authors'],
+                            parsed['venue'], reference_id))
+    cursor.executemany(
+        'UPDATE paper_references SET citekey = ?, entry_type = ?, bib_authors = ?, venue = ? WHERE id = ?',
+        updates
+    )
+
+
+def _migration_duplicate_index(cursor):
+    """Indexes for duplicate detection.
+
+    paper_references.doi_key holds the normalized DOI, so equal DOIs
+    written differently (case, doi.org prefix) meet in one index lookup.
+    reference_title_bands holds the MinHash LSH buckets of each title
+    (see services.minhash): references sharing any (band, bucket) are
+    near-duplicate candidates. Both are maintained by the reference model;
+    this backfills existing rows.
+    """
+    from services import minhash
+    from services.doi import normalize_doi
+
+    _add_missing_columns(cursor, 'paper_references', [('doi_key', 'TEXT')])
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_references_doi_key
+        ON paper_references (doi_key) WHERE doi_key IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reference_title_bands (
+            reference_id INTEGER NOT NULL REFERENCES paper_references(id) ON DELETE CASCADE,
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            PRIMARY KEY (reference_id, band)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_title_bands_bucket
+        ON reference_title_bands (band, bucket)
+    ''')
+    # Foreign keys are off on the migration connection; the trigger keeps
+    # the bands clean however a reference is deleted
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_title_bands_delete
+        AFTER DELETE ON paper_references BEGIN
+            DELETE FROM reference_title_bands WHERE reference_id = OLD.id;
+        END''')
+
+    rows = cursor.execute('SELECT id, title, doi FROM paper_references').fetchall()
+    cursor.executemany(
+        'UPDATE paper_references SET doi_key = ? WHERE id = ?',
+        [(normalize_doi(doi) or None, reference_id) for reference_id, _, doi in rows if doi]
+    )
+    cursor.executemany(
+        'INSERT OR REPLACE INTO reference_title_bands (reference_id, band, bucket) VALUES (?, ?, ?)',
+        [(reference_id, band, bucket)
+         for reference_id, title, _ in rows
+         for band, bucket in minhash.band_buckets(title)]
+    )
+
+
+def _migration_citation_sources(cursor):
+    """What OpenAlex says each reference cites, for citation-edge import.
+
+    reference_openalex records, per reference, the DOI it was looked up
+    under and the OpenAlex work it resolved to (work_key: the numeric part
+    of the W-id, NULL when not found); a reference is fetched again only
+    when its DOI changes. reference_cited_works lists the works it cites,
+    so edges to references added later are found without refetching.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reference_openalex (
+            reference_id INTEGER PRIMARY KEY REFERENCES paper_references(id) ON DELETE CASCADE,
+            doi_key TEXT NOT NULL,
+            work_key INTEGER,
+            fetched_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reference_openalex_work
+        ON reference_openalex (work_key) WHERE work_key IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reference_cited_works (
+            reference_id INTEGER NOT NULL REFERENCES paper_references(id) ON DELETE CASCADE,
+            work_key INTEGER NOT NULL,
+            PRIMARY KEY (reference_id, work_key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cited_works_work
+        ON reference_cited_works (work_key)
+    ''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_citation_sources_delete
+        AFTER DELETE ON paper_references BEGIN
+            DELETE FROM reference_openalex WHERE reference_id = OLD.id;
+            DELETE FROM reference_cited_works WHERE reference_id = OLD.id;
+        END''')
+
+
+def _migration_doi_keys(cursor):
+    """Recompute doi_key now that dx.doi.org prefixes are stripped too"""
+    from services.doi import normalize_doi
+
+    rows = cursor.execute(
+        "SELECT id, doi, doi_key FROM paper_references WHERE doi IS NOT NULL AND doi != ''"
+    ).fetchall()
+    cursor.executemany(
+        'UPDATE paper_references SET doi_key = ? WHERE id = ?',
+        [(normalize_doi(doi) or None, reference_id) for reference_id, doi, doi_key in rows
+         if (normalize_doi(doi) or None) != doi_key]
+    )
+
+
+def _migration_export_keys(cursor):
+    """Citekeys references were exported under, so later exports keep them.
+
+    base_key is the key the reference asked for (its own citekey or the
+    generated one) when the export key was assigned; the export key is
+    reassigned only when that changes.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reference_export_keys (
+            reference_id INTEGER PRIMARY KEY REFERENCES paper_references(id) ON DELETE CASCADE,
+            base_key TEXT NOT NULL,
+            citekey TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_export_keys_delete
+        AFTER DELETE ON paper_references BEGIN
+            DELETE FROM reference_export_keys WHERE reference_id = OLD.id;
+        END''')
+
+
+def _migration_imported_citations(cursor):
+    """Citation pairs the OpenAlex import has already turned into
+    connections, so a re-run does not bring back ones the user deleted.
+
+    Backfilled with the existing connections that match a known citation.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS imported_citations (
+            source_reference_id INTEGER NOT NULL REFERENCES paper_references(id) ON DELETE CASCADE,
+            target_reference_id INTEGER NOT NULL REFERENCES paper_references(id) ON DELETE CASCADE,
+            PRIMARY KEY (source_reference_id, target_reference_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_imported_citations_target
+        ON imported_citations (target_reference_id)
+    ''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS trg_imported_citations_delete
+        AFTER DELETE ON paper_references BEGIN
+            DELETE FROM imported_citations
+            WHERE source_reference_id = OLD.id OR target_reference_id = OLD.id;
+        END''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO imported_citations (source_reference_id, target_reference_id)
+        SELECT rc.source_reference_id, rc.target_reference_id
+        FROM reference_connections rc
+        JOIN reference_cited_works cw ON cw.reference_id = rc.source_reference_id
+        JOIN reference_openalex ro ON ro.work_key = cw.work_key
+                                  AND ro.reference_id = rc.target_reference_id
+    ''')
+
+
+# Ordered schema migrations. Entry N (1-based) upgrades a database from
+# PRAGMA user_version N-1 to N; append new migrations, never reorder them.
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_secondary_indexes,
+    _migration_change_journal,
+    _migration_reference_search,
+    _migration_pdf_blobs,
+    _migration_pdf_text,
+    _migration_bibtex_fields,
+    _migration_duplicate_index,
+    _migration_citation_sources,
+    _migration_doi_keys,
+    _migration_export_keys,
+    _migration_imported_citations,
+]
+
+
+def init_database():
+    """Initialize the database and apply any pending schema migrations"""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                migration(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
 
 def get_connection():
-    """Get a database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON")
+    """Open a new, tuned database connection (not pooled).
+
+    The connection runs in autocommit mode; transactions are opened
+    explicitly by `transaction()`.
+    """
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
     return conn
+
+
+class ConnectionPool:
+    """Hands each thread one pooled connection for the duration of a scope.
+
+    The Flask dev server spawns a thread per request, so connections are not
+    pinned to threads forever: the outermost scope checks a connection out,
+    nested scopes on the same thread reuse it, and it goes back to the idle
+    list when the outermost scope exits.
+    """
+
+    def __init__(self, max_idle=POOL_MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def acquire(self):
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            local.conn = conn or get_connection()
+            local.depth = 0
+        local.depth += 1
+        return local.conn
+
+    def release(self):
+        local = self._local
+        local.depth -= 1
+        if local.depth > 0:
+            return
+        conn = local.conn
+        local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        """Close every idle connection (e.g. after DB_PATH changes)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = ConnectionPool()
+
+
+@contextmanager
+def read_connection():
+    """Borrow the thread's pooled connection for reads.
+
+    Inside a `transaction()` this yields the same connection, so reads see
+    the enclosing transaction's uncommitted writes.
+    """
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release()
+
+
+_commit_hooks = threading.local()
+
+
+@contextmanager
+def transaction():
+    """Borrow the thread's pooled connection inside a write transaction.
+
+    The outermost scope issues BEGIN IMMEDIATE and commits on success or
+    rolls back on any exception; nested scopes join the outer transaction.
+    Callbacks registered with `after_commit()` run once the outermost scope
+    has committed.
+    """
+    conn = _pool.acquire()
+    owner = not conn.in_transaction
+    try:
+        if owner:
+            conn.execute('BEGIN IMMEDIATE')
+            _commit_hooks.pending = []
+        yield conn
+        if owner:
+            conn.execute('COMMIT')
+    except BaseException:
+        if owner and conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        if owner:
+            callbacks, _commit_hooks.pending = getattr(_commit_hooks, 'pending', None), None
+        _pool.release()
+    if owner:
+        for callback in callbacks:
+            callback()
+
+
+def after_commit(callback):
+    """Run `callback` when the current thread's transaction commits, or
+    right away outside a transaction; dropped if the transaction rolls
+    back. For in-process caches that must not be refilled from the old
+    state while a write is still in flight."""
+    pending = getattr(_commit_hooks, 'pending', None)
+    if pending is None:
+        callback()
+    else:
+        pending.append(callback)
+
+
+def close_pool():
+    """Close all idle pooled connections."""
+    _pool.close_all()
@@ -1,17 +1,48 @@
 from flask import Flask
 from flask_cors import CORS
-from database import init_database
-from api.routes import api
+from werkzeug.serving import is_running_from_reloader
 
-app = Flask(__name__)
-CORS(app)
 
-# Initialize database
-init_database()
+# Debug mode, and with it the auto-reloader, for the local API server
+DEBUG = True
+
+
+def create_app(serving=True):
+    """Build the app. `serving` is False in a process that will never
+    handle requests (the debug reloader's file watcher), which then skips
+    the startup work owned by the serving process."""
+    # Imported here so that PDF text worker processes, which re-import this
+    # module, never set up the API (or wipe the job directory) themselves
+    from database import init_database
+    from api.routes import api
+    from services import jobs, pdf_store, pdf_text
+
+    app = Flask(__name__)
+    CORS(app)
+
+    # Initialize database
+    init_database()
+
+    # Reclaim PDF blobs left unreferenced by earlier sessions, and drop job
+    # result files of the previous run. The watcher must do neither, or it
+    # could delete files the serving child it restarted is still writing.
+    if serving:
+        pdf_store.collect_garbage()
+        jobs.clear_results()
+
+    # Index PDFs left unprocessed (or interrupted by a crash) in earlier
+    # sessions, in whichever process serves requests
+    if serving:
+        pdf_text.indexer.resume()
+
+    # Register blueprints
+    app.register_blueprint(api, url_prefix='/api')
+    return app
 
-# Register blueprints
-app.register_blueprint(api, url_prefix='/api')
 
 if __name__ == '__main__':
+    # With the reloader, the process started first only watches files and
+    # spawns the serving child
+    app = create_app(serving=is_running_from_reloader() or not DEBUG)
     print('Starting Reference Manager API on http://localhost:5000')
-    app.run(host='localhost', port=5000, debug=True)
+    app.run(host='localhost', port=5000, debug=DEBUG)
@@ -0,0 +1,217 @@
+import json
+import re
+import sqlite3
+from database import transaction
+from models import topic, reference, connection
+
+
+class BatchError(Exception):
+    """Raised when an operation in a batch fails; the whole batch is rolled back"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+# Keys whose values may be "$<n>" placeholders for the id assigned by the
+# n-th operation of the same batch (e.g. a reference created in a new topic).
+ID_KEYS = ('id', 'project_id', 'topic_id', 'target_topic_id',
+           'source_reference_id', 'target_reference_id')
+PLACEHOLDER_RE = re.compile(r'^\$(\d+)$')
+
+# Accepted types of the other fields, checked for every operation before
+# any of them runs
+TEXT_KEYS = ('name', 'title', 'doi', 'authors', 'abstract', 'notes', 'bibtex',
+             'description', 'color')
+NUMBER_KEYS = ('position_x', 'position_y')
+INTEGER_KEYS = ('citation_count',)
+OPTIONAL_INTEGER_KEYS = ('publication_year',)
+
+
+def _reference_fields(op):
+    return (
+        op.get('doi', ''),
+        op.get('authors', ''),
+        op.get('abstract', ''),
+        op.get('notes', ''),
+        op.get('citation_count', 0),
+        op.get('publication_year', None),
+        op.get('bibtex', ''),
+    )
+
+
+# Single-operation handlers
+HANDLERS = {
+    'topic.create': lambda op: topic.create_topic(
+        op['project_id'], op['name'], op.get('position_x', 0), op.get('position_y', 0),
+        op.get('color', '#007bff')),
+    'topic.update': lambda op: topic.update_topic_name(op['id'], op['name']),
+    'topic.delete': lambda op: topic.delete_topic(op['id']),
+    'reference.create': lambda op: reference.create_reference(
+        op['topic_id'], op['title'], *_reference_fields(op)),
+    'reference.update': lambda op: reference.update_reference(
+        op['id'], op.get('title'), *_reference_fields(op)),
+    'reference.move': lambda op: reference.move_reference(op['id'], op['target_topic_id']),
+    'reference.duplicate': lambda op: reference.duplicate_reference(op['id'], op['target_topic_id']),
+    'reference.delete': lambda op: reference.delete_reference(op['id']),
+    'reference.reorder': lambda op: reference.reorder_references(
+        op['topic_id'], op['reference_ids']),
+    'connection.create': lambda op: connection.create_connection(
+        op['source_reference_id'], op['target_reference_id'], op.get('description', '')),
+    'connection.update': lambda op: connection.update_connection(op['id'], op.get('description', '')),
+    'connection.delete': lambda op: connection.delete_connection(op['id']),
+}
+
+# Operations whose handler returns a newly assigned id
+CREATE_OPS = {'topic.create', 'reference.create', 'reference.duplicate', 'connection.create'}
+
+# Operations on existing rows: their handler returns whether the rows matched
+MATCH_OPS = {'topic.update', 'topic.delete', 'reference.update', 'reference.move',
+             'reference.delete', 'reference.reorder', 'connection.update', 'connection.delete'}
+
+# Runs of consecutive operations of these kinds are applied with one executemany
+GROUP_HANDLERS = {
+    'topic.delete': lambda ops: topic.delete_topics([op['id'] for op in ops]),
+    'reference.delete': lambda ops: reference.delete_references([op['id'] for op in ops]),
+    'reference.move': lambda ops: reference.move_references(
+        [(op['id'], op['target_topic_id']) for op in ops]),
+    'connection.delete': lambda ops: connection.delete_connections([op['id'] for op in ops]),
+}
+
+# Table whose rows each grouped operation addresses by 'id'
+GROUP_TABLES = {
+    'topic.delete': 'topics',
+    'reference.delete': 'paper_references',
+    'reference.move': 'paper_references',
+    'connection.delete': 'reference_connections',
+}
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _resolve(index, op, assigned_ids):
+    """Replace "$<n>" placeholders with ids assigned earlier in the batch"""
+    def lookup(value):
+        match = PLACEHOLDER_RE.match(value) if isinstance(value, str) else None
+        if not match:
+            return value
+        target = int(match.group(1))
+        if target >= index or assigned_ids[target] is None:
+            raise BatchError(index, f'placeholder {value} does not refer to an earlier created id')
+        return assigned_ids[target]
+
+    resolved = dict(op)
+    for key in ID_KEYS:
+        if key in resolved:
+            resolved[key] = lookup(resolved[key])
+    if isinstance(resolved.get('reference_ids'), list):
+        resolved['reference_ids'] = [lookup(v) for v in resolved['reference_ids']]
+    return resolved
+
+
+def _check_field_types(index, op):
+    """Reject mistyped data fields (a number for a title, say) of one
+    operation"""
+    name = op['op']
+    for key in TEXT_KEYS:
+        if key in op and not isinstance(op[key], str):
+            raise BatchError(index, f'{name}: {key} must be a string')
+    for key in NUMBER_KEYS:
+        if key in op and not (isinstance(op[key], (int, float)) and not isinstance(op[key], bool)):
+            raise BatchError(index, f'{name}: {key} must be a number')
+    for key in INTEGER_KEYS:
+        if key in op and not _is_id(op[key]):
+            raise BatchError(index, f'{name}: {key} must be an integer')
+    for key in OPTIONAL_INTEGER_KEYS:
+        if op.get(key) is not None and not _is_id(op[key]):
+            raise BatchError(index, f'{name}: {key} must be an integer or null')
+
+
+def _check_types(index, op):
+    """Reject id fields that are not integers before anything reaches SQL"""
+    name = op['op']
+    for key in ID_KEYS:
+        if key in op and not _is_id(op[key]):
+            raise BatchError(index, f'{name}: {key} must be an integer id')
+    if 'reference_ids' in op and not (
+            isinstance(op['reference_ids'], list) and all(_is_id(v) for v in op['reference_ids'])):
+        raise BatchError(index, f'{name}: reference_ids must be a list of integer ids')
+
+
+def _first_unmatched(conn, name, ops):
+    """Offset of the first operation in a group whose id names no row, or
+    a row an earlier delete of the group removes; None when all match"""
+    ids = [op['id'] for op in ops]
+    existing = {row[0] for row in conn.execute(
+        f'SELECT id FROM {GROUP_TABLES[name]} WHERE id IN (SELECT value FROM json_each(?))',
+        (json.dumps(ids),)
+    )}
+    deleted = set()
+    for offset, item_id in enumerate(ids):
+        if item_id not in existing or item_id in deleted:
+            return offset
+        if name.endswith('.delete'):
+            deleted.add(item_id)
+    return None
+
+
+def apply_operations(operations):
+    """Apply an ordered list of operations atomically.
+
+    Each operation is a dict with an 'op' key (e.g. 'reference.create') plus
+    the fields of the matching single-item route. Returns the list of ids
+    assigned by each operation (None for operations that create nothing).
+    Raises BatchError, after rolling everything back, if any operation fails:
+    a missing or mistyped field, or an update, move or delete whose id
+    matches no row.
+    """
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get('op') not in HANDLERS:
+            name = op.get('op') if isinstance(op, dict) else None
+            raise BatchError(index, f'unknown operation {name!r}')
+        _check_field_types(index, op)
+
+    assigned_ids = [None] * len(operations)
+    with transaction() as conn:
+        index = 0
+        while index < len(operations):
+            name = operations[index]['op']
+            end = index + 1
+            if name in GROUP_HANDLERS:
+                while end < len(operations) and operations[end]['op'] == name:
+                    end += 1
+            failed = index
+            try:
+                ops = []
+                for i in range(index, end):
+                    failed = i
+                    ops.append(_resolve(i, operations[i], assigned_ids))
+                    _check_types(i, ops[-1])
+                    if end - index > 1 and 'id' not in ops[-1]:
+                        raise KeyError('id')
+                failed = index
+                if end - index > 1:
+                    unmatched = _first_unmatched(conn, name, ops)
+                    if unmatched is not None:
+                        raise BatchError(index + unmatched, f'{name}: no row with id {ops[unmatched]["id"]}')
+                    GROUP_HANDLERS[name](ops)
+                else:
+                    result = HANDLERS[name](ops[0])
+                    if name in CREATE_OPS:
+                        if result is None:
+                            raise BatchError(index, f'{name}: no row with id {ops[0]["id"]}')
+                        assigned_ids[index] = result
+                    elif name in MATCH_OPS and not result:
+                        if name == 'reference.reorder':
+                            raise BatchError(index, f'{name}: reference_ids are not all in topic {ops[0]["topic_id"]}')
+                        raise BatchError(index, f'{name}: no row with id {ops[0]["id"]}')
+            except KeyError as e:
+                raise BatchError(failed, f'{name}: missing field {e.args[0]!r}')
+            except (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError,
+                    AttributeError, TypeError, ValueError) as e:
+                raise BatchError(failed, f'{name}: {e}')
+            index = end
+    return assigned_ids
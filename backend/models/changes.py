@@ -0,0 +1,67 @@
+import json
+from database import read_connection
+
+REFERENCE_COLUMNS = ('id, topic_id, title, doi, authors, abstract, notes, citation_count, '
+                     'publication_year, created_at, bibtex, pdf_path, citekey, entry_type, bib_authors, venue')
+
+def get_project_revision(project_id):
+    """Get the latest change revision of a project (0 if it was never changed)"""
+    with read_connection() as conn:
+        row = conn.execute(
+            'SELECT MAX(revision) FROM project_changes WHERE project_id = ?', (project_id,)
+        ).fetchone()
+    return row[0] or 0
+
+def get_changes_since(project_id, since):
+    """Get the rows of a project that changed after revision `since`.
+
+    Returns the current revision, the full current state of every upserted
+    topic (without references), reference and connection, and the ids of
+    deleted ones. Deleting a topic implies deleting its references, and
+    deleting a reference implies deleting its connections.
+    """
+    with read_connection() as conn:
+        revision = conn.execute(
+            'SELECT MAX(revision) FROM project_changes WHERE project_id = ?', (project_id,)
+        ).fetchone()[0] or 0
+
+        upserts = {'topic': [], 'reference': [], 'connection': []}
+        deleted = {'topic': [], 'reference': [], 'connection': []}
+        for row in conn.execute(
+            'SELECT entity, entity_id, action FROM project_changes WHERE project_id = ? AND revision > ?',
+            (project_id, since)
+        ):
+            target = upserts if row['action'] == 'upsert' else deleted
+            target[row['entity']].append(row['entity_id'])
+
+        topics = [dict(row) for row in conn.execute(
+            'SELECT * FROM topics WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id',
+            (json.dumps(upserts['topic']),)
+        )]
+        references = [dict(row) for row in conn.execute(
+            f'''SELECT {REFERENCE_COLUMNS} FROM paper_references
+                WHERE id IN (SELECT value FROM json_each(?))
+                ORDER BY topic_id, sort_order ASC, id ASC''',
+            (json.dumps(upserts['reference']),)
+        )]
+        connections = [dict(row) for row in conn.execute('''
+            SELECT rc.*,
+                   pr1.topic_id as source_topic_id,
+                   pr2.topic_id as target_topic_id
+            FROM reference_connections rc
+            JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
+            JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
+            WHERE rc.id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(upserts['connection']),))]
+
+    return {
+        'revision': revision,
+        'topics': topics,
+        'references': references,
+        'connections': connections,
+        'deleted': {
+            'topics': deleted['topic'],
+            'references': deleted['reference'],
+            'connections': deleted['connection'],
+        },
+    }
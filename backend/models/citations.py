@@ -0,0 +1,80 @@
+import time
+from database import read_connection, transaction
+from models.reference import PROJECT_REFERENCES
+
+def get_unfetched(project_id):
+    """(reference_id, doi_key) of a project's references with a DOI that
+    were never looked up, or were looked up under a different DOI"""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT pr.id, pr.doi_key FROM paper_references pr
+            JOIN topics t ON t.id = pr.topic_id
+            LEFT JOIN reference_openalex ro ON ro.reference_id = pr.id
+            WHERE t.project_id = ? AND pr.doi_key IS NOT NULL
+              AND ro.doi_key IS NOT pr.doi_key
+        ''', (project_id,)).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+def store_lookups(lookups):
+    """Record OpenAlex lookups; `lookups` are (reference_id, doi_key,
+    work_key or None, cited work_keys), replacing earlier ones"""
+    now = int(time.time())
+    with transaction() as conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO reference_openalex (reference_id, doi_key, work_key, fetched_at) VALUES (?, ?, ?, ?)',
+            [(reference_id, doi_key, work_key, now) for reference_id, doi_key, work_key, _ in lookups]
+        )
+        conn.executemany('DELETE FROM reference_cited_works WHERE reference_id = ?',
+                         [(reference_id,) for reference_id, _, _, _ in lookups])
+        conn.executemany(
+            'INSERT OR IGNORE INTO reference_cited_works (reference_id, work_key) VALUES (?, ?)',
+            [(reference_id, cited) for reference_id, _, _, cited_works in lookups for cited in cited_works]
+        )
+    return True
+
+def insert_citation_edges(project_id, description=''):
+    """Connect every reference of a project to the references it cites
+    (by OpenAlex work), skipping pairs already connected in that direction
+    and pairs an earlier import already handled, so connections the user
+    deleted stay deleted. Returns the number of connections created."""
+    with transaction() as conn:
+        pairs = conn.execute(f'''
+            SELECT DISTINCT cw.reference_id, ro.reference_id
+            FROM reference_cited_works cw
+            JOIN reference_openalex ro ON ro.work_key = cw.work_key
+            WHERE cw.reference_id IN ({PROJECT_REFERENCES}) AND ro.reference_id IN ({PROJECT_REFERENCES})
+              AND cw.reference_id != ro.reference_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM imported_citations ic
+                  WHERE ic.source_reference_id = cw.reference_id
+                    AND ic.target_reference_id = ro.reference_id
+              )
+        ''', (project_id, project_id)).fetchall()
+        cursor = conn.executemany('''
+            INSERT INTO reference_connections (source_reference_id, target_reference_id, description)
+            SELECT ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM reference_connections
+                WHERE source_reference_id = ? AND target_reference_id = ?
+            )
+        ''', [(source, target, description, source, target) for source, target in pairs])
+        created = cursor.rowcount if pairs else 0
+        conn.executemany(
+            'INSERT INTO imported_citations (source_reference_id, target_reference_id) VALUES (?, ?)',
+            [tuple(pair) for pair in pairs]
+        )
+    return created
+
+def get_citation_stats(project_id):
+    """How many of a project's references have a DOI, were looked up, and
+    resolved to an OpenAlex work"""
+    with read_connection() as conn:
+        row = conn.execute('''
+            SELECT COUNT(pr.doi_key), COUNT(ro.reference_id), COUNT(ro.work_key),
+                   SUM(ro.doi_key IS NOT pr.doi_key AND pr.doi_key IS NOT NULL)
+            FROM paper_references pr
+            JOIN topics t ON t.id = pr.topic_id
+            LEFT JOIN reference_openalex ro ON ro.reference_id = pr.id
+            WHERE t.project_id = ?
+        ''', (project_id,)).fetchone()
+    return {'with_doi': row[0], 'fetched': row[1], 'resolved': row[2], 'pending': row[3] or 0}
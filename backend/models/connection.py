@@ -1,62 +1,143 @@
-from database import get_connection
+import json
+from database import read_connection, transaction
 
 def create_connection(source_reference_id, target_reference_id, description=''):
     """Create a new connection between two references"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute(
-        'INSERT INTO reference_connections (source_reference_id, target_reference_id, description) VALUES (?, ?, ?)',
-        (source_reference_id, target_reference_id, description)
-    )
+        cursor.execute(
+            'INSERT INTO reference_connections (source_reference_id, target_reference_id, description) VALUES (?, ?, ?)',
+            (source_reference_id, target_reference_id, description)
+        )
 
-    connection_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+        connection_id = cursor.lastrowid
 
     return connection_id
 
 def get_connections_by_project(project_id):
     """Get all connections for references in a project"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT rc.*,
-               pr1.topic_id as source_topic_id,
-               pr2.topic_id as target_topic_id
-        FROM reference_connections rc
-        JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
-        JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
-        JOIN topics t1 ON pr1.topic_id = t1.id
-        WHERE t1.project_id = ?
-    ''', (project_id,))
-
-    connections = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT rc.*,
+                   pr1.topic_id as source_topic_id,
+                   pr2.topic_id as target_topic_id
+            FROM reference_connections rc
+            JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
+            JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
+            JOIN topics t1 ON pr1.topic_id = t1.id
+            WHERE t1.project_id = ?
+        ''', (project_id,))
+
+        connections = [dict(row) for row in cursor.fetchall()]
 
     return connections
 
-def update_connection(connection_id, description):
-    """Update a connection's description"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_connections_between_topics(topic_ids):
+    """Connections whose source and target references both sit in one of
+    `topic_ids`, in the shape of get_connections_by_project"""
+    with read_connection() as conn:
+        cursor = conn.execute('''
+            WITH wanted(id) AS (SELECT value FROM json_each(?))
+            SELECT rc.*,
+                   pr1.topic_id as source_topic_id,
+                   pr2.topic_id as target_topic_id
+            FROM reference_connections rc
+            JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
+            JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
+            WHERE pr1.topic_id IN wanted AND pr2.topic_id IN wanted
+        ''', (json.dumps(list(topic_ids)),))
+        connections = [dict(row) for row in cursor.fetchall()]
+
+    return connections
 
-    cursor.execute(
-        'UPDATE reference_connections SET description = ? WHERE id = ?',
-        (description, connection_id)
-    )
+def get_project_graph(project_id):
+    """A project's reference ids and its connections as (source, target)
+    id pairs, for building the in-memory graph; plain tuples, since both
+    lists can run to 100k+ rows"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        node_ids = [row[0] for row in cursor.execute('''
+            SELECT pr.id FROM paper_references pr
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE t.project_id = ?
+        ''', (project_id,))]
+        edges = cursor.execute('''
+            SELECT rc.source_reference_id, rc.target_reference_id
+            FROM reference_connections rc
+            JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
+            JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
+            JOIN topics t1 ON pr1.topic_id = t1.id
+            JOIN topics t2 ON pr2.topic_id = t2.id
+            WHERE t1.project_id = ? AND t2.project_id = ?
+        ''', (project_id, project_id)).fetchall()
+    return node_ids, edges
 
-    conn.commit()
-    conn.close()
+def get_topic_connection_weights(project_id):
+    """(topic_id, topic_id, connection_count) for every pair of distinct
+    topics in a project joined by reference connections, the smaller id
+    first"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute('''
+            SELECT MIN(pr1.topic_id, pr2.topic_id), MAX(pr1.topic_id, pr2.topic_id), COUNT(*)
+            FROM reference_connections rc
+            JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
+            JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
+            JOIN topics t1 ON pr1.topic_id = t1.id
+            JOIN topics t2 ON pr2.topic_id = t2.id
+            WHERE t1.project_id = ? AND t2.project_id = ? AND pr1.topic_id != pr2.topic_id
+            GROUP BY 1, 2
+        ''', (project_id, project_id)).fetchall()
 
-def delete_connection(connection_id):
-    """Delete a connection"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def iter_report_connections(project_id, batch_size=500):
+    """Yield a project's connections with readable titles and topic names"""
+    with read_connection() as conn:
+        cursor = conn.execute('''
+            SELECT pr1.title AS source_title, t1.name AS source_topic,
+                   pr2.title AS target_title, t2.name AS target_topic,
+                   rc.description
+            FROM reference_connections rc
+            JOIN paper_references pr1 ON rc.source_reference_id = pr1.id
+            JOIN paper_references pr2 ON rc.target_reference_id = pr2.id
+            JOIN topics t1 ON pr1.topic_id = t1.id
+            JOIN topics t2 ON pr2.topic_id = t2.id
+            WHERE t1.project_id = ? AND t2.project_id = ?
+            ORDER BY rc.id
+        ''', (project_id, project_id))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            cursor.close()
 
-    cursor.execute('DELETE FROM reference_connections WHERE id = ?', (connection_id,))
+def update_connection(connection_id, description):
+    """Update a connection's description; returns whether it exists"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            'UPDATE reference_connections SET description = ? WHERE id = ?',
+            (description, connection_id)
+        )
+    return cursor.rowcount > 0
 
-    conn.commit()
-    conn.close()
+def delete_connection(connection_id):
+    """Delete a connection; returns whether it existed"""
+    with transaction() as conn:
+        cursor = conn.execute('DELETE FROM reference_connections WHERE id = ?', (connection_id,))
+    return cursor.rowcount > 0
 
+def delete_connections(connection_ids):
+    """Delete many connections in one transaction"""
+    with transaction() as conn:
+        conn.executemany(
+            'DELETE FROM reference_connections WHERE id = ?',
+            [(connection_id,) for connection_id in connection_ids]
+        )
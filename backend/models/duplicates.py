@@ -0,0 +1,72 @@
+import json
+from database import read_connection
+from models.reference import PROJECT_REFERENCES
+
+def get_doi_groups(project_id):
+    """Lists of ids of a project's references sharing a normalized DOI"""
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT json_group_array(id) FROM paper_references
+            WHERE doi_key IS NOT NULL AND id IN ({PROJECT_REFERENCES})
+            GROUP BY doi_key HAVING COUNT(*) > 1
+        ''', (project_id,)).fetchall()
+    return [sorted(json.loads(row[0])) for row in rows]
+
+def get_title_buckets(project_id):
+    """Lists of ids of a project's references sharing a title LSH bucket
+    (near-duplicate candidates, still to be verified)"""
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT json_group_array(reference_id) FROM reference_title_bands
+            WHERE reference_id IN ({PROJECT_REFERENCES})
+            GROUP BY band, bucket HAVING COUNT(*) > 1
+        ''', (project_id,)).fetchall()
+    return [sorted(json.loads(row[0])) for row in rows]
+
+def get_candidates(reference_id):
+    """Ids of the other references in the same project as `reference_id`
+    that share its normalized DOI or any of its title LSH buckets, as
+    {id: shares_doi}"""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            WITH mine AS (
+                SELECT pr.id, pr.doi_key, t.project_id FROM paper_references pr
+                JOIN topics t ON t.id = pr.topic_id
+                WHERE pr.id = :id
+            ),
+            matches AS (
+                SELECT other.id, 1 AS shares_doi FROM mine
+                JOIN paper_references other ON other.doi_key = mine.doi_key
+                UNION ALL
+                SELECT other.reference_id, 0 FROM reference_title_bands own
+                JOIN reference_title_bands other ON other.band = own.band AND other.bucket = own.bucket
+                WHERE own.reference_id = :id
+            )
+            SELECT m.id, MAX(m.shares_doi) FROM matches m
+            JOIN paper_references pr ON pr.id = m.id
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE m.id != :id AND t.project_id = (SELECT project_id FROM mine)
+            GROUP BY m.id
+        ''', {'id': reference_id}).fetchall()
+    return {row[0]: bool(row[1]) for row in rows}
+
+def get_titles(reference_ids):
+    """Map reference id -> title for the given ids"""
+    with read_connection() as conn:
+        rows = conn.execute(
+            'SELECT id, title FROM paper_references WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(list(reference_ids)),)
+        ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+def get_summaries(reference_ids):
+    """Map reference id -> summary row (with topic) for the given ids"""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT pr.id, pr.topic_id, t.name AS topic_name, pr.title, pr.doi, pr.authors,
+                   pr.publication_year
+            FROM paper_references pr
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE pr.id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(list(reference_ids)),)).fetchall()
+    return {row['id']: dict(row) for row in rows}
@@ -0,0 +1,47 @@
+import time
+from database import read_connection, transaction
+
+def register_blob(path, sha256, size):
+    """Record a stored blob.
+
+    New blobs start unreferenced and count as orphaned from now on until a
+    reference points at them. Re-registering a known orphan restarts its
+    grace period so garbage collection cannot race the upload reusing it.
+    """
+    with transaction() as conn:
+        conn.execute(
+            '''INSERT INTO pdf_blobs (path, sha256, size, ref_count, orphaned_at)
+               VALUES (?, ?, ?, 0, ?)
+               ON CONFLICT (path) DO UPDATE SET
+                   orphaned_at = CASE WHEN ref_count <= 0 THEN excluded.orphaned_at ELSE orphaned_at END''',
+            (path, sha256, size, int(time.time()))
+        )
+    return True
+
+def get_blob_by_path(path):
+    """Get a blob record by its storage path"""
+    with read_connection() as conn:
+        row = conn.execute('SELECT * FROM pdf_blobs WHERE path = ?', (path,)).fetchone()
+    return dict(row) if row else None
+
+def claim_orphans(orphaned_before):
+    """Delete and return the records of blobs unreferenced since before
+    `orphaned_before` (unix time); the caller removes their files."""
+    with transaction() as conn:
+        rows = conn.execute(
+            'SELECT * FROM pdf_blobs WHERE ref_count <= 0 AND orphaned_at < ?', (orphaned_before,)
+        ).fetchall()
+        conn.executemany('DELETE FROM pdf_blobs WHERE path = ?', [(row['path'],) for row in rows])
+    return [dict(row) for row in rows]
+
+def get_storage_stats():
+    """Blob count, referenced count and total bytes"""
+    with read_connection() as conn:
+        row = conn.execute('''
+            SELECT COUNT(*) AS blobs,
+                   COALESCE(SUM(ref_count > 0), 0) AS referenced,
+                   COALESCE(SUM(size), 0) AS bytes,
+                   COALESCE(SUM(ref_count), 0) AS references_total
+            FROM pdf_blobs
+        ''').fetchone()
+    return dict(row)
@@ -0,0 +1,91 @@
+import time
+from database import read_connection, transaction
+
+def get_unindexed_paths():
+    """Stored PDF paths that are referenced but not yet indexed (never seen,
+    or left pending by an interrupted run)"""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT DISTINCT pr.pdf_path
+            FROM paper_references pr
+            LEFT JOIN pdf_text_documents d ON d.pdf_path = pr.pdf_path
+            WHERE pr.pdf_path IS NOT NULL AND (d.status IS NULL OR d.status = 'pending')
+        ''').fetchall()
+    return [row[0] for row in rows]
+
+def mark_pending(pdf_path):
+    """Queue a stored PDF for extraction unless it is already known.
+
+    Returns the document's status after the call ('pending' when it still
+    needs extracting).
+    """
+    with transaction() as conn:
+        conn.execute(
+            '''INSERT INTO pdf_text_documents (pdf_path, status, updated_at)
+               VALUES (?, 'pending', ?) ON CONFLICT (pdf_path) DO NOTHING''',
+            (pdf_path, int(time.time()))
+        )
+        row = conn.execute(
+            'SELECT status FROM pdf_text_documents WHERE pdf_path = ?', (pdf_path,)
+        ).fetchone()
+    return row[0]
+
+def store_pages(pdf_path, pages):
+    """Replace the indexed text of a PDF with `pages` ([(page_number, text)])
+    and mark it indexed, atomically"""
+    with transaction() as conn:
+        conn.execute('DELETE FROM pdf_text_pages WHERE pdf_path = ?', (pdf_path,))
+        conn.executemany(
+            'INSERT INTO pdf_text_pages (pdf_path, page_number, text) VALUES (?, ?, ?)',
+            [(pdf_path, number, text) for number, text in pages]
+        )
+        conn.execute(
+            '''INSERT INTO pdf_text_documents (pdf_path, status, page_count, error, updated_at)
+               VALUES (?, 'indexed', ?, NULL, ?)
+               ON CONFLICT (pdf_path) DO UPDATE SET
+                   status = excluded.status, page_count = excluded.page_count,
+                   error = NULL, updated_at = excluded.updated_at''',
+            (pdf_path, len(pages), int(time.time()))
+        )
+    return True
+
+def mark_failed(pdf_path, error):
+    """Record that a PDF could not be extracted; it is not retried automatically"""
+    with transaction() as conn:
+        conn.execute(
+            '''UPDATE pdf_text_documents SET status = 'failed', error = ?, updated_at = ?
+               WHERE pdf_path = ?''',
+            (error, int(time.time()), pdf_path)
+        )
+    return True
+
+def requeue_failed():
+    """Mark every failed PDF pending again. Returns the number requeued"""
+    with transaction() as conn:
+        return conn.execute(
+            "UPDATE pdf_text_documents SET status = 'pending', error = NULL WHERE status = 'failed'"
+        ).rowcount
+
+def purge_unreferenced():
+    """Drop the text of PDFs that are neither referenced nor held by the
+    blob store (blob text is dropped along with the blob)"""
+    with transaction() as conn:
+        stale = '''SELECT d.pdf_path FROM pdf_text_documents d
+                   WHERE NOT EXISTS (SELECT 1 FROM paper_references pr WHERE pr.pdf_path = d.pdf_path)
+                     AND NOT EXISTS (SELECT 1 FROM pdf_blobs b WHERE b.path = d.pdf_path)'''
+        conn.execute(f'DELETE FROM pdf_text_pages WHERE pdf_path IN ({stale})')
+        return conn.execute(f'DELETE FROM pdf_text_documents WHERE pdf_path IN ({stale})').rowcount
+
+def get_index_stats():
+    """Document counts per status and the number of indexed pages"""
+    with read_connection() as conn:
+        counts = {row[0]: row[1] for row in conn.execute(
+            'SELECT status, COUNT(*) FROM pdf_text_documents GROUP BY status'
+        )}
+        pages = conn.execute('SELECT COUNT(*) FROM pdf_text_pages').fetchone()[0]
+    return {
+        'pending': counts.get('pending', 0),
+        'indexed': counts.get('indexed', 0),
+        'failed': counts.get('failed', 0),
+        'pages': pages,
+    }
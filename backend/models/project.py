@@ -1,47 +1,39 @@
-from database import get_connection
+from database import read_connection, transaction
+from services import snapshot_cache
 
 def get_all_projects():
     """Get all projects"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM projects ORDER BY created_at DESC')
-    projects = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM projects ORDER BY created_at DESC')
+        projects = [dict(row) for row in cursor.fetchall()]
     return projects
 
 def create_project(title):
     """Create a new project"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO projects (title) VALUES (?)', (title,))
-    project_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO projects (title) VALUES (?)', (title,))
+        project_id = cursor.lastrowid
     return project_id
 
 def get_project_by_id(project_id):
     """Get a single project by ID"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
-    project = cursor.fetchone()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
+        project = cursor.fetchone()
     return dict(project) if project else None
 
 def update_project_title(project_id, new_title):
     """Update project title"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE projects SET title = ? WHERE id = ?', (new_title, project_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('UPDATE projects SET title = ? WHERE id = ?', (new_title, project_id))
     return True
 
 def delete_project(project_id):
     """Delete project and all related data (cascade)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+        snapshot_cache.forget_projects([project_id])
     return True
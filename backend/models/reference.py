@@ -1,115 +1,315 @@
-from database import get_connection
-
-def get_references_by_topic(topic_id):
-    """Get all references for a topic"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM paper_references WHERE topic_id = ? ORDER BY sort_order ASC, id ASC', (topic_id,))
-    references = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+import json
+from database import read_connection, transaction
+from services import bibtex as bibtex_parser, minhash, snapshot_cache
+from services.doi import normalize_doi
+
+# Reference columns clients may select with ?fields=, in payload order
+REFERENCE_FIELDS = ('id', 'topic_id', 'title', 'doi', 'authors', 'abstract', 'notes',
+                    'citation_count', 'publication_year', 'created_at', 'bibtex', 'pdf_path',
+                    'citekey', 'entry_type', 'bib_authors', 'venue')
+
+# A project's reference ids, as a subquery taking the project id
+PROJECT_REFERENCES = '''
+    SELECT pr.id FROM paper_references pr
+    JOIN topics t ON t.id = pr.topic_id
+    WHERE t.project_id = ?
+'''
+
+# Columns derived from the bibtex column on every write
+BIBTEX_COLUMNS = ('citekey', 'entry_type', 'bib_authors', 'venue')
+
+# Lightweight preset for canvas rendering (?fields=summary): everything the
+# canvas shows or filters on; abstract and bibtex come from /detail on open
+SUMMARY_FIELDS = ('id', 'title', 'doi', 'authors', 'citation_count', 'publication_year',
+                  'notes', 'pdf_path')
+
+def parse_fields(spec):
+    """Turn a ?fields= value into a tuple of whitelisted reference columns.
+
+    Accepts a comma-separated column list or the 'summary' preset; 'id' is
+    always included. Returns None (all columns) for an empty spec and raises
+    ValueError for unknown columns.
+    """
+    if not spec:
+        return None
+    if spec == 'summary':
+        return SUMMARY_FIELDS
+    requested = {name.strip() for name in spec.split(',') if name.strip()}
+    unknown = requested.difference(REFERENCE_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+    requested.add('id')
+    return tuple(name for name in REFERENCE_FIELDS if name in requested)
+
+def bibtex_values(bibtex):
+    """Values of BIBTEX_COLUMNS for a raw BibTeX string (all None when it
+    holds no parseable entry)"""
+    parsed = bibtex_parser.parse_reference(bibtex)
+    if not parsed:
+        return (None, None, None, None)
+    return (parsed['citekey'], parsed['entry_type'], parsed['authors'], parsed['venue'])
+
+def _store_title_buckets(conn, items):
+    """Replace the MinHash LSH buckets of references; `items` are
+    (reference_id, minhash.band_buckets(title)) pairs, hashed by callers
+    before they take the write lock"""
+    items = list(items)
+    conn.executemany('DELETE FROM reference_title_bands WHERE reference_id = ?',
+                     [(reference_id,) for reference_id, _ in items])
+    conn.executemany(
+        'INSERT INTO reference_title_bands (reference_id, band, bucket) VALUES (?, ?, ?)',
+        [(reference_id, band, bucket) for reference_id, buckets in items for band, bucket in buckets]
+    )
+
+def get_references_by_topic(topic_id, fields=None):
+    """Get all references for a topic, optionally restricted to `fields`"""
+    columns = ', '.join(fields) if fields else '*'
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f'SELECT {columns} FROM paper_references WHERE topic_id = ? ORDER BY sort_order ASC, id ASC',
+            (topic_id,)
+        )
+        references = [dict(row) for row in cursor.fetchall()]
     return references
 
 def create_reference(topic_id, title, doi='', authors='', abstract='', notes='', citation_count=0, publication_year=None, bibtex=''):
     """Create a new reference"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''INSERT INTO paper_references (topic_id, title, doi, authors, abstract, notes, citation_count, publication_year, bibtex)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (topic_id, title, doi, authors, abstract, notes, citation_count, publication_year, bibtex)
-    )
-    reference_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    buckets = minhash.band_buckets(title)
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            '''INSERT INTO paper_references (topic_id, title, doi, authors, abstract, notes, citation_count, publication_year, bibtex,
+                                             citekey, entry_type, bib_authors, venue, doi_key)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (topic_id, title, doi, authors, abstract, notes, citation_count, publication_year, bibtex,
+             *bibtex_values(bibtex), normalize_doi(doi) or None)
+        )
+        reference_id = cursor.lastrowid
+        _store_title_buckets(conn, [(reference_id, buckets)])
+        snapshot_cache.invalidate_topics(conn, [topic_id])
     return reference_id
 
+# Columns accepted by insert_references()
+IMPORT_COLUMNS = ('title', 'doi', 'authors', 'abstract', 'notes', 'citation_count',
+                  'publication_year', 'bibtex') + BIBTEX_COLUMNS
+
+def insert_references(topic_id, rows):
+    """Insert many references into a topic with one executemany.
+
+    `rows` are dicts keyed by IMPORT_COLUMNS (missing keys are NULL); the
+    BibTeX-derived columns are stored as given rather than re-parsed, since
+    importers already hold them. A row's 'title_buckets' (from
+    minhash.band_buckets) is used when present, so callers inserting inside
+    a longer transaction can hash titles beforehand. Returns the new ids in
+    row order.
+    """
+    columns = ', '.join(IMPORT_COLUMNS)
+    placeholders = ', '.join('?' for _ in IMPORT_COLUMNS)
+    sequence = "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'paper_references'), 0)"
+    buckets = [row['title_buckets'] if 'title_buckets' in row else minhash.band_buckets(row.get('title'))
+               for row in rows]
+    with transaction() as conn:
+        # AUTOINCREMENT ids are handed out consecutively inside the write lock
+        first_id = conn.execute(sequence).fetchone()[0] + 1
+        conn.executemany(
+            f'INSERT INTO paper_references (topic_id, {columns}, doi_key) VALUES (?, {placeholders}, ?)',
+            [(topic_id, *(row.get(name) for name in IMPORT_COLUMNS), normalize_doi(row.get('doi')) or None)
+             for row in rows]
+        )
+        last_id = conn.execute(sequence).fetchone()[0]
+        ids = list(range(first_id, last_id + 1))
+        _store_title_buckets(conn, zip(ids, buckets))
+        snapshot_cache.invalidate_topics(conn, [topic_id])
+    return ids
+
+def fill_missing_metadata(updates):
+    """Fill empty title/authors/abstract/year of references from looked-up
+    paper metadata and raise their citation counts; `updates` is a list of
+    (reference_id, paper) with paper as returned by paper_search"""
+    titles = {reference_id: paper['title'] for reference_id, paper in updates if paper.get('title')}
+    buckets = {reference_id: minhash.band_buckets(title) for reference_id, title in titles.items()}
+    with transaction() as conn:
+        conn.executemany(
+            '''UPDATE paper_references
+               SET title = COALESCE(NULLIF(title, ''), ?, title),
+                   authors = COALESCE(NULLIF(authors, ''), ?, authors),
+                   abstract = COALESCE(NULLIF(abstract, ''), ?, abstract),
+                   publication_year = COALESCE(publication_year, ?),
+                   citation_count = MAX(COALESCE(citation_count, 0), ?),
+                   venue = COALESCE(NULLIF(venue, ''), ?, venue)
+               WHERE id = ?''',
+            [(paper.get('title') or None, paper.get('authors') or None, paper.get('abstract') or None,
+              paper.get('publication_year') or None, paper.get('citation_count') or 0,
+              paper.get('venue') or None, reference_id)
+             for reference_id, paper in updates]
+        )
+        # Only titles that were empty, and so had no buckets, were replaced
+        unindexed = conn.execute(
+            '''SELECT id, title FROM paper_references
+               WHERE id IN (SELECT value FROM json_each(?))
+                 AND NOT EXISTS (SELECT 1 FROM reference_title_bands WHERE reference_id = paper_references.id)''',
+            (json.dumps(list(titles)),)
+        ).fetchall()
+        _store_title_buckets(conn, [(row[0], buckets[row[0]]) for row in unindexed if row[1] == titles[row[0]]])
+        snapshot_cache.invalidate_references(conn, [reference_id for reference_id, _ in updates])
+    return True
+
 def update_reference(reference_id, title, doi='', authors='', abstract='', notes='', citation_count=0, publication_year=None, bibtex=''):
-    """Update a reference"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''UPDATE paper_references
-           SET title = ?, doi = ?, authors = ?, abstract = ?, notes = ?, citation_count = ?, publication_year = ?, bibtex = ?
-           WHERE id = ?''',
-        (title, doi, authors, abstract, notes, citation_count, publication_year, bibtex, reference_id)
-    )
-    conn.commit()
-    conn.close()
+    """Update a reference; returns whether it exists"""
+    buckets = minhash.band_buckets(title)
+    with transaction() as conn:
+        cursor = conn.execute(
+            '''UPDATE paper_references
+               SET title = ?, doi = ?, authors = ?, abstract = ?, notes = ?, citation_count = ?, publication_year = ?, bibtex = ?,
+                   citekey = ?, entry_type = ?, bib_authors = ?, venue = ?, doi_key = ?
+               WHERE id = ?''',
+            (title, doi, authors, abstract, notes, citation_count, publication_year, bibtex,
+             *bibtex_values(bibtex), normalize_doi(doi) or None, reference_id)
+        )
+        if cursor.rowcount == 0:
+            return False
+        _store_title_buckets(conn, [(reference_id, buckets)])
+        snapshot_cache.invalidate_references(conn, [reference_id])
     return True
 
 def delete_reference(reference_id):
-    """Delete a reference"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM paper_references WHERE id = ?', (reference_id,))
-    conn.commit()
-    conn.close()
+    """Delete a reference; returns whether it existed"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_references(conn, [reference_id])
+        cursor = conn.execute('DELETE FROM paper_references WHERE id = ?', (reference_id,))
+    return cursor.rowcount > 0
+
+def delete_references(reference_ids):
+    """Delete many references in one transaction"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_references(conn, reference_ids)
+        conn.executemany('DELETE FROM paper_references WHERE id = ?', [(ref_id,) for ref_id in reference_ids])
     return True
 
 def move_reference(reference_id, target_topic_id):
-    """Move a reference to another topic"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'UPDATE paper_references SET topic_id = ? WHERE id = ?',
-        (target_topic_id, reference_id)
-    )
-    conn.commit()
-    conn.close()
+    """Move a reference to another topic; returns whether it exists"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_references(conn, [reference_id])
+        snapshot_cache.invalidate_topics(conn, [target_topic_id])
+        cursor = conn.execute(
+            'UPDATE paper_references SET topic_id = ? WHERE id = ?',
+            (target_topic_id, reference_id)
+        )
+    return cursor.rowcount > 0
+
+def move_references(moves):
+    """Move many references; `moves` is a list of (reference_id, target_topic_id)"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_references(conn, [reference_id for reference_id, _ in moves])
+        snapshot_cache.invalidate_topics(conn, {target_topic_id for _, target_topic_id in moves})
+        conn.executemany(
+            'UPDATE paper_references SET topic_id = ? WHERE id = ?',
+            [(target_topic_id, reference_id) for reference_id, target_topic_id in moves]
+        )
     return True
 
 def reorder_references(topic_id, reference_ids):
-    """Reorder references within a topic by updating sort_order"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    for index, ref_id in enumerate(reference_ids):
-        cursor.execute(
+    """Reorder references within a topic by updating sort_order; returns
+    whether every id named a reference of the topic"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_topics(conn, [topic_id])
+        cursor = conn.executemany(
             'UPDATE paper_references SET sort_order = ? WHERE id = ? AND topic_id = ?',
-            (index, ref_id, topic_id)
+            [(index, ref_id, topic_id) for index, ref_id in enumerate(reference_ids)]
         )
-    conn.commit()
-    conn.close()
-    return True
+    return cursor.rowcount == len(reference_ids)
 
 def set_reference_pdf(reference_id, pdf_path):
     """Set the PDF path for a reference (relative path inside the pdf storage dir, or None to clear)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE paper_references SET pdf_path = ? WHERE id = ?', (pdf_path, reference_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('UPDATE paper_references SET pdf_path = ? WHERE id = ?', (pdf_path, reference_id))
+        snapshot_cache.invalidate_references(conn, [reference_id])
     return True
 
+def is_pdf_in_use(pdf_path):
+    """Whether any reference still points at this stored PDF path"""
+    with read_connection() as conn:
+        row = conn.execute('SELECT 1 FROM paper_references WHERE pdf_path = ? LIMIT 1', (pdf_path,)).fetchone()
+    return row is not None
+
+def count_by_project(project_id):
+    """Number of references in a project"""
+    with read_connection() as conn:
+        row = conn.execute(
+            'SELECT COUNT(*) FROM paper_references pr JOIN topics t ON t.id = pr.topic_id WHERE t.project_id = ?',
+            (project_id,)
+        ).fetchone()
+    return row[0]
+
+def get_bibliography_index(project_id):
+    """Light rows (no BibTeX text) of a project's references that carry
+    BibTeX, in canvas order: topic, then position within the topic, with
+    the export key each was last given (NULL when never exported)"""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT pr.id, pr.doi, pr.title, pr.citekey, pr.bib_authors, pr.publication_year,
+                   ek.base_key AS export_base_key, ek.citekey AS export_key
+            FROM paper_references pr
+            JOIN topics t ON t.id = pr.topic_id
+            LEFT JOIN reference_export_keys ek ON ek.reference_id = pr.id
+            WHERE t.project_id = ? AND pr.bibtex IS NOT NULL AND pr.bibtex != ''
+            ORDER BY t.id, pr.sort_order, pr.id
+        ''', (project_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+def set_export_keys(items):
+    """Record (reference_id, base_key, citekey) export key assignments"""
+    with transaction() as conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO reference_export_keys (reference_id, base_key, citekey) VALUES (?, ?, ?)',
+            items
+        )
+
+def get_bibtex_by_ids(reference_ids):
+    """Map reference id -> raw BibTeX for the given ids"""
+    with read_connection() as conn:
+        rows = conn.execute(
+            'SELECT id, bibtex FROM paper_references WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(list(reference_ids)),)
+        ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
 def get_reference_by_id(reference_id):
     """Get a single reference by id"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM paper_references WHERE id = ?', (reference_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM paper_references WHERE id = ?', (reference_id,))
+        row = cursor.fetchone()
     return dict(row) if row else None
 
 def duplicate_reference(reference_id, target_topic_id):
     """Duplicate a reference to another topic"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        cursor = conn.cursor()
 
-    # Get the original reference
-    cursor.execute('SELECT * FROM paper_references WHERE id = ?', (reference_id,))
-    original = cursor.fetchone()
+        # Get the original reference
+        cursor.execute('SELECT * FROM paper_references WHERE id = ?', (reference_id,))
+        original = cursor.fetchone()
 
-    if not original:
-        conn.close()
-        return None
+        if not original:
+            return None
 
-    # Create a copy in the target topic
-    cursor.execute(
-        '''INSERT INTO paper_references (topic_id, title, doi, authors, abstract, notes, citation_count, publication_year, bibtex)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (target_topic_id, original['title'], original['doi'], original['authors'],
-         original['abstract'], original['notes'], original['citation_count'], original['publication_year'], original['bibtex'])
-    )
-    new_reference_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+        # Create a copy in the target topic; the PDF blob is shared, not copied
+        cursor.execute(
+            '''INSERT INTO paper_references (topic_id, title, doi, authors, abstract, notes, citation_count, publication_year, bibtex, pdf_path,
+                                             citekey, entry_type, bib_authors, venue, doi_key)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (target_topic_id, original['title'], original['doi'], original['authors'],
+             original['abstract'], original['notes'], original['citation_count'], original['publication_year'], original['bibtex'],
+             original['pdf_path'], original['citekey'], original['entry_type'], original['bib_authors'], original['venue'],
+             original['doi_key'])
+        )
+        new_reference_id = cursor.lastrowid
+        cursor.execute(
+            '''INSERT INTO reference_title_bands (reference_id, band, bucket)
+               SELECT ?, band, bucket FROM reference_title_bands WHERE reference_id = ?''',
+            (new_reference_id, reference_id)
+        )
+        snapshot_cache.invalidate_topics(conn, [target_topic_id])
     return new_reference_id
@@ -0,0 +1,122 @@
+import html
+import re
+from database import read_connection
+
+# bm25() column weights: title, authors, abstract, notes, bibtex
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 2.0, 0.5)
+# Shorter trailing words are matched exactly: expanding one- or two-letter
+# prefixes would scan most of the index.
+MIN_PREFIX_LENGTH = 3
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+# highlight()/snippet() wrap matches in these private-use characters; the
+# stored text is HTML-escaped first and the sentinels then become the tags,
+# so titles and PDF text can't inject markup.
+_MATCH_OPEN = '\ue000'
+_MATCH_CLOSE = '\ue001'
+SNIPPET_TOKENS = 16
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted phrase (so FTS5 operators in user input are
+    treated as plain words) and the last word matches as a prefix, which
+    gives search-as-you-type behaviour. Returns None when nothing is left.
+    """
+    words = [w.replace('"', '') for w in re.findall(r'\w+', text or '')]
+    words = [w for w in words if w]
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    if len(words[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def _marked(text):
+    """HTML-escaped FTS5 highlight()/snippet() output with the matches in
+    <mark> tags"""
+    if text is None:
+        return None
+    return html.escape(text).replace(_MATCH_OPEN, HIGHLIGHT_OPEN).replace(_MATCH_CLOSE, HIGHLIGHT_CLOSE)
+
+def _highlighted(row, *columns):
+    result = dict(row)
+    for column in columns:
+        result[column] = _marked(result[column])
+    return result
+
+def search_references(project_id, text, limit=20, offset=0):
+    """Search a project's references, ranked by BM25.
+
+    Returns {'total': n, 'results': [...]} where each result carries the
+    reference summary, its topic, a highlighted title and a snippet of the
+    best matching column.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return {'total': 0, 'results': []}
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    with read_connection() as conn:
+        total = conn.execute('''
+            SELECT COUNT(*)
+            FROM reference_search
+            JOIN paper_references pr ON pr.id = reference_search.rowid
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE reference_search MATCH ? AND t.project_id = ?
+        ''', (match, project_id)).fetchone()[0]
+
+        rows = conn.execute(f'''
+            SELECT pr.id, pr.topic_id, t.name AS topic_name, pr.title, pr.authors, pr.doi,
+                   pr.publication_year,
+                   highlight(reference_search, 0, ?, ?) AS title_highlight,
+                   snippet(reference_search, -1, ?, ?, '…', ?) AS snippet,
+                   bm25(reference_search, {weights}) AS rank
+            FROM reference_search
+            JOIN paper_references pr ON pr.id = reference_search.rowid
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE reference_search MATCH ? AND t.project_id = ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        ''', (_MATCH_OPEN, _MATCH_CLOSE, _MATCH_OPEN, _MATCH_CLOSE, SNIPPET_TOKENS,
+              match, project_id, limit, offset)).fetchall()
+
+    return {'total': total, 'results': [_highlighted(row, 'title_highlight', 'snippet') for row in rows]}
+
+def search_pdf_text(project_id, text, limit=20, offset=0):
+    """Search the extracted full text of a project's PDFs, ranked by BM25.
+
+    Returns {'total': n, 'results': [...]} with one result per matching
+    page and reference: the reference summary, its topic, the 1-based page
+    number and a highlighted snippet of the page.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return {'total': 0, 'results': []}
+
+    with read_connection() as conn:
+        total = conn.execute('''
+            SELECT COUNT(*)
+            FROM pdf_text_search
+            JOIN pdf_text_pages p ON p.id = pdf_text_search.rowid
+            JOIN paper_references pr ON pr.pdf_path = p.pdf_path
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE pdf_text_search MATCH ? AND t.project_id = ?
+        ''', (match, project_id)).fetchone()[0]
+
+        rows = conn.execute('''
+            SELECT pr.id, pr.topic_id, t.name AS topic_name, pr.title, pr.authors, pr.doi,
+                   pr.publication_year, p.page_number,
+                   snippet(pdf_text_search, 0, ?, ?, '…', ?) AS snippet,
+                   bm25(pdf_text_search) AS rank
+            FROM pdf_text_search
+            JOIN pdf_text_pages p ON p.id = pdf_text_search.rowid
+            JOIN paper_references pr ON pr.pdf_path = p.pdf_path
+            JOIN topics t ON t.id = pr.topic_id
+            WHERE pdf_text_search MATCH ? AND t.project_id = ?
+            ORDER BY rank, pr.id, p.page_number
+            LIMIT ? OFFSET ?
+        ''', (_MATCH_OPEN, _MATCH_CLOSE, SNIPPET_TOKENS,
+              match, project_id, limit, offset)).fetchall()
+
+    return {'total': total, 'results': [_highlighted(row, 'snippet') for row in rows]}
@@ -1,153 +1,171 @@
-from database import get_connection
-
-def get_topics_by_project(project_id):
+import json
+from database import read_connection, transaction
+from models.reference import REFERENCE_FIELDS
+from services import snapshot_cache
+
+# Rows pulled from the cursor per fetchmany() call when streaming
+STREAM_BATCH_SIZE = 500
+
+def iter_topics_by_project(project_id, fields=None, batch_size=STREAM_BATCH_SIZE, topic_ids=None):
+    """Yield a project's topics one at a time, each with its references.
+
+    Walks the JOIN cursor with fetchmany() so only one topic is held in
+    memory at a time. `fields` restricts the reference columns that are
+    loaded (see reference.parse_fields); by default every column is returned.
+    `topic_ids` limits the result to those topics.
+    """
+    fields = fields or REFERENCE_FIELDS
+    ref_columns = ', '.join(f'pr.{name} AS ref_{name}' for name in fields)
+    ref_keys = [(name, f'ref_{name}') for name in fields]
+    where = 't.project_id = ?'
+    params = [project_id]
+    if topic_ids is not None:
+        where += ' AND t.id IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(list(topic_ids)))
+    with read_connection() as conn:
+        cursor = conn.execute(f'''
+            SELECT t.*, pr.id AS ref_key, {ref_columns}
+            FROM topics t
+            LEFT JOIN paper_references pr ON pr.topic_id = t.id
+            WHERE {where}
+            ORDER BY t.id, pr.sort_order ASC, pr.id ASC
+        ''', params)
+        try:
+            current = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if current is None or current['id'] != row['id']:
+                        if current is not None:
+                            yield current
+                        current = {
+                            'id': row['id'],
+                            'project_id': row['project_id'],
+                            'name': row['name'],
+                            'position_x': row['position_x'],
+                            'position_y': row['position_y'],
+                            'color': row['color'],
+                            'grid_width': row['grid_width'],
+                            'grid_height': row['grid_height'],
+                            'references': []
+                        }
+                    if row['ref_key'] is not None:
+                        current['references'].append({name: row[key] for name, key in ref_keys})
+            if current is not None:
+                yield current
+        finally:
+            cursor.close()
+
+def get_topics_by_project(project_id, fields=None, topic_ids=None):
     """Get all topics for a project with their references (single JOIN query)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT t.*, pr.id AS ref_id, pr.topic_id AS ref_topic_id, pr.title AS ref_title,
-               pr.doi AS ref_doi, pr.authors AS ref_authors, pr.abstract AS ref_abstract,
-               pr.notes AS ref_notes, pr.citation_count AS ref_citation_count,
-               pr.publication_year AS ref_publication_year, pr.created_at AS ref_created_at,
-               pr.bibtex AS ref_bibtex, pr.pdf_path AS ref_pdf_path
-        FROM topics t
-        LEFT JOIN paper_references pr ON pr.topic_id = t.id
-        WHERE t.project_id = ?
-        ORDER BY t.id, pr.sort_order ASC, pr.id ASC
-    ''', (project_id,))
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    topics_map = {}
-    for row in rows:
-        row = dict(row)
-        topic_id = row['id']
-        if topic_id not in topics_map:
-            topics_map[topic_id] = {
-                'id': row['id'],
-                'project_id': row['project_id'],
-                'name': row['name'],
-                'position_x': row['position_x'],
-                'position_y': row['position_y'],
-                'color': row['color'],
-                'grid_width': row['grid_width'],
-                'grid_height': row['grid_height'],
-                'references': []
-            }
-        if row['ref_id'] is not None:
-            topics_map[topic_id]['references'].append({
-                'id': row['ref_id'],
-                'topic_id': row['ref_topic_id'],
-                'title': row['ref_title'],
-                'doi': row['ref_doi'],
-                'authors': row['ref_authors'],
-                'abstract': row['ref_abstract'],
-                'notes': row['ref_notes'],
-                'citation_count': row['ref_citation_count'],
-                'publication_year': row['ref_publication_year'],
-                'created_at': row['ref_created_at'],
-                'bibtex': row['ref_bibtex'],
-                'pdf_path': row['ref_pdf_path'],
-            })
-
-    return list(topics_map.values())
-
-
-def get_topics_by_project_summary(project_id):
-    """Get topics with lightweight reference data for canvas rendering"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT t.*, pr.id AS ref_id, pr.title AS ref_title, pr.doi AS ref_doi,
-               pr.authors AS ref_authors, pr.citation_count AS ref_citation_count,
-               pr.publication_year AS ref_publication_year
-        FROM topics t
-        LEFT JOIN paper_references pr ON pr.topic_id = t.id
-        WHERE t.project_id = ?
-        ORDER BY t.id, pr.sort_order ASC, pr.id ASC
-    ''', (project_id,))
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    topics_map = {}
-    for row in rows:
-        row = dict(row)
-        topic_id = row['id']
-        if topic_id not in topics_map:
-            topics_map[topic_id] = {
-                'id': row['id'],
-                'project_id': row['project_id'],
-                'name': row['name'],
-                'position_x': row['position_x'],
-                'position_y': row['position_y'],
-                'color': row['color'],
-                'grid_width': row['grid_width'],
-                'grid_height': row['grid_height'],
-                'references': []
-            }
-        if row['ref_id'] is not None:
-            topics_map[topic_id]['references'].append({
-                'id': row['ref_id'],
-                'title': row['ref_title'],
-                'doi': row['ref_doi'],
-                'authors': row['ref_authors'],
-                'citation_count': row['ref_citation_count'],
-                'publication_year': row['ref_publication_year'],
-            })
-
-    return list(topics_map.values())
+    return list(iter_topics_by_project(project_id, fields, topic_ids=topic_ids))
+
+def get_topic_boxes(project_id):
+    """(id, position_x, position_y, grid_width, grid_height) of a project's
+    topics, for the spatial index"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(
+            'SELECT id, position_x, position_y, grid_width, grid_height FROM topics WHERE project_id = ?',
+            (project_id,)
+        ).fetchall()
+
+def get_topic_by_id(topic_id):
+    """Get a single topic (without its references) by ID"""
+    with read_connection() as conn:
+        row = conn.execute('SELECT * FROM topics WHERE id = ?', (topic_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_layout_rows(project_id):
+    """A project's topics with their geometry and reference counts, for
+    the layout engine"""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT t.id, t.name, t.position_x, t.position_y, t.grid_width, t.grid_height,
+                   COUNT(pr.id) AS reference_count
+            FROM topics t
+            LEFT JOIN paper_references pr ON pr.topic_id = t.id
+            WHERE t.project_id = ?
+            GROUP BY t.id
+            ORDER BY t.id
+        ''', (project_id,)).fetchall()
+    return [dict(row) for row in rows]
 
 def create_topic(project_id, name, position_x=0, position_y=0, color='#007bff'):
     """Create a new topic"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO topics (project_id, name, position_x, position_y, color) VALUES (?, ?, ?, ?, ?)',
-        (project_id, name, position_x, position_y, color)
-    )
-    topic_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO topics (project_id, name, position_x, position_y, color) VALUES (?, ?, ?, ?, ?)',
+            (project_id, name, position_x, position_y, color)
+        )
+        topic_id = cursor.lastrowid
+        snapshot_cache.invalidate_projects([project_id])
     return topic_id
 
 def update_topic_name(topic_id, new_name):
-    """Update topic name"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE topics SET name = ? WHERE id = ?', (new_name, topic_id))
-    conn.commit()
-    conn.close()
-    return True
+    """Update topic name; returns whether the topic exists"""
+    with transaction() as conn:
+        cursor = conn.execute('UPDATE topics SET name = ? WHERE id = ?', (new_name, topic_id))
+        snapshot_cache.invalidate_topics(conn, [topic_id])
+    return cursor.rowcount > 0
 
 def update_topic_position(topic_id, position_x, position_y):
     """Update topic position"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE topics SET position_x = ?, position_y = ? WHERE id = ?',
-                   (position_x, position_y, topic_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('UPDATE topics SET position_x = ?, position_y = ? WHERE id = ?',
+                     (position_x, position_y, topic_id))
+        snapshot_cache.invalidate_topics(conn, [topic_id])
     return True
 
 def update_topic_dimensions(topic_id, grid_width, grid_height):
     """Update topic grid dimensions"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE topics SET grid_width = ?, grid_height = ? WHERE id = ?',
-                   (grid_width, grid_height, topic_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('UPDATE topics SET grid_width = ?, grid_height = ? WHERE id = ?',
+                     (grid_width, grid_height, topic_id))
+        snapshot_cache.invalidate_topics(conn, [topic_id])
     return True
 
 def delete_topic(topic_id):
-    """Delete topic and all related references (cascade)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM topics WHERE id = ?', (topic_id,))
-    conn.commit()
-    conn.close()
+    """Delete topic and all related references (cascade); returns whether
+    the topic existed"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_topics(conn, [topic_id])
+        cursor = conn.execute('DELETE FROM topics WHERE id = ?', (topic_id,))
+    return cursor.rowcount > 0
+
+def delete_topics(topic_ids):
+    """Delete many topics (and their references) in one transaction"""
+    with transaction() as conn:
+        snapshot_cache.invalidate_topics(conn, topic_ids)
+        conn.executemany('DELETE FROM topics WHERE id = ?', [(topic_id,) for topic_id in topic_ids])
     return True
+
+def update_topic_layouts(updates):
+    """Apply many position/dimension updates in a single transaction.
+
+    Each update is a dict with 'id', 'position_x', 'position_y' and optionally
+    'grid_width'/'grid_height'. Returns the set of ids that exist and were
+    updated.
+    """
+    if not updates:
+        return set()
+    with transaction() as conn:
+        ids = json.dumps([u['id'] for u in updates])
+        existing = {row[0] for row in conn.execute(
+            'SELECT id FROM topics WHERE id IN (SELECT value FROM json_each(?))', (ids,)
+        )}
+        conn.executemany(
+            'UPDATE topics SET position_x = ?, position_y = ? WHERE id = ?',
+            [(u['position_x'], u['position_y'], u['id']) for u in updates if u['id'] in existing]
+        )
+        conn.executemany(
+            'UPDATE topics SET grid_width = ?, grid_height = ? WHERE id = ?',
+            [(u['grid_width'], u['grid_height'], u['id']) for u in updates
+             if u['id'] in existing and u.get('grid_width') is not None]
+        )
+        snapshot_cache.invalidate_topics(conn, existing)
+    return existing
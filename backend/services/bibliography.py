@@ -0,0 +1,129 @@
+import itertools
+import re
+import string
+
+from models import changes, reference
+from services import bibtex
+from services.doi import normalize_doi
+from services.revision_cache import RevisionCache
+
+# BibTeX text fetched per query while rendering
+RENDER_BATCH_SIZE = 500
+# Rendered bibliographies kept in memory (one per project, latest revision)
+CACHE_MAX_PROJECTS = 16
+
+_ENTRY_KEY_RE = re.compile(r'(@\s*[A-Za-z][\w-]*\s*[{(]\s*)([^\s,{}()"#=]*)')
+
+
+def _dedupe_key(row):
+    """References with the same DOI, or without DOIs the same title, are
+    one bibliography entry"""
+    doi = normalize_doi(row['doi'])
+    if doi:
+        return f'doi:{doi}'
+    return 'title:' + ' '.join((row['title'] or '').casefold().split())
+
+
+def _suffixes():
+    """a, b, ..., z, aa, ab, ... (the usual smith2020a, smith2020b scheme)"""
+    for length in itertools.count(1):
+        for letters in itertools.product(string.ascii_lowercase, repeat=length):
+            yield ''.join(letters)
+
+
+def plan(project_id):
+    """Decide which references make up a project's bibliography and the
+    citekey each is exported under.
+
+    Returns [(reference_id, citekey)] in canvas order. The earliest-created
+    reference with a given DOI (or, lacking one, title) stands for all its
+    duplicates. On a collision the reference created first gets the bare
+    key and later ones a, b, ... suffixes. Assigned keys are recorded and
+    reused by later exports (until the reference's own key changes), so
+    adding a reference never renames an exported entry, even one whose
+    literal citekey equals an earlier suffixed key.
+    """
+    chosen = {}
+    for row in reference.get_bibliography_index(project_id):
+        key = _dedupe_key(row)
+        # Replacing a value keeps the key's position: the earliest-created
+        # duplicate is exported, at the first duplicate's place
+        if key not in chosen or row['id'] < chosen[key]['id']:
+            chosen[key] = row
+    rows = list(chosen.values())
+
+    for row in rows:
+        row['base_key'] = (row['citekey']
+                           or bibtex.make_citekey(row['bib_authors'], row['publication_year'], row['title']))
+    by_age = sorted(rows, key=lambda r: r['id'])
+
+    # Keys from earlier exports stand, oldest reference first on a clash
+    taken = set()
+    citekeys = {}
+    for row in by_age:
+        kept = row['export_key']
+        if kept and row['export_base_key'] == row['base_key'] and kept.casefold() not in taken:
+            taken.add(kept.casefold())
+            citekeys[row['id']] = kept
+
+    # The rest get their bare key if free, else the first free suffix
+    assigned = []
+    for row in by_age:
+        if row['id'] in citekeys:
+            continue
+        candidate = row['base_key']
+        suffixes = _suffixes()
+        while candidate.casefold() in taken:
+            candidate = row['base_key'] + next(suffixes)
+        taken.add(candidate.casefold())
+        citekeys[row['id']] = candidate
+        assigned.append((row['id'], row['base_key'], candidate))
+    if assigned:
+        reference.set_export_keys(assigned)
+
+    return [(row['id'], citekeys[row['id']]) for row in rows]
+
+
+def iter_entries(entries, batch_size=RENDER_BATCH_SIZE):
+    """Yield the BibTeX text of planned entries, with their citekeys
+    rewritten where the plan renamed them"""
+    for start in range(0, len(entries), batch_size):
+        chunk = entries[start:start + batch_size]
+        texts = reference.get_bibtex_by_ids(reference_id for reference_id, _ in chunk)
+        for reference_id, citekey in chunk:
+            text = texts.get(reference_id)
+            if text:
+                yield _ENTRY_KEY_RE.sub(lambda m: m.group(1) + citekey, text.strip(), count=1)
+
+
+cache = RevisionCache(CACHE_MAX_PROJECTS)
+
+
+def build(project_id):
+    """The project's bibliography as {'bibliography': text, 'count': n,
+    'revision': r}, served from the cache when the project is unchanged"""
+    revision = changes.get_project_revision(project_id)
+    cached = cache.get(project_id, revision)
+    if cached is not None:
+        return cached
+    pieces = list(iter_entries(plan(project_id)))
+    result = {'bibliography': '\n\n'.join(pieces), 'count': len(pieces), 'revision': revision}
+    cache.set(project_id, revision, result)
+    return result
+
+
+def iter_text(project_id):
+    """Stream the bibliography as text pieces; a cached rendering is sent
+    as is, otherwise entries are rendered batch by batch (and cached once
+    complete)"""
+    revision = changes.get_project_revision(project_id)
+    cached = cache.get(project_id, revision)
+    if cached is not None:
+        yield cached['bibliography']
+        return
+    pieces = []
+    for text in iter_entries(plan(project_id)):
+        yield ('\n\n' if pieces else '') + text
+        pieces.append(text)
+    cache.set(project_id, revision,
+              {'bibliography': '\n\n'.join(pieces), 'count': len(pieces), 'revision': revision})
@@ -0,0 +1,449 @@
+"""BibTeX parsing and normalization.
+
+The server-side counterpart of src/bibtex.js: a brace-aware entry parser
+(with @string macros, '#' concatenation and both {..} and (..) entry
+delimiters) plus decoding of the LaTeX accent escapes found in Google
+Scholar and publisher exports. Scanning jumps between delimiters with
+regular expressions rather than walking characters, so a 50k-entry file
+parses in a few seconds (see benchmarks/bibtex_parse.py).
+"""
+import re
+import unicodedata
+from collections import namedtuple
+
+from services.doi import strip_prefix
+
+# One parsed entry. `fields` maps lowercased field names to values with
+# macros expanded and concatenations joined, but LaTeX left as written;
+# `source` is the entry's text exactly as it appears in the file.
+Entry = namedtuple('Entry', ['entry_type', 'citekey', 'fields', 'source', 'line'])
+
+
+class BibtexError(ValueError):
+    """A malformed entry; `line` is its 1-based line in the input"""
+
+    def __init__(self, message, line=None):
+        super().__init__(f'line {line}: {message}' if line else message)
+        self.line = line
+
+
+# Predefined macros (standard styles define the month abbreviations)
+DEFAULT_MACROS = {
+    'jan': 'January', 'feb': 'February', 'mar': 'March', 'apr': 'April',
+    'may': 'May', 'jun': 'June', 'jul': 'July', 'aug': 'August',
+    'sep': 'September', 'oct': 'October', 'nov': 'November', 'dec': 'December',
+}
+
+# Fields tried in order for the venue (where the work was published)
+VENUE_FIELDS = ('journal', 'journaltitle', 'booktitle', 'series', 'publisher',
+                'school', 'institution', 'organization', 'howpublished')
+
+# Characters read per step by iter_stream()
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+_ENTRY_START_RE = re.compile(r'@\s*([A-Za-z][\w-]*)\s*([{(])\s*')
+_CITEKEY_RE = re.compile(r'([^\s,{}()"#=]*)\s*(?:,\s*|(?=[})]))')
+_FIELD_NAME_RE = re.compile(r'[\s,]*([A-Za-z_][\w:.+/-]*)\s*=\s*')
+_SEPARATOR_RE = re.compile(r'[\s,]*')
+_CONCAT_RE = re.compile(r'\s*#\s*')
+_BARE_VALUE_RE = re.compile(r'[\w:.+/-]+')
+_SPACE_RE = re.compile(r'\s*')
+_BRACE_RE = re.compile(r'[{}]')
+_QUOTE_OR_BRACE_RE = re.compile(r'(?<!\\)"|[{}]')
+_AND_RE = re.compile(r'\s+and\s+', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_RESYNC_RE = re.compile(r'^[ \t]*@', re.MULTILINE)
+_STRUCTURE_RE = re.compile(r'[@{}()"]')
+
+ACCENT_MAP = {
+    '"': dict(zip('aeiouyAEIOUY', 'äëïöüÿÄËÏÖÜŸ')),
+    "'": dict(zip('aeiouycnszlrAEIOUYCNSZLR', 'áéíóúýćńśźĺŕÁÉÍÓÚÝĆŃŚŹĹŔ')),
+    '`': dict(zip('aeiouAEIOU', 'àèìòùÀÈÌÒÙ')),
+    '^': dict(zip('aeiouAEIOU', 'âêîôûÂÊÎÔÛ')),
+    '~': dict(zip('anoANO', 'ãñõÃÑÕ')),
+    'v': dict(zip('cdelnrstzCDELNRSTZ', 'čďěľňřšťžČĎĚĽŇŘŠŤŽ')),
+    'H': dict(zip('ouOU', 'őűŐŰ')),
+    'c': dict(zip('csCS', 'çşÇŞ')),
+    'k': dict(zip('aeAE', 'ąęĄĘ')),
+    'u': dict(zip('aegAEG', 'ăĕğĂĔĞ')),
+    '=': dict(zip('aeiouAEIOU', 'āēīōūĀĒĪŌŪ')),
+    '.': dict(zip('cegzCEGZ', 'ċėġżĊĖĠŻ')),
+}
+SINGLE_MAP = {
+    'ss': 'ß', 'aa': 'å', 'AA': 'Å', 'o': 'ø', 'O': 'Ø',
+    'l': 'ł', 'L': 'Ł', 'ae': 'æ', 'AE': 'Æ', 'oe': 'œ', 'OE': 'Œ',
+    'i': 'ı', 'j': 'ȷ',
+}
+
+def _accent(match):
+    return ACCENT_MAP.get(match.group(1), {}).get(match.group(2), match.group(2))
+
+_BRACED_ACCENT_RE = re.compile(r'\{\\(["\'`^~v=.Hcuk])\{?([A-Za-z])\}?\}')
+_ACCENT_BRACED_LETTER_RE = re.compile(r'\\(["\'`^~v=.Hcuk])\{([A-Za-z])\}')
+_ACCENT_BARE_RE = re.compile(r'\\(["\'`^~])([A-Za-z])')
+_BRACED_SINGLE_RE = re.compile(r'\{\\(ss|aa|AA|o|O|l|L|ae|AE|oe|OE|i|j)\}')
+_BARE_SINGLE_RE = re.compile(r'\\(ss|aa|AA|ae|AE|oe|OE)\b')
+_ESCAPED_CHAR_RE = re.compile(r'\\([&%$#_])')
+_DOTLESS_I_RE = re.compile(r'(\\["\'`^~=.])\s*\{?\\i\b\}?')
+
+
+def decode_latex(text):
+    """Decode LaTeX accents and escapes to Unicode and drop grouping braces.
+
+    Mirrors cleanBibTeXText() in src/bibtex.js so server and client agree.
+    """
+    if not text:
+        return text or ''
+    if '\\' in text:
+        # \'\i (accent on a dotless i) is just an accented i
+        text = _DOTLESS_I_RE.sub(r'\1{i}', text)
+        text = _BRACED_ACCENT_RE.sub(_accent, text)
+        text = _ACCENT_BRACED_LETTER_RE.sub(_accent, text)
+        text = _ACCENT_BARE_RE.sub(_accent, text)
+        text = _BRACED_SINGLE_RE.sub(lambda m: SINGLE_MAP[m.group(1)], text)
+        text = _BARE_SINGLE_RE.sub(lambda m: SINGLE_MAP[m.group(1)], text)
+        text = _ESCAPED_CHAR_RE.sub(r'\1', text)
+    # Remaining braces only protect case
+    text = text.replace('{', '').replace('}', '')
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+class _Scanner:
+    """Parses entries out of one BibTeX text"""
+
+    def __init__(self, text, macros=None, first_line=1):
+        self.text = text
+        self.macros = dict(DEFAULT_MACROS) if macros is None else macros
+        self._first_line = first_line
+        self._line_pos = 0
+        self._line = first_line
+
+    def line_at(self, pos):
+        # Entries are visited in order, so count newlines incrementally
+        if pos < self._line_pos:
+            self._line_pos, self._line = 0, self._first_line
+        self._line += self.text.count('\n', self._line_pos, pos)
+        self._line_pos = pos
+        return self._line
+
+    def skip_space(self, pos):
+        return _SPACE_RE.match(self.text, pos).end()
+
+    def braced(self, pos, line):
+        """Value of a {...} group starting at `pos`; returns (value, end)"""
+        text = self.text
+        close = text.find('}', pos + 1)
+        if close != -1 and text.find('{', pos + 1, close) == -1:
+            # No nested group: the common case
+            return text[pos + 1:close], close + 1
+        depth = 0
+        for match in _BRACE_RE.finditer(text, pos):
+            if match.group() == '{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return text[pos + 1:match.start()], match.end()
+        raise BibtexError('unbalanced braces', line)
+
+    def quoted(self, pos, line):
+        """Value of a "..." string starting at `pos` (braces may nest)"""
+        depth = 0
+        for match in _QUOTE_OR_BRACE_RE.finditer(self.text, pos + 1):
+            char = match.group()
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+            elif depth == 0:
+                return self.text[pos + 1:match.start()], match.end()
+        raise BibtexError('unterminated quoted value', line)
+
+    def value(self, pos, line):
+        """A field value: pieces joined by '#'; returns (value, end)"""
+        pieces = []
+        while True:
+            char = self.text[pos:pos + 1]
+            if char == '{':
+                piece, pos = self.braced(pos, line)
+            elif char == '"':
+                piece, pos = self.quoted(pos, line)
+            else:
+                match = _BARE_VALUE_RE.match(self.text, pos)
+                if not match:
+                    raise BibtexError(f'expected a value at {self.text[pos:pos + 20]!r}', line)
+                word = match.group()
+                piece = word if word.isdigit() else self.macros.get(word.lower(), word)
+                pos = match.end()
+            pieces.append(piece)
+            concat = _CONCAT_RE.match(self.text, pos)
+            if not concat:
+                return pieces[0] if len(pieces) == 1 else ''.join(pieces), pos
+            pos = concat.end()
+
+    def fields(self, pos, closer, line):
+        """Parse `name = value` pairs up to `closer`; returns (fields, end)"""
+        fields = {}
+        while True:
+            match = _FIELD_NAME_RE.match(self.text, pos)
+            if match:
+                fields[match.group(1).lower()], pos = self.value(match.end(), line)
+                continue
+            pos = _SEPARATOR_RE.match(self.text, pos).end()
+            char = self.text[pos:pos + 1]
+            if char == closer:
+                return fields, pos + 1
+            if not char:
+                raise BibtexError('entry is not closed', line)
+            raise BibtexError(f'expected a field at {self.text[pos:pos + 20]!r}', line)
+
+    def entry_at(self, start):
+        """Parse the entry whose '@' is at `start`. Returns (Entry or None,
+        end); None for @comment, @preamble, @string and stray '@'s."""
+        match = _ENTRY_START_RE.match(self.text, start)
+        if not match:
+            # A stray '@' (an e-mail address in a comment, say) starts no entry
+            return None, start + 1
+        line = self.line_at(start)
+        entry_type = match.group(1).lower()
+        closer = '}' if match.group(2) == '{' else ')'
+        pos = match.end()
+
+        if entry_type == 'comment':
+            if match.group(2) == '{':
+                return None, self.braced(match.start(2), line)[1]
+            return None, pos
+        if entry_type == 'preamble':
+            _, pos = self.value(pos, line)
+            return None, self.skip_space(pos) + 1
+        if entry_type == 'string':
+            fields, end = self.fields(pos, closer, line)
+            self.macros.update(fields)
+            return None, end
+
+        key = _CITEKEY_RE.match(self.text, pos)
+        if not key:
+            raise BibtexError('missing citation key', line)
+        fields, end = self.fields(key.end(), closer, line)
+        return Entry(entry_type, key.group(1), fields, self.text[start:end], line), end
+
+
+def _iter_scanned(scanner, on_error):
+    text = scanner.text
+    pos = text.find('@')
+    while pos != -1:
+        try:
+            entry, end = scanner.entry_at(pos)
+        except BibtexError as e:
+            if on_error is None:
+                raise
+            on_error(e)
+            resync = _RESYNC_RE.search(text, pos + 1)
+            pos = resync.end() - 1 if resync else -1
+            continue
+        if entry is not None:
+            yield entry
+        pos = text.find('@', end)
+
+
+def iter_entries(text, on_error=None):
+    """Yield the entries of a BibTeX text in order.
+
+    Anything outside an entry is ignored, as BibTeX does. A malformed entry
+    raises BibtexError, or, when `on_error` is given, is passed to it and
+    skipped: parsing resumes at the next '@' that starts a line.
+    """
+    return _iter_scanned(_Scanner(text), on_error)
+
+
+class _EntryStarts:
+    """Finds where entries start in a text read piece by piece: at an '@'
+    outside every entry, i.e. at brace depth 0 once the previous entry has
+    closed. State carries over between calls to `feed()`."""
+
+    def __init__(self):
+        self.depth = 0
+        self.header = False  # between an '@' and its entry's delimiter
+        self.parens = False  # inside an @type(...) entry, outside braces
+        self.quoted = False  # inside a "..." value of such an entry
+
+    def feed(self, text, pos=0):
+        """Scan text[pos:]; returns the offset of the last entry start in
+        it, or -1"""
+        last = -1
+        depth, header, parens, quoted = self.depth, self.header, self.parens, self.quoted
+        for match in _STRUCTURE_RE.finditer(text, pos):
+            char = match.group()
+            if depth:
+                if char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+            elif parens:
+                if char == '{':
+                    depth = 1
+                elif char == '"' and text[match.start() - 1] != '\\':
+                    quoted = not quoted
+                elif char == ')' and not quoted:
+                    parens = False
+            elif char == '@':
+                last = match.start()
+                header = True
+            elif header and char in '{(':
+                # Braces in text between entries are ignored, as BibTeX does
+                header = False
+                if char == '{':
+                    depth = 1
+                else:
+                    parens = True
+        self.depth, self.header, self.parens, self.quoted = depth, header, parens, quoted
+        return last
+
+
+def iter_stream(stream, on_error=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Like iter_entries(), reading a text stream chunk by chunk.
+
+    Each chunk is cut at the last '@' that starts an entry outside any
+    other (an '@' in a field value or on a continuation line is not a
+    boundary), so entries are only parsed once complete; @string macros
+    carry over between chunks and line numbers count from the start of the
+    stream.
+    """
+    macros = dict(DEFAULT_MACROS)
+    starts = _EntryStarts()
+    pending = ''
+    line = 1
+    while True:
+        chunk = stream.read(chunk_size)
+        if chunk:
+            scanned = len(pending)
+            pending += chunk
+            cut = starts.feed(pending, scanned)
+            if cut <= 0:
+                continue
+            block, pending = pending[:cut], pending[cut:]
+        else:
+            block, pending = pending, ''
+        yield from _iter_scanned(_Scanner(block, macros, line), on_error)
+        line += block.count('\n')
+        if not chunk:
+            return
+
+
+def parse(text):
+    """Parse a BibTeX text into a list of entries (raises BibtexError)"""
+    return list(iter_entries(text))
+
+
+def _split_top_level(value, separator_re):
+    """Split on `separator_re` matches that are not inside braces"""
+    parts = []
+    depth = 0
+    start = 0
+    pos = 0
+    for match in separator_re.finditer(value):
+        depth += value.count('{', pos, match.start()) - value.count('}', pos, match.start())
+        pos = match.start()
+        if depth == 0:
+            parts.append(value[start:match.start()])
+            start = match.end()
+    parts.append(value[start:])
+    return parts
+
+
+_COMMA_RE = re.compile(',')
+
+
+def format_name(name):
+    """'Last, First' / 'von Last, Jr, First' / 'First Last' -> 'First Last'
+    (LaTeX is left for the caller to decode)"""
+    parts = [p.strip() for p in _split_top_level(name, _COMMA_RE)]
+    if len(parts) == 2:
+        name = f'{parts[1]} {parts[0]}'
+    elif len(parts) >= 3:
+        name = f'{parts[2]} {parts[0]} {parts[1]}'
+    return name
+
+
+def format_authors(value):
+    """A BibTeX name list as a comma-separated 'First Last' list (the format
+    of paper_references.authors); a trailing 'and others' becomes 'et al.'"""
+    if not value:
+        return ''
+    names = [n.strip() for n in _split_top_level(value.strip(), _AND_RE) if n.strip()]
+    others = bool(names) and names[-1].lower() == 'others'
+    if others:
+        names.pop()
+    formatted = [format_name(n) for n in names]
+    if others:
+        formatted.append('et al.')
+    # Decoded in one pass; braces kept names intact until now
+    return decode_latex(', '.join(formatted))
+
+
+def normalize_entry(entry):
+    """Normalized metadata of an entry: citekey, entry type, cleaned title,
+    authors (editors when there are none) and venue, plus year, DOI and
+    abstract when present"""
+    fields = entry.fields
+    venue = next((fields[name] for name in VENUE_FIELDS if fields.get(name)), '')
+    year = re.search(r'\d{4}', fields.get('year') or fields.get('date') or '')
+    doi = strip_prefix(decode_latex(fields.get('doi', '')))
+    return {
+        'citekey': entry.citekey,
+        'entry_type': entry.entry_type,
+        'title': decode_latex(fields.get('title', '')),
+        'authors': format_authors(fields.get('author') or fields.get('editor', '')),
+        'venue': decode_latex(venue),
+        'publication_year': int(year.group()) if year else None,
+        'doi': doi,
+        'abstract': decode_latex(fields.get('abstract', '')),
+    }
+
+
+def parse_reference(bibtex):
+    """Normalized metadata of the first entry in a reference's BibTeX, or
+    None when it holds no parseable entry"""
+    if not bibtex or '@' not in bibtex:
+        return None
+    try:
+        entry = next(iter_entries(bibtex), None)
+    except BibtexError:
+        return None
+    return normalize_entry(entry) if entry else None
+
+
+_LATEX_SPECIALS_RE = re.compile(r'(?<!\\)([&%#])')
+_STOP_WORDS = frozenset(('a', 'an', 'the', 'on', 'of', 'in', 'for', 'and', 'to', 'with', 'from', 'at', 'by'))
+
+
+def _ascii_word(text):
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def make_citekey(authors, year, title):
+    """A 'smith2020deep' style key from the first author's surname (authors
+    as a 'First Last, ...' list), the year and the first significant word
+    of the title"""
+    first_author = authors.split(',')[0].split() if authors else []
+    surname = re.sub(r'[^a-z]', '', _ascii_word(first_author[-1])) if first_author else ''
+    words = [_ascii_word(w) for w in re.findall(r'\w+', title or '')]
+    word = next((w for w in words if w.isalpha() and w not in _STOP_WORDS), '')
+    return f'{surname or "ref"}{year or ""}{word}'
+
+
+def format_value(value):
+    """Plain text as a braced BibTeX value: specials escaped, stray braces
+    dropped so the entry always stays balanced"""
+    value = str(value).replace('{', '').replace('}', '')
+    return '{' + _LATEX_SPECIALS_RE.sub(r'\\\1', value) + '}'
+
+
+def format_entry(entry_type, citekey, fields):
+    """Render an entry from plain-text `fields` ({name: value}); empty
+    values are left out"""
+    lines = [f'@{entry_type}{{{citekey},']
+    lines.extend(f'  {name} = {format_value(value)},' for name, value in fields.items()
+                 if value not in (None, ''))
+    lines.append('}')
+    return '\n'.join(lines)
@@ -0,0 +1,56 @@
+"""Citation edges from OpenAlex.
+
+Every reference of a project with a DOI is looked up once (per DOI) for
+its OpenAlex id and referenced works, in cached, batched, concurrent
+queries (see paper_search.fetch_referenced_works). The answers are kept
+in the database, so a re-run only fetches references added or re-DOI'd
+since; edges are then derived with one join over everything known, which
+also links older references to works that were added later. Each citing
+pair is connected at most once, so connections deleted by hand stay gone.
+"""
+from database import transaction
+from models import citations
+from services import paper_search
+
+# Description of connections created from citation data
+CITATION_DESCRIPTION = 'cites'
+
+
+def import_citations(project_id, progress=None):
+    """Fetch citation data for a project's unfetched references and add
+    the missing "A cites B" connections between its references, all in
+    one transaction.
+
+    `progress(fraction, message)` is called along the way; an exception it
+    raises (e.g. job cancellation) aborts the import before anything is
+    written. DOIs whose lookup failed are left unfetched for the next run.
+
+    Returns {'fetched', 'found', 'not_found', 'failed', 'created'}.
+    """
+    report = progress or (lambda fraction, message: None)
+    by_doi = {}
+    for reference_id, doi_key in citations.get_unfetched(project_id):
+        by_doi.setdefault(doi_key, []).append(reference_id)
+
+    lookups = []
+    counts = {'found': 0, 'not_found': 0, 'failed': 0}
+    done = 0
+    for result in paper_search.fetch_referenced_works(list(by_doi)):
+        done += 1
+        if result['status'] == 'error':
+            counts['failed'] += 1
+        else:
+            work = result['work']
+            counts['found' if work else 'not_found'] += 1
+            work_key = paper_search.work_key(work['id']) if work else None
+            cited = {paper_search.work_key(w) for w in work['referenced_works']} if work else set()
+            cited.discard(None)
+            lookups.extend((reference_id, result['doi'], work_key, cited)
+                           for reference_id in by_doi[result['doi']])
+        report(0.9 * done / len(by_doi), f'Fetched {done}/{len(by_doi)} works')
+
+    with transaction():
+        citations.store_lookups(lookups)
+        created = citations.insert_citation_edges(project_id, CITATION_DESCRIPTION)
+    report(1.0, f'Created {created} connections')
+    return {'fetched': len(by_doi), **counts, 'created': created}
@@ -0,0 +1,23 @@
+"""DOI cleanup shared by the importers, the reference model and the
+OpenAlex lookups, so a DOI written with any resolver prefix is stored,
+keyed and looked up the same way everywhere.
+"""
+
+# Resolver URLs and schemes a DOI is commonly written with
+PREFIXES = ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:')
+
+
+def strip_prefix(doi):
+    """A DOI without its resolver URL or 'doi:' prefix, case kept"""
+    doi = (doi or '').strip()
+    lowered = doi.lower()
+    for prefix in PREFIXES:
+        if lowered.startswith(prefix):
+            return doi[len(prefix):].strip()
+    return doi
+
+
+def normalize_doi(doi):
+    """Canonical DOI form used for cache keys, lookups and duplicate keys
+    (DOIs are case-insensitive)"""
+    return strip_prefix(doi).lower()
@@ -0,0 +1,116 @@
+"""Duplicate detection over a project's references.
+
+Two references are duplicates when their normalized DOIs match, or when
+their titles are near-identical (Jaccard similarity of character
+shingles at or above a threshold). Neither test compares all pairs: DOIs
+meet in the doi_key index, and titles only get compared with the others
+in their MinHash LSH buckets (see services.minhash), which the reference
+model keeps up to date on every write.
+"""
+from models import duplicates
+from services import minhash
+
+
+class _Groups:
+    """Union-find over reference ids, remembering why sets were joined"""
+
+    def __init__(self):
+        self.parent = {}
+        self.reasons = {}
+        self.similarity = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        while parent != self.parent[parent]:
+            self.parent[parent] = self.parent[self.parent[parent]]
+            parent = self.parent[parent]
+        self.parent[item] = parent
+        return parent
+
+    def union(self, a, b, reason, similarity=None):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+            self.reasons.setdefault(root_a, set()).update(self.reasons.pop(root_b, ()))
+            if root_b in self.similarity:
+                self._lower(root_a, self.similarity.pop(root_b))
+        self.reasons.setdefault(root_a, set()).add(reason)
+        if similarity is not None:
+            self._lower(root_a, similarity)
+
+    def _lower(self, root, similarity):
+        self.similarity[root] = min(similarity, self.similarity.get(root, similarity))
+
+    def sets(self):
+        members = {}
+        for item in self.parent:
+            members.setdefault(self.find(item), []).append(item)
+        return [(sorted(items), self.reasons[root], self.similarity.get(root))
+                for root, items in members.items() if len(items) > 1]
+
+
+def find_duplicates(project_id, threshold=minhash.DEFAULT_THRESHOLD):
+    """Groups of duplicate references in a project.
+
+    Returns a list of {'references': [summary, ...], 'reasons': ['doi'
+    and/or 'title'], 'similarity': lowest title similarity that joined the
+    group (None for DOI-only groups)}, largest groups first.
+    """
+    groups = _Groups()
+    for ids in duplicates.get_doi_groups(project_id):
+        for other in ids[1:]:
+            groups.union(ids[0], other, 'doi')
+
+    buckets = duplicates.get_title_buckets(project_id)
+    titles = duplicates.get_titles({i for ids in buckets for i in ids})
+    shingle_sets = {i: minhash.shingles(title) for i, title in titles.items()}
+
+    for ids in buckets:
+        # Compare each member with one representative per group found in
+        # the bucket so far: a bucket of n copies of a title costs n checks
+        representatives = []
+        for reference_id in ids:
+            for other in representatives:
+                if groups.find(other) == groups.find(reference_id):
+                    break
+                score = minhash.similarity(shingle_sets[reference_id], shingle_sets[other])
+                if score >= threshold:
+                    groups.union(other, reference_id, 'title', round(score, 3))
+                    break
+            else:
+                representatives.append(reference_id)
+
+    found = groups.sets()
+    summaries = duplicates.get_summaries([i for ids, _, _ in found for i in ids])
+    result = [
+        {
+            'references': [summaries[i] for i in ids if i in summaries],
+            'reasons': sorted(reasons),
+            'similarity': similarity,
+        }
+        for ids, reasons, similarity in found
+    ]
+    result.sort(key=lambda group: (-len(group['references']), group['references'][0]['id']))
+    return result
+
+
+def check_reference(reference_id, threshold=minhash.DEFAULT_THRESHOLD):
+    """References in the same project that duplicate `reference_id`, as
+    summaries with 'reasons' and title 'similarity', most similar first"""
+    candidates = duplicates.get_candidates(reference_id)
+    if not candidates:
+        return []
+    titles = duplicates.get_titles([reference_id, *candidates])
+    own = minhash.shingles(titles.get(reference_id))
+    matches = {}
+    for candidate_id, shares_doi in candidates.items():
+        score = round(minhash.similarity(own, minhash.shingles(titles.get(candidate_id))), 3)
+        reasons = (['doi'] if shares_doi else []) + (['title'] if score >= threshold else [])
+        if reasons:
+            matches[candidate_id] = (reasons, score)
+
+    summaries = duplicates.get_summaries(matches)
+    result = [{**summaries[i], 'reasons': reasons, 'similarity': score}
+              for i, (reasons, score) in matches.items() if i in summaries]
+    result.sort(key=lambda match: (-match['similarity'], match['id']))
+    return result
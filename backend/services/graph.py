@@ -0,0 +1,196 @@
+"""In-memory graph of a project's reference connections.
+
+A project's connections are loaded once per revision into compressed
+sparse row (CSR) adjacency arrays: references are numbered 0..n-1 in id
+order, and the neighbours of node i are targets[offsets[i]:offsets[i+1]],
+one array pair for outgoing and one for incoming edges. Traversals then
+run over flat integer arrays instead of SQL joins; components and degree
+rankings are computed on first use and kept with the graph.
+"""
+import itertools
+from array import array
+from collections import deque
+
+from models import changes, connection
+from services.revision_cache import RevisionCache
+
+# Graphs kept in memory (one per project, latest revision)
+CACHE_MAX_PROJECTS = 8
+DIRECTIONS = ('out', 'in', 'both')
+DEGREE_MODES = ('total', 'in', 'out')
+
+
+def _csr(n, sources, targets):
+    """(offsets, neighbours) arrays of the edges sources[k] -> targets[k]
+    over nodes 0..n-1, by counting sort"""
+    counts = [0] * (n + 1)
+    for s in sources:
+        counts[s + 1] += 1
+    offsets = array('l', itertools.accumulate(counts))
+    position = offsets.tolist()
+    neighbours = array('l', bytes(len(sources) * array('l').itemsize))
+    for s, t in zip(sources, targets):
+        neighbours[position[s]] = t
+        position[s] += 1
+    return offsets, neighbours
+
+
+class ProjectGraph:
+    """CSR adjacency of one revision of a project's connection graph.
+
+    Public methods take and return reference ids; unknown ids raise
+    KeyError.
+    """
+
+    def __init__(self, node_ids, edges):
+        self.ids = array('q', sorted(node_ids))
+        self.index = {reference_id: i for i, reference_id in enumerate(self.ids)}
+        sources = [self.index[s] for s, _ in edges]
+        targets = [self.index[t] for _, t in edges]
+        self.edge_count = len(edges)
+        self.out_offsets, self.out_targets = _csr(len(self.ids), sources, targets)
+        self.in_offsets, self.in_sources = _csr(len(self.ids), targets, sources)
+        self._components = None
+        self._rankings = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _neighbours(self, node, direction):
+        if direction == 'out':
+            return self.out_targets[self.out_offsets[node]:self.out_offsets[node + 1]]
+        if direction == 'in':
+            return self.in_sources[self.in_offsets[node]:self.in_offsets[node + 1]]
+        return (self.out_targets[self.out_offsets[node]:self.out_offsets[node + 1]]
+                + self.in_sources[self.in_offsets[node]:self.in_offsets[node + 1]])
+
+    def neighborhood(self, reference_id, depth, direction='both', limit=None):
+        """References within `depth` hops, as ([(id, distance)], truncated)
+        in breadth-first order, starting with the reference itself at 0.
+        The search stops once `limit` references are found."""
+        start = self.index[reference_id]
+        distances = {start: 0}
+        frontier = [start]
+        for distance in range(1, depth + 1):
+            next_frontier = []
+            for node in frontier:
+                for neighbour in self._neighbours(node, direction):
+                    if neighbour not in distances:
+                        if limit is not None and len(distances) >= limit:
+                            return self._with_ids(distances), True
+                        distances[neighbour] = distance
+                        next_frontier.append(neighbour)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return self._with_ids(distances), False
+
+    def _with_ids(self, distances):
+        return [(self.ids[node], distance) for node, distance in distances.items()]
+
+    def shortest_path(self, source_id, target_id, direction='both'):
+        """Reference ids along a shortest path from source to target
+        (following edge direction unless 'both'), or None.
+
+        Breadth-first search from both ends, always expanding the smaller
+        frontier, so only around the square root of a full search is
+        visited on typical graphs.
+        """
+        source, target = self.index[source_id], self.index[target_id]
+        if source == target:
+            return [source_id]
+        backward = {'out': 'in', 'in': 'out', 'both': 'both'}[direction]
+        parents = {source: None}
+        children = {target: None}
+        forward_frontier, backward_frontier = [source], [target]
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) <= len(backward_frontier):
+                frontier, seen, other, step = forward_frontier, parents, children, direction
+            else:
+                frontier, seen, other, step = backward_frontier, children, parents, backward
+            next_frontier = []
+            meeting = None
+            for node in frontier:
+                for neighbour in self._neighbours(node, step):
+                    if neighbour in seen:
+                        continue
+                    seen[neighbour] = node
+                    if neighbour in other:
+                        meeting = neighbour
+                        break
+                    next_frontier.append(neighbour)
+                if meeting is not None:
+                    break
+            if meeting is not None:
+                path = []
+                node = meeting
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                path.reverse()
+                node = children[meeting]
+                while node is not None:
+                    path.append(node)
+                    node = children[node]
+                return [self.ids[node] for node in path]
+            if frontier is forward_frontier:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+        return None
+
+    def components(self):
+        """Weakly connected components as lists of reference ids, largest
+        first (computed once per graph)"""
+        if self._components is None:
+            label = array('l', [-1]) * len(self.ids)
+            found = []
+            for start in range(len(self.ids)):
+                if label[start] != -1:
+                    continue
+                label[start] = len(found)
+                members = [start]
+                queue = deque(members)
+                while queue:
+                    node = queue.popleft()
+                    for neighbour in self._neighbours(node, 'both'):
+                        if label[neighbour] == -1:
+                            label[neighbour] = len(found)
+                            members.append(neighbour)
+                            queue.append(neighbour)
+                found.append([self.ids[node] for node in members])
+            found.sort(key=len, reverse=True)
+            self._components = found
+        return self._components
+
+    def degree(self, reference_id):
+        """(in_degree, out_degree) of a reference"""
+        node = self.index[reference_id]
+        return (self.in_offsets[node + 1] - self.in_offsets[node],
+                self.out_offsets[node + 1] - self.out_offsets[node])
+
+    def ranking(self, mode='total'):
+        """Reference ids ordered by degree ('total', 'in' or 'out'),
+        highest first, ties by id (computed once per graph and mode)"""
+        if mode not in self._rankings:
+            in_degree = [b - a for a, b in zip(self.in_offsets, self.in_offsets[1:])]
+            out_degree = [b - a for a, b in zip(self.out_offsets, self.out_offsets[1:])]
+            degree = {'in': in_degree, 'out': out_degree,
+                      'total': [i + o for i, o in zip(in_degree, out_degree)]}[mode]
+            order = sorted(range(len(self.ids)), key=lambda node: -degree[node])
+            self._rankings[mode] = array('q', (self.ids[node] for node in order))
+        return self._rankings[mode]
+
+
+cache = RevisionCache(CACHE_MAX_PROJECTS)
+
+
+def get_graph(project_id):
+    """The project's current graph, built from the database when the
+    project changed since it was last loaded"""
+    revision = changes.get_project_revision(project_id)
+    graph = cache.get(project_id, revision)
+    if graph is None:
+        graph = ProjectGraph(*connection.get_project_graph(project_id))
+        cache.set(project_id, revision, graph)
+    return graph
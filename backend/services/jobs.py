@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+# Worker threads shared by all background jobs
+MAX_WORKERS = 2
+# How long finished jobs (and their result files) are kept
+RETENTION_SECONDS = 3600
+# Finished jobs beyond this count are dropped oldest-first
+MAX_RETAINED_JOBS = 200
+# JSON results larger than this, encoded, are kept on disk rather than in
+# memory, bounding retained results to MAX_RETAINED_JOBS times this
+MAX_MEMORY_RESULT_BYTES = 256 * 1024
+
+JOBS_DIR = os.path.join(os.path.dirname(database.DB_PATH), 'jobs')
+
+# Returned by a handler whose result is a file on disk rather than JSON
+JobFile = namedtuple('JobFile', ['path', 'mimetype', 'filename'])
+# A large JSON result, encoded and spilled to a file under JOBS_DIR
+SpilledResult = namedtuple('SpilledResult', ['path'])
+
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled"""
+
+
+class Job:
+    """One unit of background work and its progress, result or error"""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def update(self, progress=None, message=None):
+        """Report progress (0..1) and/or a status message; raises
+        JobCancelled if the job was cancelled in the meantime."""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def result_path(self, suffix=''):
+        """Path inside JOBS_DIR where a handler may write a file result"""
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        return os.path.join(JOBS_DIR, f'{self.id}{suffix}')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'has_file': isinstance(self.result, JobFile),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """In-process job queue: a worker pool plus a registry of job handlers.
+
+    Handlers are registered per job type with `handler(kind)` and called as
+    `fn(job, **params)`. They report progress through `job.update()` and
+    return either a JSON-serializable value or a JobFile.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._handlers = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def handler(self, kind):
+        """Decorator registering the handler for a job type"""
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    @property
+    def kinds(self):
+        return sorted(self._handlers)
+
+    def submit(self, kind, params):
+        """Queue a job; raises KeyError for an unknown job type"""
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        job = Job(kind, params)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation. Queued jobs never start; running jobs stop
+        at their next progress update."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            job._cancel.set()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        return job
+
+    def _run(self, job):
+        # Status changes happen under the lock so they cannot interleave
+        # with cancel()
+        with self._lock:
+            if job._cancel.is_set():
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        status, result, error = 'succeeded', None, None
+        try:
+            result = self._handlers[job.kind](job, **job.params)
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            status, error = 'failed', str(e) or type(e).__name__
+        with self._lock:
+            # Cancelled after the handler's last update(): still cancelled
+            if status == 'succeeded' and job._cancel.is_set():
+                status = 'cancelled'
+            if status == 'succeeded':
+                job.result = self._spill(job, result)
+                job.progress = 1.0
+            job.error = error
+            job.status = status
+            job.finished_at = time.time()
+        if status != 'succeeded':
+            self._discard_files(job)
+
+    @staticmethod
+    def _spill(job, result):
+        """The result to keep for a job: JSON results above
+        MAX_MEMORY_RESULT_BYTES are written to disk instead"""
+        if isinstance(result, JobFile):
+            return result
+        try:
+            encoded = json.dumps(result).encode('utf-8')
+        except (TypeError, ValueError):
+            return result
+        if len(encoded) <= MAX_MEMORY_RESULT_BYTES:
+            return result
+        path = job.result_path('.json')
+        try:
+            with open(path, 'wb') as f:
+                f.write(encoded)
+        except OSError:
+            return result
+        return SpilledResult(path)
+
+    def _purge(self):
+        """Drop expired finished jobs (caller holds the lock)"""
+        now = time.time()
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        excess = max(0, len(finished) - MAX_RETAINED_JOBS)
+        for index, job in enumerate(finished):
+            if index < excess or now - job.finished_at > RETENTION_SECONDS:
+                del self._jobs[job.id]
+                self._discard_files(job)
+
+    @staticmethod
+    def _discard_files(job):
+        prefix = job.id
+        try:
+            names = os.listdir(JOBS_DIR)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(JOBS_DIR, name))
+                except OSError:
+                    pass
+
+
+def clear_results():
+    """Remove result files left by a previous run; jobs live in memory
+    only, so they are orphans. Called once at app startup."""
+    shutil.rmtree(JOBS_DIR, ignore_errors=True)
+
+
+# Shared job manager for the API
+manager = JobManager()
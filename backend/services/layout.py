@@ -0,0 +1,189 @@
+"""Automatic canvas layout.
+
+Topics are laid out in two phases:
+
+1. A vectorized force-directed pass (Fruchterman-Reingold) over all topic
+   centres at once: every pair repels, and topics whose references are
+   connected attract in proportion to the number of connections between
+   them, so related topics end up near each other. It starts from the
+   current arrangement, so the result resembles what the user built.
+2. Shelf packing guided by that embedding: topics are cut into rows by
+   their embedded y, ordered within a row by embedded x, and placed
+   left to right on the canvas grid with a one-cell gap. Rows are sized
+   so the whole layout is about LAYOUT_ASPECT times wider than tall.
+   Packing cannot overlap, so no collision repair is needed afterwards.
+
+Grid sizes follow the frontend's own minimums (title width, rows of
+reference circles, see TopicBlock.jsx).
+"""
+import math
+
+import numpy as np
+
+from models import connection, topic
+
+# Canvas geometry, mirroring TopicBlock.jsx
+GRID_CELL_SIZE = 40
+MIN_GRID_WIDTH = 5
+MIN_GRID_HEIGHT = 3
+# Approximate width of a character of the 14px topic-name font, and the
+# header space taken by padding and the menu button
+TITLE_CHAR_PX = 8
+TITLE_PADDING_PX = 110
+# Reference circles: 30px plus a 10px gap, inside 15px side padding
+REFERENCE_SLOT_PX = 40
+BODY_PADDING_PX = 30
+HEADER_PX = 70
+FOOTER_PX = 20
+
+# Free cells kept between topics
+GAP_CELLS = 1
+FORCE_ITERATIONS = 40
+# Packed width over height of the whole layout
+LAYOUT_ASPECT = 1.6
+# Canvas position of the layout's top-left corner
+ORIGIN = (GRID_CELL_SIZE, GRID_CELL_SIZE)
+
+
+def grid_size(name, reference_count, current=None):
+    """(grid_width, grid_height) fitting a topic's name and references,
+    roughly twice as wide as tall, never below `current` when given"""
+    title_cells = math.ceil((len(name or '') * TITLE_CHAR_PX + TITLE_PADDING_PX) / GRID_CELL_SIZE)
+    per_row = max(1, math.ceil(math.sqrt(2 * reference_count)))
+    body_cells = math.ceil((per_row * REFERENCE_SLOT_PX + BODY_PADDING_PX) / GRID_CELL_SIZE)
+    width = max(MIN_GRID_WIDTH, title_cells, body_cells)
+    per_row = max(1, (width * GRID_CELL_SIZE - BODY_PADDING_PX) // REFERENCE_SLOT_PX)
+    rows = math.ceil(reference_count / per_row)
+    height = MIN_GRID_HEIGHT
+    if rows > 1:
+        height = max(height, math.ceil((HEADER_PX + rows * REFERENCE_SLOT_PX + FOOTER_PX) / GRID_CELL_SIZE))
+    if current:
+        width, height = max(width, current[0]), max(height, current[1])
+    return width, height
+
+
+def _force_directed(centres, sizes, edges, weights, iterations=FORCE_ITERATIONS):
+    """Fruchterman-Reingold over box centres; returns the new centres"""
+    n = len(centres)
+    # Ideal distance: about one typical box plus gap
+    k = float(np.sqrt((sizes[:, 0] * sizes[:, 1]).mean())) * 1.5
+    # Start hot enough to untangle the existing arrangement, cool linearly
+    temperature = k * math.sqrt(n)
+    cooling = temperature / (iterations + 1)
+    # float32 and in-place updates: the n x n pass dominates the run time
+    x = centres[:, 0].astype(np.float32)
+    y = centres[:, 1].astype(np.float32)
+    k2 = np.float32(k * k)
+    for _ in range(iterations):
+        dx = np.subtract.outer(x, x)
+        dy = np.subtract.outer(y, y)
+        # Repulsion k^2/d along the unit vector, i.e. k^2 * delta / d^2
+        scale = dx * dx
+        scale += dy * dy
+        np.maximum(scale, 1.0, out=scale)
+        np.divide(k2, scale, out=scale)
+        move_x = np.einsum('ij,ij->i', dx, scale)
+        move_y = np.einsum('ij,ij->i', dy, scale)
+        if len(edges):
+            # Attraction d^2/k along the edge, scaled by its weight
+            ex = x[edges[:, 0]] - x[edges[:, 1]]
+            ey = y[edges[:, 0]] - y[edges[:, 1]]
+            pull = np.sqrt(ex * ex + ey * ey) * weights / k
+            move_x -= np.bincount(edges[:, 0], ex * pull, n) - np.bincount(edges[:, 1], ex * pull, n)
+            move_y -= np.bincount(edges[:, 0], ey * pull, n) - np.bincount(edges[:, 1], ey * pull, n)
+        length = np.maximum(np.sqrt(move_x * move_x + move_y * move_y), 1e-9)
+        step = np.minimum(length, temperature) / length
+        x += (move_x * step).astype(np.float32)
+        y += (move_y * step).astype(np.float32)
+        temperature -= cooling
+    return np.stack([x, y], axis=1)
+
+
+def _pack(order_x, order_y, sizes, gap):
+    """Top-left grid cells of boxes packed into rows: rows are taken in
+    order of `order_y` and filled to a common width, each row ordered by
+    `order_x`"""
+    padded = sizes + gap
+    row_width = max(math.sqrt((padded[:, 0] * padded[:, 1]).sum() * LAYOUT_ASPECT), padded[:, 0].max())
+    corners = np.zeros_like(sizes)
+    top = 0
+    row = []
+    width = 0
+
+    def place(row, top):
+        left = 0
+        for i in sorted(row, key=lambda i: order_x[i]):
+            corners[i] = (left, top)
+            left += padded[i, 0]
+        return top + max(padded[i, 1] for i in row)
+
+    for i in np.argsort(order_y, kind='stable'):
+        if row and width + padded[i, 0] > row_width:
+            top = place(row, top)
+            row, width = [], 0
+        row.append(i)
+        width += padded[i, 0]
+    if row:
+        place(row, top)
+    return corners
+
+
+def compute_layout(topics, edges, resize=True):
+    """Non-overlapping, grid-aligned positions for a project's topics.
+
+    `topics` are dicts with id, name, position_x, position_y, grid_width,
+    grid_height and reference_count; `edges` are (topic_id, topic_id,
+    connection_count). With `resize`, grid sizes are recomputed to fit
+    each topic's contents; otherwise they are only raised to the minimum.
+    Returns [{'id', 'position_x', 'position_y', 'grid_width',
+    'grid_height'}] in input order.
+    """
+    if not topics:
+        return []
+    sizes = np.array([
+        grid_size(t['name'], t['reference_count'],
+                  None if resize else (t['grid_width'] or MIN_GRID_WIDTH, t['grid_height'] or MIN_GRID_HEIGHT))
+        for t in topics
+    ], dtype=float)
+    pixels = sizes * GRID_CELL_SIZE
+    corners = np.array([(t['position_x'] or 0, t['position_y'] or 0) for t in topics], dtype=float)
+    centres = corners + pixels / 2
+    # Topics stacked on one spot (e.g. all created at 0,0) start on a small
+    # spiral so the forces have a direction to work with
+    if len(topics) > 1:
+        _, first = np.unique(np.round(centres), axis=0, return_index=True)
+        repeated = np.setdiff1d(np.arange(len(topics)), first)
+        angle = repeated * 2.399963
+        centres[repeated] += np.stack([np.cos(angle), np.sin(angle)], axis=1) * (10 + repeated[:, None] * 2.0)
+
+    index = {t['id']: i for i, t in enumerate(topics)}
+    pairs = [(index[a], index[b], w) for a, b, w in edges if a in index and b in index and a != b]
+    edge_array = np.array([(a, b) for a, b, _ in pairs], dtype=np.intp).reshape(-1, 2)
+    weights = np.array([w for _, _, w in pairs], dtype=float)
+    if len(weights):
+        # Diminishing returns: a hundred links should not crush two topics together
+        weights = np.log1p(weights)
+
+    centres = _force_directed(centres, pixels, edge_array, weights)
+    cells = _pack(centres[:, 0], centres[:, 1], sizes.astype(np.int64), GAP_CELLS)
+
+    positions = cells * GRID_CELL_SIZE + np.array(ORIGIN)
+    return [
+        {
+            'id': t['id'],
+            'position_x': int(positions[i, 0]),
+            'position_y': int(positions[i, 1]),
+            'grid_width': int(sizes[i, 0]),
+            'grid_height': int(sizes[i, 1]),
+        }
+        for i, t in enumerate(topics)
+    ]
+
+
+def layout_project(project_id, resize=True):
+    """Lay out a project's topics and save every position and size in one
+    transaction; returns the new layouts"""
+    layouts = compute_layout(topic.get_layout_rows(project_id),
+                             connection.get_topic_connection_weights(project_id), resize)
+    topic.update_topic_layouts(layouts)
+    return layouts
@@ -0,0 +1,167 @@
+import io
+import os
+import shutil
+import tempfile
+
+from database import transaction
+from models import reference
+from services import bibtex, ris, paper_search
+from services.doi import normalize_doi
+
+FORMATS = ('bibtex', 'ris')
+# Rows per executemany while inserting
+IMPORT_BATCH_SIZE = 1000
+# Per-entry errors beyond this are counted but not listed
+MAX_REPORTED_ERRORS = 500
+# Bytes sniffed to guess the format of a file without a telling extension
+SNIFF_BYTES = 64 * 1024
+
+EXTENSIONS = {'.bib': 'bibtex', '.bibtex': 'bibtex', '.ris': 'ris'}
+
+
+def spool_upload(stream, directory, chunk_size=1024 * 1024):
+    """Copy an upload stream to a temp file in `directory`; returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(stream, out, chunk_size)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def detect_format(filename, path):
+    """'bibtex' or 'ris' from the file extension, else from the content;
+    None when neither fits"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in EXTENSIONS:
+        return EXTENSIONS[ext]
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES).decode('utf-8', 'replace')
+    if 'TY  -' in head:
+        return 'ris'
+    if '@' in head:
+        return 'bibtex'
+    return None
+
+
+def _iter_rows(stream, fmt, on_error):
+    """Yield (line, row) per entry, rows keyed by reference.IMPORT_COLUMNS"""
+    if fmt == 'bibtex':
+        for entry in bibtex.iter_stream(stream, on_error):
+            meta = bibtex.normalize_entry(entry)
+            yield entry.line, _row(meta, entry.source)
+    else:
+        for tags, line in ris.iter_records(stream, on_error):
+            meta = ris.normalize_record(tags)
+            yield line, _row(meta, meta['bibtex'])
+
+
+def _row(meta, source):
+    return {
+        'title': meta['title'],
+        'doi': meta['doi'],
+        'authors': meta['authors'],
+        'abstract': meta['abstract'],
+        'notes': '',
+        'citation_count': 0,
+        'publication_year': meta['publication_year'],
+        'bibtex': source,
+        'citekey': meta['citekey'],
+        'entry_type': meta['entry_type'],
+        'bib_authors': meta['authors'],
+        'venue': meta['venue'],
+    }
+
+
+def import_file(topic_id, path, fmt, resolve=False, progress=None):
+    """Import every entry of a .bib or RIS file into a topic.
+
+    The file is parsed as a stream and rows are inserted as they come, in
+    IMPORT_BATCH_SIZE executemany batches, so memory stays bounded by a
+    batch. All batches run in one write transaction that commits once the
+    whole file is in: other requests never see a partial import, and a
+    failure, cancellation or crash part way leaves nothing behind. Entries
+    that fail to parse or have no title are skipped and reported. With
+    `resolve`, references with a DOI but missing metadata are then
+    completed from OpenAlex, after the commit.
+
+    `progress(fraction, message)` is called along the way; an exception it
+    raises (e.g. job cancellation) aborts the import.
+
+    Returns {'imported', 'ids', 'errors', 'error_count', 'resolved'}.
+    """
+    report = progress or (lambda fraction, message: None)
+    errors = []
+    error_count = 0
+
+    def record_error(line, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line, 'error': message})
+
+    def on_parse_error(e):
+        record_error(e.line, str(e).split(': ', 1)[-1])
+
+    size = os.path.getsize(path) or 1
+    ids = []
+    # (id, doi) of inserted references worth resolving
+    incomplete = []
+    batch = []
+
+    def flush():
+        batch_ids = reference.insert_references(topic_id, batch)
+        ids.extend(batch_ids)
+        if resolve:
+            incomplete.extend((reference_id, row['doi']) for reference_id, row in zip(batch_ids, batch)
+                              if row['doi'] and not (row['authors'] and row['abstract'] and row['publication_year']))
+        batch.clear()
+
+    with transaction(), open(path, 'rb') as raw:
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        for line, row in _iter_rows(stream, fmt, on_parse_error):
+            if not row['title']:
+                record_error(line, 'entry has no title')
+                continue
+            batch.append(row)
+            if len(batch) == IMPORT_BATCH_SIZE:
+                flush()
+                report(0.8 * raw.tell() / size, f'Inserted {len(ids)} references')
+        if batch:
+            flush()
+    report(0.8, f'Imported {len(ids)} references')
+
+    resolved = 0
+    if incomplete:
+        resolved = _resolve_missing(incomplete, report)
+
+    return {
+        'imported': len(ids),
+        'ids': ids,
+        'errors': errors,
+        'error_count': error_count,
+        'resolved': resolved,
+    }
+
+
+def _resolve_missing(incomplete, report):
+    """Look up imported references that have a DOI but lack authors,
+    abstract or year, given as (id, doi) pairs, and fill in what OpenAlex
+    knows"""
+    by_doi = {}
+    for reference_id, doi in incomplete:
+        by_doi.setdefault(normalize_doi(doi), []).append(reference_id)
+
+    updates = []
+    done = 0
+    for result in paper_search.resolve_dois(list(by_doi)):
+        done += 1
+        if result['paper']:
+            updates.extend((reference_id, result['paper']) for reference_id in by_doi[result['doi']])
+        report(0.8 + 0.2 * done / len(by_doi), f'Resolved {done}/{len(by_doi)} DOIs')
+    if updates:
+        reference.fill_missing_metadata(updates)
+    return len(updates)
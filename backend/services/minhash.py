@@ -0,0 +1,94 @@
+"""MinHash signatures of reference titles for near-duplicate lookup.
+
+A title is normalized (case, accents, punctuation and spacing folded
+away), cut into overlapping character shingles, and summarized by a
+SIGNATURE_SIZE-value MinHash signature. Two titles agree on each value
+with probability close to the Jaccard similarity of their shingle sets,
+so cutting the signature into BANDS bands of ROWS values and bucketing on
+whole bands (locality-sensitive hashing) makes titles above roughly
+(1/BANDS) ** (1/ROWS) ~ 0.6 similarity likely to share a bucket, and
+unrelated ones unlikely to. Candidates are then confirmed with the exact
+Jaccard similarity.
+
+Signatures use one-permutation hashing: each shingle is hashed once and
+the hash picks both the slot it competes for and its value, instead of
+hashing every shingle SIGNATURE_SIZE times. Slots no shingle fell into
+borrow the value of the next filled slot, tagged with the distance, so
+they still agree exactly when the sets agree there.
+"""
+import hashlib
+import re
+import struct
+import unicodedata
+
+# Long enough that common fragments ('ing', 'tio') are not shared by
+# every title, short enough that a typo only disturbs a few shingles
+SHINGLE_SIZE = 4
+SIGNATURE_SIZE = 32
+BANDS = 8
+ROWS = SIGNATURE_SIZE // BANDS
+# Titles at least this similar (Jaccard over shingles) count as duplicates
+DEFAULT_THRESHOLD = 0.8
+
+# Low hash bits pick the slot; the value keeps the high 56 bits and makes
+# room for a 6-bit borrowing distance
+_SLOT_MASK = SIGNATURE_SIZE - 1
+_VALUE_SHIFT = 8
+_DISTANCE_BITS = 6
+_BAND = struct.Struct(f'<{ROWS}Q')
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize_title(title):
+    """Lowercase, accent-free, punctuation-free form of a title"""
+    text = unicodedata.normalize('NFKD', (title or '').casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(_NON_WORD_RE.sub(' ', text).split())
+
+
+def shingles(title):
+    """Set of character shingles of a title's normalized form"""
+    text = normalize_title(title)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(shingle_set):
+    """The SIGNATURE_SIZE-value MinHash signature of a non-empty shingle set"""
+    slots = [None] * SIGNATURE_SIZE
+    for shingle in shingle_set:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little')
+        slot, value = h & _SLOT_MASK, h >> _VALUE_SHIFT
+        current = slots[slot]
+        if current is None or value < current:
+            slots[slot] = value
+    values = []
+    for slot in range(SIGNATURE_SIZE):
+        distance = 0
+        while slots[(slot + distance) & _SLOT_MASK] is None:
+            distance += 1
+        values.append(slots[(slot + distance) & _SLOT_MASK] << _DISTANCE_BITS | distance)
+    return values
+
+
+def band_buckets(title):
+    """[(band, bucket)] LSH keys of a title, each bucket a signed 64-bit
+    hash of the band's ROWS values; [] for an empty title"""
+    shingle_set = shingles(title)
+    if not shingle_set:
+        return []
+    values = signature(shingle_set)
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(_BAND.pack(*values[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest(),
+            'little', signed=True))
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a, b):
+    """Jaccard similarity of two shingle sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
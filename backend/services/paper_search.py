@@ -1,9 +1,77 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
 from pyalex import Works
+from services.doi import normalize_doi, strip_prefix
+from services.search_cache import (
+    cache, MISSING, DOI_TTL_SECONDS, SEARCH_TTL_SECONDS, normalize_query,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bulk DOI resolution: DOIs per OpenAlex OR-filter query, concurrent queries,
+# and the request rate we allow ourselves (OpenAlex allows 10 requests/s).
+DOI_BATCH_CHUNK_SIZE = 50
+DOI_BATCH_MAX_WORKERS = 4
+OPENALEX_MAX_REQUESTS_PER_SECOND = 8
+# Filter syntax: ',' separates filters and '|' alternatives, so a DOI
+# holding either cannot go in a doi: filter, escaped or not
+FILTER_SEPARATORS_RE = re.compile(r'[,|]')
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+rate_limiter = RateLimiter(OPENALEX_MAX_REQUESTS_PER_SECOND)
+
+def _work_to_paper(work):
+    """Convert an OpenAlex work into the paper metadata dictionary"""
+    # Extract authors
+    authors_list = []
+    if work.get('authorships'):
+        for authorship in work['authorships']:
+            author = authorship.get('author', {})
+            if author and author.get('display_name'):
+                authors_list.append(author['display_name'])
+
+    authors_str = ', '.join(authors_list) if authors_list else ''
+
+    return {
+        'id': work.get('id', ''),
+        'title': work.get('title', 'Untitled'),
+        'doi': strip_prefix(work.get('doi')),
+        'authors': authors_str,
+        'abstract': work.get('abstract', ''),
+        'publication_year': work.get('publication_year', ''),
+        'venue': ((work.get('primary_location') or {}).get('source') or {}).get('display_name', ''),
+        'citation_count': work.get('cited_by_count', 0),
+        'url': work.get('doi', '') or work.get('id', ''),
+    }
 
 def search_papers(query, search_type='title', limit=10):
     """
     Search for papers using OpenAlex API
 
+    Results are cached on disk, keyed on the normalized query, search type
+    and limit. Failed lookups are logged and not cached.
+
     Args:
         query: Search query string
         search_type: 'title', 'author', or 'doi'
@@ -12,10 +80,21 @@ def search_papers(query, search_type='title', limit=10):
     Returns:
         List of paper metadata dictionaries
     """
+    if search_type == 'doi':
+        key = f'search|doi|{normalize_doi(query)}|{limit}'
+        ttl = DOI_TTL_SECONDS
+    else:
+        key = f'search|{search_type}|{normalize_query(query)}|{limit}'
+        ttl = SEARCH_TTL_SECONDS
+
+    cached = cache.get(key)
+    if cached is not MISSING:
+        return cached
+
     try:
         if search_type == 'doi':
             # Direct DOI lookup
-            results = Works().filter(doi=query).get()
+            results = _works_by_doi([normalize_doi(query)])
         elif search_type == 'author':
             # Search by author name
             results = Works().search(query).filter(display_name=query).get()
@@ -23,90 +102,179 @@ def search_papers(query, search_type='title', limit=10):
             # Default: search by title
             results = Works().search(query).get()
 
-        papers = []
-        count = 0
-
-        for work in results:
-            if count >= limit:
-                break
-
-            # Extract authors
-            authors_list = []
-            if work.get('authorships'):
-                for authorship in work['authorships']:
-                    author = authorship.get('author', {})
-                    if author and author.get('display_name'):
-                        authors_list.append(author['display_name'])
-
-            authors_str = ', '.join(authors_list) if authors_list else ''
-
-            # Extract publication year
-            pub_year = work.get('publication_year', '')
-
-            # Build paper object
-            paper = {
-                'id': work.get('id', ''),
-                'title': work.get('title', 'Untitled'),
-                'doi': work.get('doi', '').replace('https://doi.org/', '') if work.get('doi') else '',
-                'authors': authors_str,
-                'abstract': work.get('abstract', ''),
-                'publication_year': pub_year,
-                'venue': work.get('primary_location', {}).get('source', {}).get('display_name', ''),
-                'citation_count': work.get('cited_by_count', 0),
-                'url': work.get('doi', '') or work.get('id', ''),
-            }
-
-            papers.append(paper)
-            count += 1
-
-        return papers
-
+        papers = [_work_to_paper(work) for work in list(results)[:limit]]
     except Exception:
+        logger.warning('OpenAlex search failed (%s: %r)', search_type, query, exc_info=True)
         return []
 
+    cache.set(key, papers, ttl)
+    return papers
+
 def get_paper_by_doi(doi):
     """
     Get a single paper by DOI
 
+    Found and not-found answers are both cached (DOI metadata rarely
+    changes); failed lookups are logged and not cached.
+
     Args:
         doi: DOI identifier
 
     Returns:
         Paper metadata dictionary or None
     """
-    try:
-        # Clean DOI (remove https://doi.org/ prefix if present)
-        clean_doi = doi.replace('https://doi.org/', '')
-
-        results = Works().filter(doi=clean_doi).get()
-
-        for work in results:
-            # Extract authors
-            authors_list = []
-            if work.get('authorships'):
-                for authorship in work['authorships']:
-                    author = authorship.get('author', {})
-                    if author and author.get('display_name'):
-                        authors_list.append(author['display_name'])
-
-            authors_str = ', '.join(authors_list) if authors_list else ''
-
-            paper = {
-                'id': work.get('id', ''),
-                'title': work.get('title', 'Untitled'),
-                'doi': work.get('doi', '').replace('https://doi.org/', '') if work.get('doi') else '',
-                'authors': authors_str,
-                'abstract': work.get('abstract', ''),
-                'publication_year': work.get('publication_year', ''),
-                'venue': work.get('primary_location', {}).get('source', {}).get('display_name', ''),
-                'citation_count': work.get('cited_by_count', 0),
-                'url': work.get('doi', '') or work.get('id', ''),
-            }
-
-            return paper
+    clean_doi = normalize_doi(doi)
+    key = f'doi|{clean_doi}'
 
-        return None
+    cached = cache.get(key)
+    if cached is not MISSING:
+        return cached
 
+    try:
+        results = _works_by_doi([clean_doi])
+        paper = next((_work_to_paper(work) for work in results), None)
     except Exception:
+        logger.warning('OpenAlex DOI lookup failed (%r)', doi, exc_info=True)
         return None
 
+    # Not-found answers expire sooner, in case the work is indexed later
+    cache.set(key, paper, DOI_TTL_SECONDS if paper else SEARCH_TTL_SECONDS)
+    return paper
+
+def work_key(openalex_id):
+    """Integer key of an OpenAlex work id ('https://openalex.org/W123' or
+    'W123' -> 123); None when it is not a work id"""
+    tail = (openalex_id or '').rstrip('/').rsplit('/', 1)[-1]
+    if tail[:1].upper() == 'W' and tail[1:].isdigit():
+        return int(tail[1:])
+    return None
+
+def _get_work_by_doi_url(clean_doi):
+    """One work fetched by its DOI URL rather than through a filter; None
+    when OpenAlex has no such work"""
+    rate_limiter.wait()
+    try:
+        return Works()[f'https://doi.org/{clean_doi}']
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+
+def _works_by_doi(dois, select=None):
+    """OpenAlex works for normalized DOIs: one OR-filter query for the DOIs
+    the filter syntax can carry, and a lookup by DOI URL for each DOI
+    holding a ',' or '|'. `select` limits the fields of the filter query."""
+    filterable = [doi for doi in dois if not FILTER_SEPARATORS_RE.search(doi)]
+    works = []
+    if filterable:
+        rate_limiter.wait()
+        query = Works().filter(doi='|'.join(filterable))
+        if select:
+            query = query.select(select)
+        works.extend(query.get(per_page=len(filterable)))
+    for doi in dois:
+        if FILTER_SEPARATORS_RE.search(doi):
+            work = _get_work_by_doi_url(doi)
+            if work is not None:
+                works.append(work)
+    return works
+
+def _fetch_doi_chunk(dois):
+    """Resolve a chunk of normalized DOIs, with one OpenAlex OR-filter
+    query for most of them"""
+    found = {}
+    for work in _works_by_doi(dois):
+        paper = _work_to_paper(work)
+        found[normalize_doi(paper['doi'])] = paper
+    return {doi: found.get(doi) for doi in dois}
+
+def _fetch_references_chunk(dois):
+    """Look up the OpenAlex ids and referenced works of a chunk of
+    normalized DOIs, mostly with one OR-filter query fetching only those
+    fields"""
+    found = {}
+    for work in _works_by_doi(dois, select=['id', 'doi', 'referenced_works']):
+        found[normalize_doi(work.get('doi'))] = {
+            'id': work.get('id', ''),
+            'referenced_works': work.get('referenced_works') or [],
+        }
+    return {doi: found.get(doi) for doi in dois}
+
+def _lookup_dois(dois, prefix, fetch_chunk, chunk_size, max_workers):
+    """Cached, batched, concurrent per-DOI lookups.
+
+    Cached DOIs (under '<prefix>|<doi>') are answered first; the rest are
+    grouped into `fetch_chunk` calls on a bounded thread pool. Yields
+    (doi as given, status, value) once per distinct DOI, where status is
+    'found', 'not_found', 'invalid' or 'error'.
+    """
+    pending = {}
+    for doi in dois:
+        clean_doi = normalize_doi(doi) if isinstance(doi, str) else ''
+        if not clean_doi:
+            yield doi, 'invalid', None
+            continue
+        if clean_doi in pending:
+            continue
+        cached = cache.get(f'{prefix}|{clean_doi}')
+        if cached is not MISSING:
+            pending[clean_doi] = None
+            yield doi, 'found' if cached else 'not_found', cached
+        else:
+            pending[clean_doi] = doi
+
+    to_fetch = [clean_doi for clean_doi, original in pending.items() if original is not None]
+    if not to_fetch:
+        return
+
+    chunks = [to_fetch[i:i + chunk_size] for i in range(0, len(to_fetch), chunk_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_chunk, chunk): chunk for chunk in chunks}
+        try:
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    resolved = future.result()
+                except Exception:
+                    logger.warning('OpenAlex DOI batch lookup failed (%d DOIs)', len(chunk), exc_info=True)
+                    for clean_doi in chunk:
+                        yield pending[clean_doi], 'error', None
+                    continue
+                for clean_doi, value in resolved.items():
+                    cache.set(f'{prefix}|{clean_doi}', value, DOI_TTL_SECONDS if value else SEARCH_TTL_SECONDS)
+                    yield pending[clean_doi], 'found' if value else 'not_found', value
+        finally:
+            # If the consumer stops early (client disconnect), skip queued queries
+            for future in futures:
+                future.cancel()
+
+def resolve_dois(dois, chunk_size=DOI_BATCH_CHUNK_SIZE, max_workers=DOI_BATCH_MAX_WORKERS):
+    """
+    Resolve many DOIs concurrently, yielding results as they complete
+
+    Cached DOIs are answered first; the rest are grouped into OR-filter
+    queries run on a bounded thread pool under the shared rate limiter.
+
+    Args:
+        dois: Iterable of DOI strings (any of the usual prefixes)
+        chunk_size: DOIs per OpenAlex query
+        max_workers: Concurrent OpenAlex queries
+
+    Yields:
+        Dicts with 'doi' (as given), 'status' ('found', 'not_found',
+        'invalid' or 'error') and 'paper' (metadata or None); one per
+        distinct DOI
+    """
+    for doi, status, paper in _lookup_dois(dois, 'doi', _fetch_doi_chunk, chunk_size, max_workers):
+        yield {'doi': doi, 'status': status, 'paper': paper}
+
+def fetch_referenced_works(dois, chunk_size=DOI_BATCH_CHUNK_SIZE, max_workers=DOI_BATCH_MAX_WORKERS):
+    """
+    Look up what the works with the given DOIs cite, like resolve_dois()
+
+    Yields:
+        Dicts with 'doi' (as given), 'status' and 'work': {'id': OpenAlex
+        id, 'referenced_works': [OpenAlex ids]} or None
+    """
+    for doi, status, work in _lookup_dois(dois, 'refs', _fetch_references_chunk, chunk_size, max_workers):
+        yield {'doi': doi, 'status': status, 'work': work}
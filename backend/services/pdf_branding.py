@@ -0,0 +1,361 @@
+import importlib.util
+import io
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+from services.pdf_store import PDF_STORAGE_DIR
+
+# Branded copies live here, named by the PDF's ETag (content + title hash)
+BRANDED_DIR = os.path.join(PDF_STORAGE_DIR, '_branded')
+# Least recently served copies are evicted once the directory exceeds this
+BRANDED_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Temp files of copies being written; older ones were left by a crash
+PART_MAX_AGE_SECONDS = 3600
+# How far from the end of the file to look for the last `startxref`
+TAIL_SCAN_BYTES = 4096
+
+_STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+_OBJ_HEADER_RE = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+_SUBSECTION_RE = re.compile(rb'\s*(\d+)\s+(\d+)[ \t]*(?:\r\n|\r|\n)')
+# Classic xref entries are 'oooooooooo ggggg n' plus a one or two byte EOL
+_XREF_ENTRY_BYTES = 18
+
+_evict_lock = threading.Lock()
+# Last time each branded copy was served, for LRU eviction. Kept apart from
+# the files' mtimes, which stay put so they never leak into Last-Modified;
+# copies not served since startup fall back to their mtime.
+_last_served = {}
+
+
+def _serialize(obj):
+    buf = io.BytesIO()
+    obj.write_to_stream(buf)
+    return buf.getvalue()
+
+
+def _last_startxref(f, size):
+    f.seek(max(0, size - TAIL_SCAN_BYTES))
+    matches = _STARTXREF_RE.findall(f.read())
+    return int(matches[-1]) if matches else None
+
+
+class _TailReader:
+    """Finds single objects of a PDF by following its cross-reference
+    chain from the last section, reading only the sections' subsection
+    headers and the entries asked for, instead of loading the whole file.
+    Stands in for the reader pypdf's object parser resolves indirect
+    references (a stream's /Length, say) through.
+    """
+
+    strict = False
+
+    def __init__(self, f, startxref):
+        self.f = f
+        self.startxref = startxref
+        self._sections = {}
+
+    def _read_at(self, offset, size):
+        self.f.seek(offset)
+        return self.f.read(size)
+
+    def _skip_space(self):
+        while self.f.read(1).isspace():
+            pass
+        self.f.seek(-1, 1)
+
+    def section(self, offset):
+        """(trailer, lookup) of the cross-reference section at `offset`;
+        lookup(num) is an xref entry or None when the section has none"""
+        if offset not in self._sections:
+            if self._read_at(offset, 4) == b'xref':
+                self._sections[offset] = self._table_section(offset + 4)
+            else:
+                self._sections[offset] = self._stream_section(offset)
+        return self._sections[offset]
+
+    def _table_section(self, pos):
+        from pypdf.generic import read_object
+
+        subsections = []
+        while True:
+            head = self._read_at(pos, 64)
+            stripped = head.lstrip()
+            if stripped.startswith(b'trailer'):
+                self.f.seek(pos + len(head) - len(stripped) + len(b'trailer'))
+                break
+            match = _SUBSECTION_RE.match(head)
+            if not match:
+                raise ValueError('malformed xref table')
+            first, count = int(match.group(1)), int(match.group(2))
+            start = pos + match.end()
+            eol = self._read_at(start + _XREF_ENTRY_BYTES, 2)
+            size = _XREF_ENTRY_BYTES + len(eol) - len(eol.lstrip(b' \r\n'))
+            subsections.append((first, count, start, size))
+            pos = start + count * size
+        self._skip_space()
+        trailer = read_object(self.f, self)
+
+        def lookup(num):
+            for first, count, start, size in subsections:
+                if first <= num < first + count:
+                    entry = self._read_at(start + (num - first) * size, _XREF_ENTRY_BYTES)
+                    if entry[17:18] == b'n':
+                        return (1, int(entry[:10]), int(entry[11:16]))
+                    return (0, 0, 0)
+            return None
+        return trailer, lookup
+
+    def _stream_section(self, offset):
+        xref = self._object_at(offset)
+        widths = [int(w) for w in xref['/W']]
+        index = [int(i) for i in xref.get('/Index', [0, xref['/Size']])]
+        data = xref.get_data()
+        row_size = sum(widths)
+
+        def lookup(num):
+            row = 0
+            for first, count in zip(index[::2], index[1::2]):
+                if first <= num < first + count:
+                    pos = (row + num - first) * row_size
+                    fields = []
+                    for width in widths:
+                        fields.append(int.from_bytes(data[pos:pos + width], 'big'))
+                        pos += width
+                    # A zero-width type field means type 1
+                    return (fields[0] if widths[0] else 1, *fields[1:])
+                row += count
+            return None
+        return xref, lookup
+
+    def _object_at(self, offset):
+        from pypdf.generic import read_object
+
+        head = self._read_at(offset, 64)
+        match = _OBJ_HEADER_RE.match(head)
+        if not match:
+            raise ValueError(f'no object at offset {offset}')
+        self.f.seek(offset + match.end())
+        self._skip_space()
+        return read_object(self.f, self)
+
+    def locate(self, num, offset):
+        """The xref entry of object `num`, newest section first"""
+        while offset is not None:
+            trailer, lookup = self.section(offset)
+            if '/XRefStm' in trailer:
+                # Hybrid files list compressed objects in a side stream
+                entry = self.section(int(trailer['/XRefStm']))[1](num)
+                if entry is not None:
+                    return entry
+            entry = lookup(num)
+            if entry is not None:
+                return entry
+            offset = int(trailer['/Prev']) if '/Prev' in trailer else None
+        return None
+
+    def get_object(self, reference):
+        from pypdf.generic import NullObject, read_object
+
+        num = reference if isinstance(reference, int) else reference.idnum
+        entry = self.locate(num, self.startxref)
+        if entry is None or entry[0] == 0:
+            return NullObject()
+        if entry[0] == 1:
+            return self._object_at(entry[1])
+        # Compressed: the index'th object of an object stream
+        container = self.get_object(entry[1])
+        data = container.get_data()
+        first = int(container['/First'])
+        header = data[:first].split()
+        stream = io.BytesIO(data)
+        stream.seek(first + int(header[2 * entry[2] + 1]))
+        return read_object(stream, self)
+
+
+def build_title_update(source_path, title):
+    """Build a PDF incremental update that sets /Info /Title to `title`.
+
+    Returns the bytes to append to the unchanged source file: a new /Info
+    object (existing entries kept, /Title replaced) and a cross-reference
+    section pointing back at the previous one via /Prev. The section is a
+    classic xref table or an xref stream, matching the file's last section.
+    Returns None when the file cannot be updated this way (encrypted, or
+    its startxref does not point at a cross-reference section).
+    """
+    from pypdf.generic import DictionaryObject, NameObject, TextStringObject
+
+    size = os.path.getsize(source_path)
+    with open(source_path, 'rb') as f:
+        prev = _last_startxref(f, size)
+        if prev is None or prev >= size:
+            return None
+        f.seek(prev)
+        head = f.read(32)
+        f.seek(size - 1)
+        ends_with_newline = f.read(1) in (b'\n', b'\r')
+
+        if head.startswith(b'xref'):
+            xref_stream = False
+        elif _OBJ_HEADER_RE.match(head):
+            xref_stream = True
+        else:
+            return None
+
+        # Only the last trailer, the xref entries leading to the old /Info
+        # object and that object are read; pages are never touched
+        reader = _TailReader(f, prev)
+        trailer = reader.section(prev)[0]
+        if '/Encrypt' in trailer:
+            return None
+
+        info = DictionaryObject()
+        old_info = trailer.get('/Info')
+        if old_info is not None:
+            old_info = old_info.get_object()
+            for key in old_info:
+                info[NameObject(key)] = old_info.raw_get(key)
+        info[NameObject('/Title')] = TextStringObject(title)
+
+    info_num = int(trailer['/Size'])
+    root = _serialize(trailer.raw_get('/Root'))
+    doc_id = b' /ID ' + _serialize(trailer.raw_get('/ID')) if '/ID' in trailer else b''
+
+    out = io.BytesIO()
+    if not ends_with_newline:
+        out.write(b'\n')
+    info_offset = size + out.tell()
+    out.write(b'%d 0 obj\n%s\nendobj\n' % (info_num, _serialize(info)))
+    xref_offset = size + out.tell()
+
+    if xref_stream:
+        # Entries for the new /Info and for the xref stream object itself
+        xref_num = info_num + 1
+        rows = struct.pack('>BQH', 1, info_offset, 0) + struct.pack('>BQH', 1, xref_offset, 0)
+        out.write(
+            b'%d 0 obj\n<< /Type /XRef /Size %d /Root %s /Info %d 0 R /Prev %d%s '
+            b'/W [1 8 2] /Index [%d 2] /Length %d >>\nstream\n'
+            % (xref_num, xref_num + 1, root, info_num, prev, doc_id, info_num, len(rows))
+        )
+        out.write(rows)
+        out.write(b'\nendstream\nendobj\n')
+    else:
+        # The object 0 free-list head is repeated as most writers do
+        out.write(b'xref\n0 1\n0000000000 65535 f \n%d 1\n%010d 00000 n \n' % (info_num, info_offset))
+        out.write(
+            b'trailer\n<< /Size %d /Root %s /Info %d 0 R /Prev %d%s >>\n'
+            % (info_num + 1, root, info_num, prev, doc_id)
+        )
+    out.write(b'startxref\n%d\n%%%%EOF\n' % xref_offset)
+    return out.getvalue()
+
+
+def branded_path(source_abs_path, title, cache_key):
+    """Return the path to a copy of the PDF whose /Info /Title equals `title`.
+
+    Chromium's built-in PDF viewer uses /Title (when present) as the name it
+    displays in its toolbar — without this, the viewer falls back to the
+    cache-temp filename ("[hash].tmp"). The copy is the original bytes plus
+    an incremental update, so branding costs a file copy rather than a full
+    parse and rewrite. Copies are cached under `cache_key` (the PDF's ETag)
+    and evicted least-recently-served first. Falls back to the original when
+    pypdf is unavailable or the file cannot be updated.
+    """
+    if not title:
+        return source_abs_path
+    if importlib.util.find_spec('pypdf') is None:
+        return source_abs_path  # pypdf not available — serve original
+
+    cached = os.path.join(BRANDED_DIR, f'{cache_key}.pdf')
+    if os.path.exists(cached):
+        with _evict_lock:
+            _last_served[cached] = time.time()
+        return cached
+
+    try:
+        update = build_title_update(source_abs_path, title)
+    except Exception:
+        # Any pypdf failure (malformed file, etc.) — serve original
+        return source_abs_path
+    if update is None:
+        return source_abs_path
+
+    os.makedirs(BRANDED_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=BRANDED_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out, open(source_abs_path, 'rb') as src:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+            out.write(update)
+        os.replace(temp_path, cached)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return source_abs_path
+    with _evict_lock:
+        _last_served[cached] = time.time()
+
+    evict(keep=cached)
+    return cached
+
+
+def evict(max_bytes=BRANDED_CACHE_MAX_BYTES, keep=None):
+    """Delete least recently served branded copies until the cache fits in
+    `max_bytes`, and temp files left behind by interrupted writes. Returns
+    the number of files and bytes removed."""
+    removed = 0
+    freed = 0
+    stale_before = time.time() - PART_MAX_AGE_SECONDS
+    with _evict_lock:
+        entries = []
+        try:
+            with os.scandir(BRANDED_DIR) as it:
+                for entry in it:
+                    if entry.name.endswith('.pdf'):
+                        stat = entry.stat()
+                        served = _last_served.get(entry.path, stat.st_mtime)
+                        entries.append((served, stat.st_size, entry.path))
+                    elif entry.name.endswith('.part'):
+                        stat = entry.stat()
+                        if stat.st_mtime < stale_before:
+                            try:
+                                os.remove(entry.path)
+                            except OSError:
+                                continue
+                            removed += 1
+                            freed += stat.st_size
+        except OSError:
+            return {'removed': removed, 'bytes_freed': freed}
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            _last_served.pop(path, None)
+            total -= size
+            removed += 1
+            freed += size
+    return {'removed': removed, 'bytes_freed': freed}
+
+
+def cache_stats():
+    files = 0
+    total = 0
+    try:
+        with os.scandir(BRANDED_DIR) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf'):
+                    files += 1
+                    total += entry.stat().st_size
+    except OSError:
+        pass
+    return {'files': files, 'bytes': total, 'max_bytes': BRANDED_CACHE_MAX_BYTES}
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from models import pdf_blob
+
+# PDF storage directory (alongside the SQLite database)
+PDF_STORAGE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'pdfs')
+# Content-addressed blobs live under <PDF_STORAGE_DIR>/blobs/<aa>/<sha256>.pdf
+BLOB_DIR_NAME = 'blobs'
+# Unreferenced blobs are kept this long before garbage collection, so an
+# upload that is about to reuse (or has just written) a blob never loses it
+GC_GRACE_SECONDS = 600
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Serializes "register blob + move file in place" against GC file removal
+_store_lock = threading.Lock()
+
+
+def blob_relative_path(sha256):
+    """Storage path (relative to PDF_STORAGE_DIR) of the blob with this hash"""
+    return f'{BLOB_DIR_NAME}/{sha256[:2]}/{sha256}.pdf'
+
+
+def is_blob_path(relative_path):
+    return bool(relative_path) and relative_path.startswith(f'{BLOB_DIR_NAME}/')
+
+
+def store_stream(stream):
+    """Store an uploaded PDF stream; return its relative blob path.
+
+    The stream is hashed while it is spooled to a temp file next to the blob
+    directory. If a blob with the same SHA-256 already exists the temp file
+    is dropped, so re-uploading or attaching the same paper to several
+    references keeps a single copy on disk.
+    """
+    blob_root = os.path.join(PDF_STORAGE_DIR, BLOB_DIR_NAME)
+    os.makedirs(blob_root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=blob_root, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+
+        sha256 = digest.hexdigest()
+        relative_path = blob_relative_path(sha256)
+        abs_path = os.path.join(PDF_STORAGE_DIR, relative_path)
+        with _store_lock:
+            pdf_blob.register_blob(relative_path, sha256, size)
+            if os.path.exists(abs_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+                os.replace(temp_path, abs_path)
+        return relative_path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def collect_garbage(grace_seconds=GC_GRACE_SECONDS):
+    """Delete blobs that have had no references for `grace_seconds`.
+
+    Returns the number of blobs and bytes reclaimed.
+    """
+    removed = 0
+    freed = 0
+    with _store_lock:
+        for blob in pdf_blob.claim_orphans(int(time.time()) - grace_seconds):
+            try:
+                os.remove(os.path.join(PDF_STORAGE_DIR, blob['path']))
+            except OSError:
+                pass
+            removed += 1
+            freed += blob['size']
+    return {'removed': removed, 'bytes_freed': freed}
@@ -0,0 +1,132 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from models import pdf_text
+from services.pdf_store import PDF_STORAGE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Extraction worker processes (parsing is CPU-bound and holds the GIL)
+PDF_TEXT_WORKERS = 2
+# Pages beyond this are not indexed
+MAX_PAGES = 2000
+# Longer page texts (usually extraction garbage) are truncated
+MAX_PAGE_CHARS = 100_000
+
+
+def extract_pages(abs_path):
+    """Extract the text of each page of a PDF. Runs in a worker process.
+
+    Returns [(page_number, text)] for the pages that have any text, with
+    1-based page numbers and whitespace collapsed.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(abs_path)
+    if reader.is_encrypted:
+        # Many PDFs are "encrypted" with an empty user password
+        reader.decrypt('')
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        if number > MAX_PAGES:
+            break
+        try:
+            text = page.extract_text() or ''
+        except Exception:
+            continue
+        text = ' '.join(text.split())[:MAX_PAGE_CHARS]
+        if text:
+            pages.append((number, text))
+    return pages
+
+
+class TextIndexer:
+    """Feeds stored PDFs through a process pool and indexes their text.
+
+    The work queue lives in the database: a PDF is marked pending before it
+    is submitted and indexed (or failed) in the same transaction that
+    stores its pages, so `resume()` after a crash or restart picks up
+    exactly the PDFs that were never finished.
+    """
+
+    def __init__(self, max_workers=PDF_TEXT_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: never fork the threaded API server
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def enqueue(self, pdf_path):
+        """Index a newly stored PDF unless its text is already known.
+        Returns True when it was queued."""
+        if not pdf_path or pdf_text.mark_pending(pdf_path) != 'pending':
+            return False
+        self._submit(pdf_path)
+        return True
+
+    def resume(self):
+        """Queue every referenced PDF that is not indexed yet. Returns the
+        number queued."""
+        pdf_text.purge_unreferenced()
+        paths = pdf_text.get_unindexed_paths()
+        for pdf_path in paths:
+            pdf_text.mark_pending(pdf_path)
+            self._submit(pdf_path)
+        return len(paths)
+
+    def retry_failed(self):
+        """Queue failed PDFs again (e.g. after upgrading pypdf)"""
+        pdf_text.requeue_failed()
+        return self.resume()
+
+    def _submit(self, pdf_path):
+        with self._lock:
+            if pdf_path in self._in_flight:
+                return
+            abs_path = os.path.abspath(os.path.join(PDF_STORAGE_DIR, pdf_path))
+            try:
+                future = self._pool().submit(extract_pages, abs_path)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed mid-parse); start a fresh pool
+                self._executor = None
+                future = self._pool().submit(extract_pages, abs_path)
+            self._in_flight.add(pdf_path)
+        future.add_done_callback(partial(self._finished, pdf_path))
+
+    def _finished(self, pdf_path, future):
+        try:
+            pages = future.result()
+        except BrokenProcessPool:
+            # Left pending: picked up again by the next resume()
+            logger.warning('PDF text worker pool broke while extracting %s', pdf_path)
+            return
+        except Exception as e:
+            logger.info('PDF text extraction failed for %s: %s', pdf_path, e)
+            pdf_text.mark_failed(pdf_path, str(e) or type(e).__name__)
+            return
+        finally:
+            with self._lock:
+                self._in_flight.discard(pdf_path)
+        pdf_text.store_pages(pdf_path, pages)
+
+    def stats(self):
+        stats = pdf_text.get_index_stats()
+        with self._lock:
+            stats['in_flight'] = len(self._in_flight)
+        return stats
+
+
+# Shared indexer for the API
+indexer = TextIndexer()
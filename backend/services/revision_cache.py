@@ -0,0 +1,37 @@
+"""In-memory per-project cache for values derived from a project's
+current state (connection graphs, topic indexes, rendered
+bibliographies).
+
+Entries are keyed by project and stored with the project revision they
+were built at. The project change journal bumps the revision on any
+write, so a lookup with the current revision needs no invalidation
+hooks: a stale entry simply misses. The least recently used projects
+are dropped past `max_projects`.
+"""
+import threading
+from collections import OrderedDict
+
+
+class RevisionCache:
+    """Values keyed by project, valid for one revision, LRU-bounded"""
+
+    def __init__(self, max_projects):
+        self.max_projects = max_projects
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, project_id, revision):
+        """The value cached for the project at this revision, or None"""
+        with self._lock:
+            cached = self._entries.get(project_id)
+            if cached is None or cached[0] != revision:
+                return None
+            self._entries.move_to_end(project_id)
+            return cached[1]
+
+    def set(self, project_id, revision, value):
+        with self._lock:
+            self._entries[project_id] = (revision, value)
+            self._entries.move_to_end(project_id)
+            while len(self._entries) > self.max_projects:
+                self._entries.popitem(last=False)
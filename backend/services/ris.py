@@ -0,0 +1,128 @@
+"""RIS parsing.
+
+RIS records are runs of `TAG  - value` lines from `TY` to `ER`; repeated
+tags (authors, keywords) accumulate and untagged lines continue the
+previous value. Records are normalized to the same metadata as
+bibtex.normalize_entry(), with a generated BibTeX entry so RIS imports
+export like any other reference.
+"""
+import re
+
+from services import bibtex
+from services.doi import strip_prefix
+
+
+class RisError(ValueError):
+    """A malformed record; `line` is where it starts (1-based)"""
+
+    def __init__(self, message, line=None):
+        super().__init__(f'line {line}: {message}' if line else message)
+        self.line = line
+
+
+_TAG_RE = re.compile(r'^([A-Z][A-Z0-9])  -(?: (.*))?$')
+
+# RIS reference types and the BibTeX entry types they become
+ENTRY_TYPES = {
+    'JOUR': 'article', 'JFULL': 'article', 'MGZN': 'article', 'NEWS': 'article', 'EJOUR': 'article',
+    'CONF': 'inproceedings', 'CPAPER': 'inproceedings',
+    'BOOK': 'book', 'EBOOK': 'book', 'EDBOOK': 'book',
+    'CHAP': 'incollection', 'ECHAP': 'incollection',
+    'THES': 'phdthesis', 'RPRT': 'techreport', 'UNPB': 'unpublished',
+}
+
+AUTHOR_TAGS = ('AU', 'A1')
+EDITOR_TAGS = ('A2', 'ED', 'A3')
+TITLE_TAGS = ('TI', 'T1', 'CT')
+VENUE_TAGS = ('T2', 'JO', 'JF', 'JA', 'J2', 'BT', 'PB')
+YEAR_TAGS = ('PY', 'Y1', 'DA')
+ABSTRACT_TAGS = ('AB', 'N2')
+
+
+def _first(tags, names):
+    return next((tags[name][0] for name in names if tags.get(name)), '')
+
+
+def iter_records(stream, on_error=None):
+    """Yield (tags, line) for each record of a RIS text stream, where tags
+    maps each tag to its list of values and line is where TY appeared.
+
+    Records cut short by a new TY or the end of the stream raise RisError,
+    or are passed to `on_error` and skipped.
+    """
+    tags = None
+    start_line = 0
+    last_tag = None
+    for number, raw in enumerate(stream, start=1):
+        line = raw.rstrip('\r\n').lstrip('\ufeff')
+        match = _TAG_RE.match(line)
+        if not match:
+            if tags is not None and last_tag and line.strip():
+                tags[last_tag][-1] += ' ' + line.strip()
+            continue
+        tag, value = match.group(1), (match.group(2) or '').strip()
+        if tag == 'TY':
+            if tags is not None:
+                error = RisError('record has no ER line', start_line)
+                if on_error is None:
+                    raise error
+                on_error(error)
+            tags, start_line, last_tag = {'TY': [value]}, number, 'TY'
+        elif tags is None:
+            continue
+        elif tag == 'ER':
+            yield tags, start_line
+            tags, last_tag = None, None
+        else:
+            tags.setdefault(tag, []).append(value)
+            last_tag = tag
+    if tags is not None:
+        error = RisError('record has no ER line', start_line)
+        if on_error is None:
+            raise error
+        on_error(error)
+
+
+def normalize_record(tags):
+    """Normalized metadata of a record (see bibtex.normalize_entry), plus a
+    generated 'bibtex' entry"""
+    entry_type = ENTRY_TYPES.get(_first(tags, ('TY',)).upper(), 'misc')
+    names = [n for name in AUTHOR_TAGS for n in tags.get(name, [])]
+    editors = [n for name in EDITOR_TAGS for n in tags.get(name, [])]
+    # Edited volumes are credited to their editors, as bibtex.normalize_entry() does
+    authors = ', '.join(bibtex.format_name(n) for n in names or editors)
+    title = _first(tags, TITLE_TAGS)
+    venue = _first(tags, VENUE_TAGS)
+    year = re.search(r'\d{4}', _first(tags, YEAR_TAGS))
+    year = int(year.group()) if year else None
+    doi = strip_prefix(_first(tags, ('DO',)))
+    abstract = _first(tags, ABSTRACT_TAGS)
+    citekey = _first(tags, ('ID',)) or bibtex.make_citekey(authors, year, title)
+
+    venue_field = {'article': 'journal', 'inproceedings': 'booktitle',
+                   'incollection': 'booktitle'}.get(entry_type, 'publisher')
+    pages = '--'.join(p for p in (_first(tags, ('SP',)), _first(tags, ('EP',))) if p)
+    fields = {
+        'author': ' and '.join(names),
+        'editor': ' and '.join(editors),
+        'title': title,
+        venue_field: venue,
+        'year': year,
+        'volume': _first(tags, ('VL',)),
+        'number': _first(tags, ('IS',)),
+        'pages': pages,
+        'doi': doi,
+        'url': _first(tags, ('UR',)),
+        'abstract': abstract,
+    }
+    return {
+        'citekey': citekey,
+        'entry_type': entry_type,
+        'title': title,
+        'authors': authors,
+        'venue': venue,
+        'publication_year': year,
+        'doi': doi,
+        'abstract': abstract,
+        'bibtex': bibtex.format_entry(entry_type, citekey, fields),
+    }
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import database
+
+# Time-to-live per kind of lookup. DOI metadata is effectively immutable;
+# free-text search results drift as OpenAlex indexes new works.
+DOI_TTL_SECONDS = 30 * 24 * 3600
+SEARCH_TTL_SECONDS = 24 * 3600
+MAX_ENTRIES = 5000
+
+MISSING = object()
+
+
+class SearchCache:
+    """SQLite-backed key/value cache with per-entry TTL and LRU eviction.
+
+    Values are stored as JSON. Every hit refreshes the entry's last-access
+    time; when the cache grows past `max_entries` the least recently used
+    entries are evicted. Hit/miss counters are kept per process.
+    """
+
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_search_cache_access ON search_cache (last_access)')
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """Return the cached value for `key`, or MISSING."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT value, expires_at FROM search_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    conn.execute('DELETE FROM search_cache WHERE key = ?', (key,))
+                self.misses += 1
+                return MISSING
+            conn.execute('UPDATE search_cache SET last_access = ? WHERE key = ?', (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        """Store `value` under `key` for `ttl` seconds, evicting LRU entries."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO search_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now + ttl, now)
+            )
+            count = conn.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute('''
+                    DELETE FROM search_cache WHERE key IN (
+                        SELECT key FROM search_cache ORDER BY expires_at <= ? DESC, last_access ASC LIMIT ?
+                    )
+                ''', (now, count - self.max_entries))
+
+    def clear(self):
+        """Drop every entry and reset the counters. Returns the number removed."""
+        with self._lock:
+            removed = self._connection().execute('DELETE FROM search_cache').rowcount
+            self.hits = 0
+            self.misses = 0
+        return removed
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection().execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a free-text query."""
+    return ' '.join((query or '').casefold().split())
+
+
+# Shared cache stored next to the main database
+cache = SearchCache(os.path.join(os.path.dirname(database.DB_PATH), 'search_cache.db'))
@@ -0,0 +1,172 @@
+"""Encoded JSON bodies of GET /projects/<id>/topics, kept in memory.
+
+Entries are keyed by project and reference field-set and hold the
+response bytes together with the project revision they were built at
+(the ETag), so a hit costs no database query at all. The topic and
+reference models invalidate a project after every write that touches it,
+and deleting a project forgets it, via `database.after_commit`, so readers
+never see a body older than the last committed write.
+
+A reader builds a body from the database without holding the lock, so a
+write can commit in between. Each project therefore carries a generation
+token that invalidation replaces; a body is only stored when the
+generation it was built under is still current. Tokens come from one
+counter, and projects without their own (never invalidated, or forgotten)
+share the current epoch token, so forgetting a project leaves no entry
+behind yet still turns away bodies built before it.
+"""
+import itertools
+import json
+import threading
+from collections import OrderedDict
+
+import database
+
+MAX_BYTES = 64 * 1024 * 1024
+# Bodies above this share of the budget are served but not kept
+MAX_ENTRY_SHARE = 0.25
+
+
+class SnapshotCache:
+    """LRU of (revision, body bytes) per (project_id, variant), bounded by
+    the total size of the bodies"""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._variants = {}
+        self._generations = {}
+        self._tokens = itertools.count(1)
+        self._epoch = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, project_id, variant):
+        """(revision, body) of a cached body, or None"""
+        with self._lock:
+            entry = self._entries.get((project_id, variant))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((project_id, variant))
+            self.hits += 1
+            return entry
+
+    def generation(self, project_id):
+        """Token to take before reading the database for a body; pass it
+        back to `set()`"""
+        with self._lock:
+            return self._generations.get(project_id, self._epoch)
+
+    def set(self, project_id, variant, generation, revision, body):
+        """Store a body built under `generation`, unless the project was
+        invalidated since; evicts least recently used bodies past the cap"""
+        with self._lock:
+            if generation != self._generations.get(project_id, self._epoch):
+                return
+            if len(body) > self.max_bytes * MAX_ENTRY_SHARE:
+                return
+            self._discard((project_id, variant))
+            self._entries[(project_id, variant)] = (revision, body)
+            self._variants.setdefault(project_id, set()).add(variant)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        variants = self._variants[key[0]]
+        variants.discard(key[1])
+        if not variants:
+            del self._variants[key[0]]
+
+    def _drop_project(self, project_id):
+        for variant in self._variants.pop(project_id, ()):
+            entry = self._entries.pop((project_id, variant))
+            self._bytes -= len(entry[1])
+        self.invalidations += 1
+
+    def invalidate(self, project_ids):
+        """Drop every body of the given projects"""
+        with self._lock:
+            for project_id in project_ids:
+                self._generations[project_id] = next(self._tokens)
+                self._drop_project(project_id)
+
+    def forget(self, project_ids):
+        """Drop every body and the generation of deleted projects"""
+        with self._lock:
+            self._epoch = next(self._tokens)
+            for project_id in project_ids:
+                self._generations.pop(project_id, None)
+                self._drop_project(project_id)
+
+    def clear(self):
+        """Drop every body and reset the counters. Returns the number removed."""
+        with self._lock:
+            removed = len(self._entries)
+            for project_id in self._variants:
+                self._generations[project_id] = next(self._tokens)
+            self._entries.clear()
+            self._variants.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'projects': len(self._variants),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+cache = SnapshotCache()
+
+
+def invalidate_projects(project_ids):
+    """Invalidate projects once the current transaction commits"""
+    project_ids = set(project_ids)
+    if project_ids:
+        database.after_commit(lambda: cache.invalidate(project_ids))
+
+
+def forget_projects(project_ids):
+    """Forget deleted projects once the current transaction commits"""
+    project_ids = set(project_ids)
+    if project_ids:
+        database.after_commit(lambda: cache.forget(project_ids))
+
+
+def invalidate_topics(conn, topic_ids):
+    """Invalidate the projects of some topics; call inside the write's
+    transaction, before deleting them"""
+    invalidate_projects(row[0] for row in conn.execute(
+        'SELECT DISTINCT project_id FROM topics WHERE id IN (SELECT value FROM json_each(?))',
+        (json.dumps(list(topic_ids)),)
+    ))
+
+
+def invalidate_references(conn, reference_ids):
+    """Invalidate the projects of some references; call inside the write's
+    transaction, before deleting or moving them"""
+    invalidate_projects(row[0] for row in conn.execute('''
+        SELECT DISTINCT t.project_id FROM paper_references pr JOIN topics t ON t.id = pr.topic_id
+        WHERE pr.id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(list(reference_ids)),)))
@@ -0,0 +1,93 @@
+"""Spatial index over a project's topics for viewport queries.
+
+Topic boxes (position plus grid size in canvas pixels) are hashed into
+square TILE_SIZE buckets, each box into every bucket it covers. A
+viewport query only visits the buckets it covers, or the occupied
+buckets when that is fewer (a zoomed-out view over a sparse canvas),
+and confirms candidates with an exact rectangle test. Like the
+connection graph, an index is built once per project revision.
+"""
+import math
+
+from models import changes, topic
+from services.layout import GRID_CELL_SIZE, MIN_GRID_HEIGHT, MIN_GRID_WIDTH
+from services.revision_cache import RevisionCache
+
+# Bucket edge in canvas pixels: a few typical topics across, so a
+# viewport covers a handful of buckets
+TILE_SIZE = 1024
+# Indexes kept in memory (one per project, latest revision)
+CACHE_MAX_PROJECTS = 16
+
+
+class TopicIndex:
+    """Grid-bucket index of topic boxes, as (x0, y0, x1, y1) in pixels"""
+
+    def __init__(self, boxes):
+        self.ids = []
+        self.boxes = []
+        self.buckets = {}
+        for topic_id, x, y, grid_width, grid_height in boxes:
+            x, y = x or 0, y or 0
+            box = (x, y,
+                   x + (grid_width or MIN_GRID_WIDTH) * GRID_CELL_SIZE,
+                   y + (grid_height or MIN_GRID_HEIGHT) * GRID_CELL_SIZE)
+            slot = len(self.ids)
+            self.ids.append(topic_id)
+            self.boxes.append(box)
+            for key in self._tiles(*box):
+                self.buckets.setdefault(key, []).append(slot)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _tiles(x0, y0, x1, y1):
+        columns = range(math.floor(x0 / TILE_SIZE), math.floor(x1 / TILE_SIZE) + 1)
+        rows = range(math.floor(y0 / TILE_SIZE), math.floor(y1 / TILE_SIZE) + 1)
+        return [(column, row) for column in columns for row in rows]
+
+    def query(self, x0, y0, x1, y1):
+        """Ids of the topics whose boxes intersect the rectangle, ascending"""
+        columns = math.floor(x1 / TILE_SIZE) - math.floor(x0 / TILE_SIZE) + 1
+        rows = math.floor(y1 / TILE_SIZE) - math.floor(y0 / TILE_SIZE) + 1
+        if columns * rows > len(self.buckets):
+            buckets = self.buckets.values()
+        else:
+            buckets = [self.buckets[key] for key in self._tiles(x0, y0, x1, y1) if key in self.buckets]
+        found = set()
+        for bucket in buckets:
+            for slot in bucket:
+                bx0, by0, bx1, by1 = self.boxes[slot]
+                if bx0 < x1 and x0 < bx1 and by0 < y1 and y0 < by1:
+                    found.add(self.ids[slot])
+        return sorted(found)
+
+
+cache = RevisionCache(CACHE_MAX_PROJECTS)
+
+
+def get_index(project_id, revision=None):
+    """The project's current topic index, rebuilt when the project changed
+    since it was last loaded"""
+    if revision is None:
+        revision = changes.get_project_revision(project_id)
+    index = cache.get(project_id, revision)
+    if index is None:
+        index = TopicIndex(topic.get_topic_boxes(project_id))
+        cache.set(project_id, revision, index)
+    return index
+
+
+def parse_bbox(value):
+    """(x0, y0, x1, y1) from an 'x0,y0,x1,y1' string; raises ValueError"""
+    parts = value.split(',')
+    if len(parts) != 4:
+        raise ValueError('bbox must be x0,y0,x1,y1')
+    try:
+        x0, y0, x1, y1 = (float(part) for part in parts)
+    except ValueError:
+        raise ValueError('bbox must be x0,y0,x1,y1') from None
+    if not all(math.isfinite(v) for v in (x0, y0, x1, y1)) or x1 < x0 or y1 < y0:
+        raise ValueError('bbox must be finite with x0 <= x1 and y0 <= y1')
+    return x0, y0, x1, y1
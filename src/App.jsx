@@ -3,6 +3,7 @@ import ProjectList from './components/ProjectList';
 import ProjectView from './components/ProjectView';
 import WebPanel from './components/WebPanel';
 import ExportReportModal from './components/ExportReportModal';
+import { fetchExport } from './jobs';
 import './App.css';
 
 function App() {
@@ -127,14 +128,9 @@ function App() {
     if (!currentProject) return;
     setShowExportMenu(false);
     try {
-      const response = await fetch(`http://localhost:5000/api/projects/${currentProject.id}/export/pdfs`);
-      if (!response.ok) {
-        const err = await response.json().catch(() => ({}));
-        alert(err.error || 'Failed to export PDFs');
-        return;
-      }
-      const count = response.headers.get('X-PDF-Count') || '';
-      const blob = await response.blob();
+      const { result: blob, response, job } = await fetchExport(
+        `http://localhost:5000/api/projects/${currentProject.id}/export/pdfs`
+      );
       const url = window.URL.createObjectURL(blob);
       const a = document.createElement('a');
       a.href = url;
@@ -143,18 +139,24 @@ function App() {
       a.click();
       document.body.removeChild(a);
       window.URL.revokeObjectURL(url);
-      if (count) alert(`Exported ${count} PDF${count === '1' ? '' : 's'}`);
+      if (job) {
+        if (job.message) alert(`Exported ${job.message}`);
+      } else {
+        const count = response.headers.get('X-PDF-Count') || '';
+        if (count) alert(`Exported ${count} PDF${count === '1' ? '' : 's'}`);
+      }
     } catch (error) {
       console.error('Failed to export PDFs:', error);
-      alert('Failed to export PDFs');
+      alert(error.message || 'Failed to export PDFs');
     }
   };
 
   const handleExportBibliography = async () => {
     if (!currentProject) return;
     try {
-      const response = await fetch(`http://localhost:5000/api/projects/${currentProject.id}/export/bibliography`);
-      const data = await response.json();
+      const { result: data } = await fetchExport(
+        `http://localhost:5000/api/projects/${currentProject.id}/export/bibliography`
+      );
 
       if (data.bibliography) {
         const blob = new Blob([data.bibliography], { type: 'text/plain' });
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { createPortal } from 'react-dom';
+import { fetchExport } from '../jobs';
 import './ExportReportModal.css';
 
 function ExportReportModal({ projectId, projectTitle, onClose }) {
@@ -19,10 +20,8 @@ function ExportReportModal({ projectId, projectTitle, onClose }) {
     setLoading(true);
     setError(null);
     try {
-      const response = await fetch(`http://localhost:5000/api/projects/${projectId}/export/report`);
-      if (!response.ok) throw new Error('Failed to load report');
-      const data = await response.json();
-      setReport(data);
+      const { result } = await fetchExport(`http://localhost:5000/api/projects/${projectId}/export/report`);
+      setReport(result);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -190,7 +190,7 @@ function ProjectView({ project, onOpenWebPanel, onCloseWebPanel, isPanelOpen, is
 
   const loadTopics = async () => {
     try {
-      const response = await fetch(`http://localhost:5000/api/projects/${project.id}/topics`);
+      const response = await fetch(`http://localhost:5000/api/projects/${project.id}/topics?fields=summary`);
       const data = await response.json();
       setTopics(data);
       setRefreshKey(prev => prev + 1); // Force re-render of all TopicBlocks
@@ -13,6 +13,18 @@ const darkenColor = (color, percent) => {
   return "#" + (0x1000000 + (R<255?R<1?0:R:255)*0x10000 + (G<255?G<1?0:G:255)*0x100 + (B<255?B<1?0:B:255)).toString(16).slice(1);
 };
 
+// Edit form values for a reference row
+const toFormData = (ref) => ({
+  title: ref.title,
+  doi: ref.doi || '',
+  authors: ref.authors || '',
+  abstract: ref.abstract || '',
+  notes: ref.notes || '',
+  citation_count: ref.citation_count || 0,
+  publication_year: ref.publication_year || null,
+  bibtex: ref.bibtex || '',
+});
+
 function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, projectId, isPanelOpen, topicColor = '#007bff', onConnectionStart, onConnectionEnd, isConnecting, zoom = 1, dimmed = false, onReorderStart, isBeingDragged = false, onOpenWebPanel }) {
   const borderColor = darkenColor(topicColor, 20);
   const [showDetails, setShowDetails] = useState(false);
@@ -22,16 +34,11 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
   const [showContextMenu, setShowContextMenu] = useState(false);
   const [contextMenuPosition, setContextMenuPosition] = useState({ x: 0, y: 0 });
   const [availableTopics, setAvailableTopics] = useState([]);
-  const [formData, setFormData] = useState({
-    title: reference.title,
-    doi: reference.doi || '',
-    authors: reference.authors || '',
-    abstract: reference.abstract || '',
-    notes: reference.notes || '',
-    citation_count: reference.citation_count || 0,
-    publication_year: reference.publication_year || null,
-    bibtex: reference.bibtex || '',
-  });
+  // The canvas loads references as summaries; the full row (abstract,
+  // bibtex) is fetched when the tooltip or details modal opens
+  const [detail, setDetail] = useState(null);
+  const [formData, setFormData] = useState(() => toFormData(reference));
+  const fullReference = detail || reference;
   const nodeRef = useRef(null);
   const tooltipRef = useRef(null);
   const contextMenuRef = useRef(null);
@@ -39,6 +46,17 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
   const connectionStartTimeoutRef = useRef(null);
   const pdfInputRef = useRef(null);
 
+  useEffect(() => {
+    // Reloaded summary rows make a fetched detail stale
+    setDetail(null);
+  }, [reference]);
+
+  useEffect(() => {
+    if ((showTooltip || showDetails) && !detail) {
+      loadDetail();
+    }
+  }, [showTooltip, showDetails, detail]);
+
   useEffect(() => {
     // Load available topics when context menu is shown
     if (showContextMenu && projectId) {
@@ -141,11 +159,23 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
 
       setTooltipPosition({ position, top, left });
     }
-  }, [showTooltip]);
+  }, [showTooltip, detail]);
+
+  const loadDetail = async () => {
+    try {
+      const response = await fetch(`http://localhost:5000/api/references/${reference.id}/detail`);
+      if (!response.ok) return;
+      const data = await response.json();
+      setDetail(data);
+      if (!isEditing) setFormData(toFormData(data));
+    } catch (error) {
+      console.error('Failed to load reference details:', error);
+    }
+  };
 
   const loadTopics = async () => {
     try {
-      const response = await fetch(`http://localhost:5000/api/projects/${projectId}/topics`);
+      const response = await fetch(`http://localhost:5000/api/projects/${projectId}/topics?fields=id`);
       const data = await response.json();
       // Filter out the current topic
       setAvailableTopics(data.filter(topic => topic.id !== currentTopicId));
@@ -313,6 +343,8 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
   };
 
   const handleSave = async () => {
+    // Saving before the full row arrived would blank abstract and bibtex
+    if (!detail) return;
     if (!formData.title.trim() || !formData.publication_year) {
       alert('Title and Publication Year are required');
       return;
@@ -348,15 +380,7 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
 
   const handleCancelEdit = () => {
     setIsEditing(false);
-    setFormData({
-      title: reference.title,
-      doi: reference.doi || '',
-      authors: reference.authors || '',
-      abstract: reference.abstract || '',
-      notes: reference.notes || '',
-      citation_count: reference.citation_count || 0,
-      publication_year: reference.publication_year || null,
-    });
+    setFormData(toFormData(fullReference));
   };
 
   const handleMouseEnter = () => {
@@ -511,9 +535,9 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
             </div>
           )}
 
-          {reference.abstract && (
+          {fullReference.abstract && (
             <div className="tooltip-abstract">
-              <strong>Abstract:</strong> {reference.abstract}
+              <strong>Abstract:</strong> {fullReference.abstract}
             </div>
           )}
 
@@ -734,7 +758,7 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
                   </div>
 
                   <div className="modal-actions">
-                    <button className="save-btn" onClick={handleSave}>Save Changes</button>
+                    <button className="save-btn" onClick={handleSave} disabled={!detail}>Save Changes</button>
                     <button className="cancel-btn" onClick={handleCancelEdit}>Cancel</button>
                   </div>
                 </>
@@ -775,10 +799,10 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
                     </div>
                   )}
 
-                  {reference.abstract && (
+                  {fullReference.abstract && (
                     <div className="field">
                       <label>Abstract</label>
-                      <p>{reference.abstract}</p>
+                      <p>{fullReference.abstract}</p>
                     </div>
                   )}
 
@@ -789,7 +813,7 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
                     </div>
                   )}
 
-                  {reference.bibtex && (
+                  {fullReference.bibtex && (
                     <div className="field">
                       <label>BibTeX Citation</label>
                       <pre style={{
@@ -800,7 +824,7 @@ function ReferenceNode({ reference, onUpdate, onUpdateAll, currentTopicId, proje
                         padding: '10px',
                         borderRadius: '4px',
                         overflow: 'auto'
-                      }}>{reference.bibtex}</pre>
+                      }}>{fullReference.bibtex}</pre>
                     </div>
                   )}
 
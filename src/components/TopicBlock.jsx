@@ -67,7 +67,7 @@ function TopicBlock({ topic, onUpdate, onOpenWebPanel, onCloseWebPanel, isPanelO
 
   const loadReferences = async () => {
     try {
-      const response = await fetch(`http://localhost:5000/api/topics/${topic.id}/references`);
+      const response = await fetch(`http://localhost:5000/api/topics/${topic.id}/references?fields=summary`);
       const data = await response.json();
       setReferences(data);
     } catch (error) {
@@ -383,19 +383,11 @@ function TopicBlock({ topic, onUpdate, onOpenWebPanel, onCloseWebPanel, isPanelO
       setPosition(resolved);
     }
 
-    // Save new position to backend for current topic
-    try {
-      await fetch(`http://localhost:5000/api/topics/${topic.id}/position`, {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ position_x: resolved.x, position_y: resolved.y }),
-      });
-    } catch (error) {
-      console.error('Failed to update topic position:', error);
-    }
-
-    // Save positions for other selected topics in the group
-    if (selectedTopics && selectedTopics.size > 1 && dragRef.current.groupOffsets.length > 0) {
+    // Save positions for the current topic and any other selected topics in
+    // one bulk request (single transaction on the backend)
+    const layout = [{ id: topic.id, position_x: resolved.x, position_y: resolved.y }];
+    const isGroupDrag = selectedTopics && selectedTopics.size > 1 && dragRef.current.groupOffsets.length > 0;
+    if (isGroupDrag) {
       for (const { id } of dragRef.current.groupOffsets) {
         if (id === topic.id) continue;
 
@@ -404,18 +396,21 @@ function TopicBlock({ topic, onUpdate, onOpenWebPanel, onCloseWebPanel, isPanelO
         if (!otherEl) continue;
         const otherNewX = parseFloat(otherEl.style.left) || 0;
         const otherNewY = parseFloat(otherEl.style.top) || 0;
-
-        try {
-          await fetch(`http://localhost:5000/api/topics/${id}/position`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ position_x: otherNewX, position_y: otherNewY }),
-          });
-        } catch (error) {
-          console.error(`Failed to update position for topic ${id}:`, error);
-        }
+        layout.push({ id, position_x: otherNewX, position_y: otherNewY });
       }
+    }
+
+    try {
+      await fetch('http://localhost:5000/api/topics/layout', {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ topics: layout }),
+      });
+    } catch (error) {
+      console.error('Failed to update topic positions:', error);
+    }
 
+    if (isGroupDrag) {
       // Just trigger arrow update without full refresh
       if (onPositionChange) {
         onPositionChange();
@@ -0,0 +1,64 @@
+// Background job client — long exports and imports run on the backend's
+// job queue (POST /api/jobs) instead of inside one long request; this
+// queues a job, polls it until it finishes and fetches its result.
+
+const JOBS_URL = 'http://localhost:5000/api/jobs';
+const POLL_INTERVAL_MS = 500;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Queue a job and wait for it. onProgress(job) is called after every poll.
+// Resolves with the finished job; rejects with the job's error if it
+// failed or was cancelled.
+export async function runJob(type, params, onProgress) {
+  const response = await fetch(JOBS_URL, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ type, params }),
+  });
+  let job = await response.json();
+  if (!response.ok) throw new Error(job.error || 'Failed to start job');
+  return waitForJob(job, onProgress);
+}
+
+// Poll a job already queued (e.g. returned with a 202 by another route)
+export async function waitForJob(job, onProgress) {
+  while (job.status === 'queued' || job.status === 'running') {
+    await sleep(POLL_INTERVAL_MS);
+    const response = await fetch(`${JOBS_URL}/${job.id}`);
+    if (!response.ok) throw new Error('Job not found');
+    job = await response.json();
+    if (onProgress) onProgress(job);
+  }
+  if (job.status !== 'succeeded') {
+    throw new Error(job.error || `Job ${job.status}`);
+  }
+  return job;
+}
+
+// The finished job's result: parsed JSON, or a Blob for file results
+export async function fetchJobResult(job) {
+  const response = await fetch(`${JOBS_URL}/${job.id}/result`);
+  if (!response.ok) throw new Error('Failed to fetch job result');
+  return job.has_file ? response.blob() : response.json();
+}
+
+// GET an export route directly. Routes answer small requests inline and
+// queue a job (202) above their size threshold; in that case the job is
+// polled and its result fetched instead. Resolves with { result, response,
+// job }: result is parsed JSON, or a Blob for file downloads; response is
+// set for inline answers, job for queued ones.
+export async function fetchExport(url, onProgress) {
+  const response = await fetch(url);
+  if (response.status === 202) {
+    const job = await waitForJob(await response.json(), onProgress);
+    return { result: await fetchJobResult(job), response: null, job };
+  }
+  if (!response.ok) {
+    const err = await response.json().catch(() => ({}));
+    throw new Error(err.error || `Request failed (${response.status})`);
+  }
+  const isJson = (response.headers.get('Content-Type') || '').includes('application/json');
+  const result = isJson ? await response.json() : await response.blob();
+  return { result, response, job: null };
+}